@@ -0,0 +1,69 @@
+import time
+import streamlit as st
+from datetime import datetime
+from checkin_analytics import Schedule, attendance, format_daily, labelled, WORK_START, WORK_END, LATE_GRACE_MINUTES
+from checkin_query import load_range, day_bounds
+from checkin_store import MissingColumns
+from checkin_export import export_frames, XLSX_MIME, CSV_MIME
+from checkin_core import now_local
+from perf_trace import span
+
+def show_attendance(storage, text):
+    st.subheader(text.get("attendance_title", "📈 出勤統計"))
+
+    today = now_local().date()
+    picked = st.date_input(text.get("date_range", "請選擇日期區間："), value=(today.replace(day=1), today), key="attendance_range")
+    if not isinstance(picked, (list, tuple)) or len(picked) != 2:
+        return
+    start, end = picked
+
+    # --- 班表設定（預設值來自環境變數） ---
+    with st.expander(text.get("attendance_schedule", "⚙️ 班表設定")):
+        col1, col2, col3 = st.columns(3)
+        work_start = col1.time_input(text.get("work_start", "上班時間"), datetime.strptime(WORK_START, "%H:%M").time())
+        work_end = col2.time_input(text.get("work_end", "下班時間"), datetime.strptime(WORK_END, "%H:%M").time())
+        grace = col3.number_input(text.get("late_grace", "遲到寬限（分鐘）"), min_value=0, max_value=120, value=LATE_GRACE_MINUTES)
+    schedule = Schedule(work_start, work_end, grace)
+
+    try:
+        with span("attendance.load_range", start=start, end=end):
+            store, _ = load_range(storage, start, end, storage.list_months())
+        positions = store.select(None, *day_bounds(start, end))
+        began = time.perf_counter()
+        with span("attendance.compute", rows=len(positions)):
+            daily, summary = attendance(store, positions, schedule)
+    except MissingColumns:
+        st.warning(text["missing_column"])
+        return
+    except Exception as e:
+        st.error(f"{text['read_error']}{e}")
+        return
+
+    if daily.empty:
+        st.info(text["no_data"])
+        return
+    st.caption(f"⏱️ {len(positions):,} punches → {len(daily):,} days · {(time.perf_counter() - began) * 1000:.0f} ms")
+
+    # --- 每人彙總 ---
+    summary = summary.assign(user=summary["user"].astype(str))
+    st.dataframe(labelled(summary, text), hide_index=True, width="stretch")
+
+    # --- 單一人員的每日明細（全部人員的明細請下載） ---
+    users = summary["user"].tolist()
+    selected_user = st.selectbox(text["select_user"], users, key="attendance_user")
+    st.dataframe(labelled(format_daily(daily[daily["user"] == selected_user]), text), hide_index=True, width="stretch")
+
+    export_formats = {"xlsx": "Excel", "csv": "CSV"}
+    export_format = st.radio(text.get("export_format", "匯出格式"), list(export_formats), format_func=export_formats.get, horizontal=True, key="attendance_export_format")
+    summary_title = text.get("attendance_summary_sheet", "出勤統計")
+    daily_title = text.get("attendance_daily_sheet", "每日出勤")
+    if export_format == "xlsx":
+        frames = lambda: [(summary_title, labelled(summary, text)), (daily_title, labelled(format_daily(daily), text))]
+    else:
+        frames = lambda: [(daily_title, labelled(format_daily(daily), text))]
+    st.download_button(
+        label="📥 " + (text["download"] if export_format == "xlsx" else text.get("download_csv", "下載 CSV")),
+        data=lambda: export_frames(frames(), export_format),
+        file_name=f"{start:%Y%m%d}-{end:%Y%m%d}_{summary_title}.{export_format}",
+        mime=XLSX_MIME if export_format == "xlsx" else CSV_MIME
+    )
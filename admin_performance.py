@@ -0,0 +1,69 @@
+import streamlit as st
+import pandas as pd
+from perf_trace import perf_store
+from sheets_client import quota_budget, session_pool_metrics
+from checkin_queue import get_write_queue
+from checkin_journal import get_journal
+from checkin_store import store_cache
+from translations import translations
+from secret_provider import get_secret_provider
+from shared_cache import shared_cache
+from checkin_prefetch import get_prefetcher
+
+def show_performance(storage, text):
+    st.subheader(text.get("performance_title", "⏱️ 效能監控"))
+
+    # --- 各階段耗時（最近的樣本） ---
+    summary = perf_store.summary()
+    if not summary:
+        st.info(text.get("no_perf_data", "尚無效能資料"))
+    else:
+        df_stages = pd.DataFrame(summary).rename(columns={
+            "stage": text.get("perf_stage", "階段"),
+            "count": text.get("perf_count", "次數"),
+        })
+        st.dataframe(df_stages.style.format({"p50_ms": "{:.1f}", "p95_ms": "{:.1f}", "max_ms": "{:.1f}"}), hide_index=True)
+
+    # --- 每次 rerun 的 API 呼叫次數 ---
+    st.markdown("#### " + text.get("perf_api_calls", "每次 rerun 的 API 呼叫次數"))
+    calls = perf_store.api_calls_summary()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("reruns", calls["reruns"])
+    col2.metric("p50", f"{calls['p50']:.1f}")
+    col3.metric("p95", f"{calls['p95']:.1f}")
+    col4.metric("max", calls["max"])
+
+    # --- Sheets 配額剩餘額度 ---
+    st.markdown("#### " + text.get("perf_quota", "Sheets API 配額"))
+    quota = quota_budget.metrics()
+    col1, col2, col3 = st.columns(3)
+    col1.metric(text.get("perf_read_headroom", "讀取剩餘額度"), quota["read_headroom"], f"{quota['read_in_window']} / {quota['window_seconds']:.0f}s", delta_color="off")
+    col2.metric(text.get("perf_write_headroom", "寫入剩餘額度"), quota["write_headroom"], f"{quota['write_in_window']} / {quota['window_seconds']:.0f}s", delta_color="off")
+    col3.metric("429", quota["rate_limited"], f"retries {quota['retries']}", delta_color="off")
+    st.caption(
+        f"requests {quota['requests']} · throttled {quota['throttled']} ({quota['throttle_seconds']:.1f}s) · "
+        f"coalesced {quota['coalesced']} · errors {quota['errors']}"
+    )
+
+    # --- 寫入佇列、日誌與記憶體 ---
+    with st.expander(text.get("perf_internals", "寫入佇列 / 日誌 / 快取")):
+        journal = get_journal(storage)
+        prefetcher = get_prefetcher(storage)
+        st.json({
+            "write_queue": get_write_queue(storage).metrics(),
+            "http_sessions": session_pool_metrics(),
+            "journal": journal.metrics() if journal is not None else None,
+            "translations": {"source": translations.source, **translations.stats},
+            "secrets": get_secret_provider().metrics(),
+            "shared_cache": shared_cache.metrics(),
+            "prefetch": prefetcher.metrics() if prefetcher is not None else None,
+        })
+        memory = pd.DataFrame(store_cache.memory_report())
+        if not memory.empty:
+            memory["key"] = memory["key"].astype(str)
+            st.caption(f"📦 {memory['rows'].sum():,} rows · {memory['bytes'].sum() / 1024 / 1024:.1f} MiB")
+            st.dataframe(memory, hide_index=True)
+
+    if st.button(text.get("perf_reset", "🔄 重設統計")):
+        perf_store.reset()
+        st.rerun()
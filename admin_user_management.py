@@ -1,6 +1,9 @@
 
 import streamlit as st
 import pandas as pd
+from user_directory import get_user_directory
+from user_batch import UserSheetBatch, parse_import_csv
+from perf_trace import span
 
 def add_user(client, text):
     st.subheader(text["add_user"])
@@ -12,24 +15,29 @@ def add_user(client, text):
         submitted = st.form_submit_button(text["add_user_button"])
         if submitted:
             try:
-                user_sheet = client.open("users_login").sheet1
-                existing_users = [row["帳號"] for row in user_sheet.get_all_records()]
-                if new_username in existing_users:
-                    st.warning(text.get("account_exists", "⚠️ 此帳號已存在，請使用其他帳號"))
-                elif not new_username or not new_password:
-                    st.warning(text.get("input_required", "⚠️ 請輸入完整帳號與密碼"))
-                else:
-                    user_sheet.append_row([new_username, new_password, new_role, "Y" if enabled else "N"])
+                directory = get_user_directory(client)
+                added = False
+                # 寫入前強制確認一次版本，避免其他 instance 剛新增的帳號被重複建立；寫入後記下新版本，不必整份重新下載
+                with span("users.refresh"), directory.own_write():
+                    if directory.get(new_username) is not None:
+                        st.warning(text.get("account_exists", "⚠️ 此帳號已存在，請使用其他帳號"))
+                    elif not new_username or not new_password:
+                        st.warning(text.get("input_required", "⚠️ 請輸入完整帳號與密碼"))
+                    else:
+                        with span("users.add"):
+                            directory.worksheet.append_row([new_username, new_password, new_role, "Y" if enabled else "N"])
+                        directory.put(new_username, new_password, new_role, enabled)
+                        added = True
+                if added:
                     st.toast(f"{text.get('add_user_success', '✅ 已新增帳號')}：{new_username}（{new_role}）", icon="✅")
-                    st.cache_data.clear()
             except Exception as e:
                 st.error(f"{text.get('add_user_failed', '❌ 新增帳號失敗')}：{e}")
 
 def view_all_users(client, text):
     st.subheader(text.get("all_users", "所有使用者帳號"))
     try:
-        user_sheet = client.open("users_login").sheet1
-        df_users = pd.DataFrame(user_sheet.get_all_records())
+        with span("users.records"):
+            df_users = pd.DataFrame(get_user_directory(client).records())
         if df_users.empty:
             st.info(text.get("no_users", "尚無使用者資料"))
         else:
@@ -46,55 +54,90 @@ def view_all_users(client, text):
 def manage_user_status(client, text):
     st.subheader(text.get("manage_user_status", "👤 帳號狀態管理"))
     try:
-        user_sheet = client.open("users_login").sheet1
-        users_data = user_sheet.get_all_records()
-        df_users = pd.DataFrame(users_data)
+        directory = get_user_directory(client)
+        with span("users.records"):
+            df_users = pd.DataFrame(directory.records())
 
         if df_users.empty:
             st.info(text.get("no_users", "尚無使用者資料"))
             return
 
-        selected_account = st.selectbox(text.get("select_account", "請選擇帳號"), df_users["帳號"].tolist())
+        # 可一次選取多個帳號，所有異動合併成一次批次寫入
+        selected_accounts = st.multiselect(text.get("select_account", "請選擇帳號"), df_users["帳號"].tolist())
         action = st.radio(text.get("choose_action", "選擇操作"), [
             text.get("enable_account", "✅ 啟用帳號"),
             text.get("disable_account", "🚫 停用帳號"),
             text.get("delete_account", "🗑️ 刪除帳號")
         ])
 
-        if st.button(text.get("execute_action", "✅ 執行操作")):
-            all_rows = user_sheet.get_all_values()
-            header = all_rows[0]
-            rows = all_rows[1:]
+        if st.button(text.get("execute_action", "✅ 執行操作")) and selected_accounts:
+            batch = UserSheetBatch(directory.worksheet, directory)
+            accounts_label = "、".join(selected_accounts)
 
             if action == text.get("delete_account", "🗑️ 刪除帳號"):
-                new_rows = [row for row in rows if row[0] != selected_account]
-                user_sheet.clear()
-                user_sheet.append_row(header)
-                for row in new_rows:
-                    user_sheet.append_row(row)
-                st.toast(f"{text.get('deleted_account', '✅ 已刪除帳號')}：{selected_account}", icon="✅")
+                for account in selected_accounts:
+                    batch.delete(account)
+                with span("users.batch_commit", changes=len(batch)):
+                    batch.commit()
+                st.toast(f"{text.get('deleted_account', '✅ 已刪除帳號')}：{accounts_label}", icon="✅")
 
             elif action == text.get("disable_account", "🚫 停用帳號"):
-                for i, row in enumerate(rows, start=2):
-                    if row[0] == selected_account:
-                        user_sheet.update_cell(i, 4, "N")
-                        st.toast(f"{text.get('disabled_account', '✅ 已停用帳號')}：{selected_account}", icon="🚫")
-                        break
+                for account in selected_accounts:
+                    batch.set_enabled(account, False)
+                with span("users.batch_commit", changes=len(batch)):
+                    batch.commit()
+                st.toast(f"{text.get('disabled_account', '✅ 已停用帳號')}：{accounts_label}", icon="🚫")
 
             elif action == text.get("enable_account", "✅ 啟用帳號"):
-                for i, row in enumerate(rows, start=2):
-                    if row[0] == selected_account:
-                        user_sheet.update_cell(i, 4, "Y")
-                        st.toast(f"{text.get('enabled_account', '✅ 已啟用帳號')}：{selected_account}", icon="✅")
-                        break
+                for account in selected_accounts:
+                    batch.set_enabled(account, True)
+                with span("users.batch_commit", changes=len(batch)):
+                    batch.commit()
+                st.toast(f"{text.get('enabled_account', '✅ 已啟用帳號')}：{accounts_label}", icon="✅")
 
-            st.cache_data.clear()
             st.rerun()
 
     except Exception as e:
         st.error(f"{text.get('operation_failed', '❌ 操作失敗')}：{e}")
 
 
+def import_users(client, text):
+    st.subheader(text.get("bulk_import", "📄 CSV 批次匯入帳號"))
+    st.caption(text.get("import_hint", "CSV 欄位：帳號、密碼、角色（user/admin，預設 user）、是否啟用（Y/N，預設 Y）"))
+    uploaded = st.file_uploader(text.get("import_file", "選擇 CSV 檔案"), type=["csv"])
+    if uploaded is None:
+        return
+    try:
+        directory = get_user_directory(client)
+        with span("users.refresh"):
+            directory.refresh(force=True)
+        rows, skipped = parse_import_csv(uploaded.getvalue(), directory.users().keys())
+
+        st.info(f"{text.get('import_ready', '可匯入帳號數')}：{len(rows)}")
+        if skipped:
+            reasons = {
+                "input_required": text.get("input_required", "⚠️ 請輸入完整帳號與密碼"),
+                "invalid_role": text.get("invalid_role", "⚠️ 角色只能是 user 或 admin"),
+                "account_exists": text.get("account_exists", "⚠️ 此帳號已存在，請使用其他帳號"),
+            }
+            st.warning(f"{text.get('import_skipped', '略過的列')}：{len(skipped)}")
+            st.dataframe(pd.DataFrame(
+                [(line, account, reasons[reason]) for line, account, reason in skipped],
+                columns=["#", text.get("username", "帳號"), text.get("import_reason", "原因")]
+            ))
+
+        if rows and st.button(text.get("import_button", "📥 匯入")):
+            batch = UserSheetBatch(directory.worksheet, directory)
+            for account, password, role, enabled in rows:
+                batch.add(account, password, role, enabled)
+            with span("users.batch_commit", changes=len(batch)):
+                batch.commit()
+            st.toast(f"{text.get('import_success', '✅ 已匯入帳號')}：{len(rows)}", icon="✅")
+            st.rerun()
+    except Exception as e:
+        st.error(f"{text.get('operation_failed', '❌ 操作失敗')}：{e}")
+
+
 def manage_accounts(client, text):
     # 用 session_state 控制選單記憶
     if "account_tab" not in st.session_state:
@@ -103,7 +146,8 @@ def manage_accounts(client, text):
     tab_labels = {
         "add": text.get("add_user", "新增帳號"),
         "view": text.get("all_users", "所有使用者帳號"),
-        "status": text.get("manage_user_status", "帳號狀態管理")
+        "status": text.get("manage_user_status", "帳號狀態管理"),
+        "import": text.get("bulk_import", "📄 CSV 批次匯入帳號")
     }
 
     # 🔧 selectbox 顯示文字，但傳回的是 key（乾淨俐落）
@@ -126,3 +170,5 @@ def manage_accounts(client, text):
         view_all_users(client, text)
     elif selected_key == "status":
         manage_user_status(client, text)
+    elif selected_key == "import":
+        import_users(client, text)
@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+
+# 所有本機檔案（日誌、封存、索引）放在暫存目錄，必須在匯入 app 模組之前設定
+_workdir = tempfile.mkdtemp(prefix="checkin-bench-")
+os.environ.setdefault("CHECKIN_JOURNAL_DIR", os.path.join(_workdir, "journal"))
+os.environ.setdefault("CHECKIN_ARCHIVE_DIR", os.path.join(_workdir, "archive"))
+os.environ.setdefault("CHECKIN_USER_INDEX_PATH", os.path.join(_workdir, "user_index.db"))
+os.environ.setdefault("CHECKIN_PERF_LOG", "0")
+
+import numpy as np
+import streamlit as st
+from fake_gspread import FakeClient
+from checkin_storage import HEADER, open_storage
+from checkin_journal import get_journal
+from checkin_queue import get_write_queue
+from checkin_features import check_in, show_checkin_records
+from checkin_prefetch import get_prefetcher
+from checkin_query import load_range
+from user_directory import UserDirectory
+from user_batch import UserSheetBatch, parse_import_csv
+
+SIZES = (1000, 10000, 100000)
+CHECKINS = 20
+WARM_REPEAT = 5
+
+
+def now_local():
+    return datetime.utcnow() + timedelta(hours=8)
+
+
+# --- 測試資料：本月與上個月各 rows 筆打卡，另有 users_login 帳號表 ---
+def month_rows(month_start, days, rows, users, rng):
+    offsets = np.sort(rng.integers(0, days * 86400, rows))
+    names = rng.integers(0, users, rows)
+    result = [HEADER]
+    for offset, name in zip(offsets.tolist(), names.tolist()):
+        dt = month_start + timedelta(seconds=offset)
+        result.append([f"u{name:04d}", dt.strftime("%Y/%m/%d"), dt.strftime("%H:%M:%S")])
+    return result
+
+
+def build_fixture(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    users = max(20, rows // 200)
+    accounts = max(50, rows // 100)
+    client = FakeClient()
+
+    checkins = client.create("打卡紀錄")
+    today = now_local()
+    this_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    checkins.add_sheet(last_month.strftime("%Y%m"), rows + 1, 3, month_rows(last_month, (this_month - last_month).days, rows, users, rng))
+    checkins.add_sheet(this_month.strftime("%Y%m"), rows + 1, 3, month_rows(this_month, today.day, rows, users, rng))
+
+    user_sheet = client.create("users_login")
+    user_sheet.add_sheet("users_login", accounts + 1, 4, [["帳號", "密碼", "角色", "是否啟用"]] + [
+        [f"u{i:04d}", f"pw{i}", "admin" if i == 0 else "user", "Y"] for i in range(accounts)
+    ])
+    return client, {"users": users, "accounts": accounts, "last_month": last_month, "today": today}
+
+
+# --- 量測一個情境：耗時（每次）、API 呼叫次數、尖峰記憶體 ---
+# settle：情境結束後等背景工作完成（不計入耗時），API 呼叫次數才固定算在觸發它的情境，
+# 也避免背景執行緒還在配置記憶體時停止 tracemalloc
+def measure(client, results, scenario, rows, func, repeat=1, memory=True, settle=None):
+    client.reset_counters()
+    if memory:
+        tracemalloc.start()
+    timings, error = [], None
+    try:
+        for _ in range(repeat):
+            began = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - began) * 1000)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    if settle is not None:
+        settle()
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    calls = client.kinds["read"] + client.kinds["write"]
+    result = {
+        "scenario": scenario,
+        "rows": rows,
+        "repeat": len(timings),
+        "p50_ms": float(np.percentile(timings, 50)) if timings else None,
+        "p95_ms": float(np.percentile(timings, 95)) if timings else None,
+        "api_calls": calls / max(len(timings), 1),
+        "reads": client.kinds["read"],
+        "writes": client.kinds["write"],
+        "rate_limited": client.kinds["rate_limited"],
+        "peak_kib": peak / 1024,
+        "error": error,
+    }
+    results.append(result)
+    return result
+
+
+def wait_drained(storage, timeout=120):
+    journal = get_journal(storage)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pending = journal.metrics()["pending"] if journal is not None else 0
+        if pending == 0 and get_write_queue(storage).metrics()["queue_depth"] == 0:
+            return
+        time.sleep(0.01)
+    raise TimeoutError("check-ins were not flushed in time")
+
+
+def wait_prefetched(storage, timeout=120):
+    prefetcher = get_prefetcher(storage)
+    deadline = time.monotonic() + timeout
+    while prefetcher is not None and time.monotonic() < deadline:
+        if prefetcher.metrics()["pending"] == 0:
+            return
+        time.sleep(0.01)
+    if prefetcher is not None:
+        raise TimeoutError("prefetch did not finish in time")
+
+
+def run_size(rows, latency, read_quota, write_quota, memory, lang):
+    client, fixture = build_fixture(rows)
+    client.latency = latency
+    client.quota = {"read": read_quota, "write": write_quota}
+    text = lang["English"]
+    results = []
+
+    storage = open_storage(lambda: client.open("打卡紀錄"))
+
+    def as_role(role, username):
+        st.session_state.update({"role": role, "username": username})
+
+    # --- 查看紀錄：管理者整月、一般使用者（索引讀取）、跨月份 ---
+    def admin_month():
+        as_role("admin", "u0000")
+        show_checkin_records(storage, text, lang)
+
+    def user_month():
+        as_role("user", "u0001")
+        show_checkin_records(storage, text, lang)
+
+    # 一般使用者的冷啟動要先量：管理者載入整月後月份已在共用快取中，使用者會直接切片而不走索引查詢
+    prefetched = lambda: wait_prefetched(storage)
+    measure(client, results, "records.user_month.cold", rows, user_month, memory=memory, settle=prefetched)
+    measure(client, results, "records.admin_month.cold", rows, admin_month, memory=memory, settle=prefetched)
+    measure(client, results, "records.admin_month.warm", rows, admin_month, WARM_REPEAT, memory=memory, settle=prefetched)
+    measure(client, results, "records.user_month.warm", rows, user_month, WARM_REPEAT, memory=memory, settle=prefetched)
+    months = storage.list_months()
+    measure(client, results, "records.range_2_months", rows,
+            lambda: load_range(storage, fixture["last_month"].date(), fixture["today"].date(), months), memory=memory, settle=prefetched)
+
+    # --- 打卡：每次呼叫的耗時，以及背景寫回工作表為止的 API 呼叫 ---
+    def checkin_burst():
+        for i in range(CHECKINS):
+            as_role("user", f"u{i % fixture['users']:04d}")
+            check_in(storage, text)
+        wait_drained(storage)
+
+    def one_checkin():
+        as_role("user", "u0002")
+        check_in(storage, text)
+
+    measure(client, results, f"checkin.burst_{CHECKINS}", rows, checkin_burst, memory=memory)
+    # 單次打卡只量測使用者等待的時間（寫入日誌），寫回工作表由背景執行緒完成
+    measure(client, results, "checkin.single", rows, one_checkin, CHECKINS, memory=memory)
+    wait_drained(storage)
+
+    # --- 帳號管理：目錄載入、批次停用/刪除、CSV 匯入（帳號數為打卡筆數的 1%，至少 50 個） ---
+    directory = UserDirectory(client)
+    measure(client, results, "users.directory.cold", rows, directory.users, memory=memory)
+    measure(client, results, "users.directory.warm", rows, directory.users, WARM_REPEAT, memory=memory)
+
+    def bulk_status():
+        batch = UserSheetBatch(directory.worksheet, directory)
+        for i in range(1, 11):
+            batch.set_enabled(f"u{i:04d}", False)
+        for i in range(11, 16):
+            batch.delete(f"u{i:04d}")
+        batch.commit()
+
+    def bulk_import():
+        data = "帳號,密碼,角色\n" + "".join(f"new{rows}_{i},pw,user\n" for i in range(50))
+        imported, _ = parse_import_csv(data, directory.users().keys())
+        batch = UserSheetBatch(directory.worksheet, directory)
+        for account, password, role, enabled in imported:
+            batch.add(account, password, role, enabled)
+        batch.commit()
+
+    measure(client, results, "users.bulk_disable_10_delete_5", rows, bulk_status, memory=memory)
+    measure(client, results, "users.import_50", rows, bulk_import, memory=memory)
+    return results
+
+
+def print_table(results):
+    print(f"{'scenario':34} {'rows':>7} {'p50 ms':>9} {'p95 ms':>9} {'api':>6} {'429':>5} {'peak KiB':>10}  error")
+    for r in results:
+        p50 = f"{r['p50_ms']:.1f}" if r["p50_ms"] is not None else "-"
+        p95 = f"{r['p95_ms']:.1f}" if r["p95_ms"] is not None else "-"
+        print(f"{r['scenario']:34} {r['rows']:>7} {p50:>9} {p95:>9} {r['api_calls']:>6.1f} {r['rate_limited']:>5} {r['peak_kib']:>10.0f}  {r['error'] or ''}")
+
+
+# --- 與基準結果比較：API 呼叫次數不可增加，耗時與記憶體允許一定誤差 ---
+def compare(results, baseline, tolerance, slack_ms=5.0):
+    previous = {(r["scenario"], r["rows"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r["scenario"], r["rows"]))
+        if base is None:
+            continue
+        name = f"{r['scenario']} @ {r['rows']}"
+        if r["error"] and not base["error"]:
+            regressions.append(f"{name}: {r['error']}")
+        if r["api_calls"] > base["api_calls"]:
+            regressions.append(f"{name}: api calls {base['api_calls']:.1f} -> {r['api_calls']:.1f}")
+        if base["p95_ms"] is not None and r["p95_ms"] is not None and r["p95_ms"] > base["p95_ms"] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{name}: p95 {base['p95_ms']:.1f}ms -> {r['p95_ms']:.1f}ms")
+        if base["peak_kib"] and r["peak_kib"] > base["peak_kib"] * (1 + tolerance) + 64:
+            regressions.append(f"{name}: peak {base['peak_kib']:.0f}KiB -> {r['peak_kib']:.0f}KiB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以記憶體中的 gspread 替身量測打卡、查詢與帳號管理的效能")
+    parser.add_argument("--rows", type=int, nargs="+", default=list(SIZES), help="每個月份的打卡筆數")
+    parser.add_argument("--latency", type=float, default=0.0, help="每次 API 呼叫的模擬延遲（秒）")
+    parser.add_argument("--read-quota", type=int, default=None, help="每分鐘讀取次數上限（超過回 429）")
+    parser.add_argument("--write-quota", type=int, default=None, help="每分鐘寫入次數上限（超過回 429）")
+    parser.add_argument("--no-memory", action="store_true", help="不量測尖峰記憶體（tracemalloc 會拖慢速度）")
+    parser.add_argument("--output", help="結果輸出為 JSON 檔")
+    parser.add_argument("--baseline", help="與先前輸出的 JSON 比較，有退步時以非 0 結束")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="耗時與記憶體允許的增加比例")
+    parser.add_argument("--slack-ms", type=float, default=5.0, help="耗時另外允許增加的毫秒數（小情境容易受排程與 GC 影響）")
+    args = parser.parse_args(argv)
+
+    # 沒有透過 streamlit run 執行時，每個元件都會印出 missing ScriptRunContext 警告
+    logging.disable(logging.WARNING)
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "lang_config.json"), encoding="utf-8") as f:
+        lang = json.load(f)
+
+    # 先用小資料跑一次，讓匯入模組與建立背景執行緒的成本不算進第一個情境
+    run_size(100, 0.0, None, None, False, lang)
+
+    results = []
+    for rows in args.rows:
+        results.extend(run_size(rows, args.latency, args.read_quota, args.write_quota, not args.no_memory, lang))
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.slack_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
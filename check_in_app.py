@@ -2,46 +2,35 @@ import streamlit as st
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 import gspread
+import sheets_client
 import pandas as pd
 import io
-from google.cloud import secretmanager
-import json
+from secret_provider import get_secret_provider
+from sheet_metadata import get_metadata_cache
+from user_directory import get_user_directory
 
-# --- 快取 Secret ---
-@st.cache_resource
-def get_cached_secret(secret_id: str, version: str = "latest") -> dict:
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/616566246123/secrets/{secret_id}/versions/{version}"
-    response = client.access_secret_version(request={"name": name})
-    payload = response.payload.data.decode("UTF-8")
-    return json.loads(payload)
+# --- Secret（預設 Secret Manager，可用 CHECKIN_SECRET_BACKEND 切換），記憶體快取並在到期前背景更新 ---
+secrets = get_secret_provider("secretmanager")
 
 # --- 快取 Google Sheets 認證 ---
 @st.cache_resource
 def get_gspread_client():
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    info = get_cached_secret("google_service_account")
-    credentials = Credentials.from_service_account_info(info, scopes=scope)
-    return gspread.authorize(credentials)
+
+    def to_credentials(info):
+        return Credentials.from_service_account_info(info, scopes=scope)
+
+    client = sheets_client.authorize(to_credentials(secrets.get("google_service_account")))
+    secrets.on_change("google_service_account", lambda info: sheets_client.rotate_credentials(client, to_credentials(info)))
+    return client
 
 client = get_gspread_client()
 spreadsheet = client.open("打卡紀錄")
 
-# --- 使用者資訊快取 ---
-@st.cache_data(ttl=30)
+# --- 使用者資訊快取（帳號目錄只在試算表版本改變時重新下載） ---
 def get_users_from_sheet():
     try:
-        user_sheet = client.open("users_login").sheet1
-        records = user_sheet.get_all_records()
-        users_dict = {}
-        for row in records:
-            enabled = str(row.get("是否啟用", "Y")).strip().upper() == "Y"
-            users_dict[row["帳號"]] = {
-                "password": row["密碼"],
-                "role": row.get("角色", "user"),
-                "enabled": enabled
-            }
-        return users_dict
+        return get_user_directory(client).users()
     except Exception as e:
         st.error(f"❌ 無法讀取使用者資料表：{e}")
         return {}
@@ -158,13 +147,7 @@ st.success(f"{text['welcome']}{st.session_state['username']}")
 
 # --- 自動建立當月工作表 ---
 def get_sheet_for(dt):
-    sheet_name = dt.strftime("%Y%m")
-    try:
-        return spreadsheet.worksheet(sheet_name)
-    except gspread.exceptions.WorksheetNotFound:
-        worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=1000, cols=10)
-        worksheet.append_row(["姓名", "日期", "時間"])
-        return worksheet
+    return get_metadata_cache(spreadsheet).get_or_create(dt.strftime("%Y%m"), ["姓名", "日期", "時間"])
 
 
 
@@ -188,9 +171,9 @@ if not is_admin:
 # --- 歷史紀錄區塊 ---
 st.subheader(text["history_title"])
 
-@st.cache_data(ttl=60)  # 快取 1 分鐘內的資料
+# 工作表清單由共用的 metadata 快取提供（一分鐘更新一次）
 def get_all_worksheets(_spreadsheet):
-    return [ws.title for ws in spreadsheet.worksheets() if ws.title.isdigit()]
+    return [title for title in get_metadata_cache(_spreadsheet).titles() if title.isdigit()]
 
 available_sheets = get_all_worksheets(spreadsheet)
 available_sheets.sort()
@@ -206,7 +189,7 @@ if not available_sheets:
 selected_month = st.selectbox(text["select_month"], available_sheets, index=default_index)
 
 try:
-    sheet = spreadsheet.worksheet(selected_month)
+    sheet = get_metadata_cache(spreadsheet).worksheet(selected_month)
     records = sheet.get_all_values()
 
     if len(records) <= 1:
@@ -1,68 +1,105 @@
 import streamlit as st
 from datetime import datetime, timedelta
-from google.oauth2.service_account import Credentials
-import gspread
-import pandas as pd
-import json
-import requests
-from google.cloud import secretmanager
-from admin_user_management import manage_accounts
+from startup_profile import stage, PROFILE_ENABLED, print_report, report as startup_report
+from perf_trace import begin_rerun, end_rerun
+from user_directory import get_user_directory
+from translations import get_translations
+from secret_provider import get_secret_provider
+
+# pandas、gspread、google-auth、secretmanager 等較重的模組都在第一次用到時才匯入，
+# 登入頁面不需要載入它們，也不會開啟打卡紀錄試算表
 
 # --- 初始化狀態 ---
 for key, value in {"language": "中文", "logged_in": False, "username": "", "role": "user"}.items():
     if key not in st.session_state:
         st.session_state[key] = value
 
-# --- 快取 Secret ---
-@st.cache_resource
-def get_cached_secret(secret_id: str, version: str = "latest") -> dict:
-    client = secretmanager.SecretManagerServiceClient()
-    name = f"projects/616566246123/secrets/{secret_id}/versions/{version}"
-    response = client.access_secret_version(request={"name": name})
-    return json.loads(response.payload.data.decode("UTF-8"))
+# --- 效能追蹤：每次 rerun 的耗時與 API 呼叫次數 ---
+begin_rerun(st.session_state)
 
-# --- Google Sheets 認證 ---
+# --- Secret：Secret Manager、st.secrets 或本機檔案（CHECKIN_SECRET_BACKEND），記憶體快取並在到期前背景更新 ---
+secrets = get_secret_provider("secretmanager")
+
+# --- Google Sheets 認證（第一次需要讀寫試算表時才建立） ---
 @st.cache_resource
 def get_gspread_client():
+    with stage("import.gspread"):
+        from google.oauth2.service_account import Credentials
+        import sheets_client
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    info = get_cached_secret("google_service_account")
-    credentials = Credentials.from_service_account_info(info, scopes=scope)
-    return gspread.authorize(credentials)
 
-client = get_gspread_client()
-spreadsheet = client.open("打卡紀錄")
+    def to_credentials(info):
+        return Credentials.from_service_account_info(info, scopes=scope)
+
+    with stage("secret.fetch", secret_id="google_service_account"):
+        info = secrets.get("google_service_account")
+    with stage("sheets.authorize"):
+        client = sheets_client.authorize(to_credentials(info))
+    # 金鑰輪替後換掉同一個 client 的憑證，已快取的試算表、帳號目錄都不必重建
+    secrets.on_change("google_service_account", lambda info: sheets_client.rotate_credentials(client, to_credentials(info)))
+    return client
+
+# --- 打卡資料儲存（Google Sheets 或本機 SQLite），登入後才開啟 ---
+@st.cache_resource
+def get_checkin_storage():
+    with stage("import.storage"):
+        from checkin_storage import open_storage
+        from checkin_journal import get_journal
+    with stage("sheets.open_storage"):
+        storage = open_storage(lambda: get_gspread_client().open("打卡紀錄"))
+    # 建立日誌，補寫上次未完成的打卡
+    with stage("journal.replay"):
+        get_journal(storage)
+    return storage
+
+# --- 程序啟動時：日誌中有上次未完成的打卡就在背景開啟儲存來源補寫，不必等到有人登入 ---
+# 檢查只用標準函式庫（比對 put / ack），沒有尚未確認的打卡時不開啟儲存來源、也不匯入 gspread 與 pandas
+@st.cache_resource
+def replay_pending_journal():
+    import threading
+    import logging
+
+    def run():
+        try:
+            from checkin_journal import has_pending_journal
+            if has_pending_journal():
+                get_checkin_storage()
+        except Exception as e:
+            logging.getLogger("checkin.journal").warning("startup journal replay failed: %s", e)
+
+    threading.Thread(target=run, name="journal-startup-replay", daemon=True).start()
+
+replay_pending_journal()
 
 # --- Google Sheets 共用工具 ---
 def get_user_sheet():
-    return client.open("users_login").sheet1
+    return get_user_directory(get_gspread_client()).worksheet
 
 def get_user_records_df():
-    return pd.DataFrame(get_user_sheet().get_all_records())
+    import pandas as pd
+    return pd.DataFrame(get_user_directory(get_gspread_client()).records())
 
 def get_current_time():
     return datetime.utcnow() + timedelta(hours=8)
 
-# --- 語言載入 ---
-@st.cache_resource
-def load_translation_json(url: str):
-    return requests.get(url).json()
-
-lang = load_translation_json("https://raw.githubusercontent.com/leolin0330/new_english_app/main/lang_config.json")
+# --- 語言載入（映像檔內建的翻譯檔，不在啟動時連網） ---
+with stage("translations.load"):
+    lang = get_translations()
 text = lang[st.session_state["language"]]
 
-# --- 使用者資料快取 ---
-@st.cache_data(ttl=30)
+# --- rerun 結束：啟動剖析模式下輸出各階段耗時 ---
+def finish_rerun():
+    if PROFILE_ENABLED:
+        print_report()
+        with st.expander("🚀 startup profile"):
+            st.table(startup_report())
+    end_rerun(st.session_state)
+
+# --- 使用者資料快取（帳號目錄只在試算表版本改變時重新下載） ---
 def get_users_from_sheet():
     try:
-        df = get_user_records_df()
-        users_dict = {
-            row["帳號"]: {
-                "password": row["密碼"],
-                "role": row.get("角色", "user"),
-                "enabled": str(row.get("是否啟用", "Y")).strip().upper() == "Y"
-            } for _, row in df.iterrows()
-        }
-        return users_dict
+        with stage("users.load"):
+            return get_user_directory(get_gspread_client()).users()
     except Exception as e:
         st.error(f"❌ {text.get('read_error', '無法讀取使用者資料表')}：{e}")
         return {}
@@ -80,11 +117,11 @@ if not st.session_state["logged_in"]:
         st.session_state["language"] = toggle_lang
         st.rerun()
 
-    # 登入流程放這邊就夠了！
-    users = get_users_from_sheet()
+    # 登入流程放這邊就夠了！帳號資料在按下登入時才讀取，登入頁面不需連線 Google
     username = st.text_input(text["username"])
     password = st.text_input(text["password"], type="password")
     if st.button(text["login"]):
+        users = get_users_from_sheet()
         user_info = users.get(username)
         if not user_info:
             st.error(text["login_error"])
@@ -98,8 +135,13 @@ if not st.session_state["logged_in"]:
                 "username": username,
                 "role": user_info.get("role", "user")
             })
+            # 登入後的第一個畫面需要工作表清單與本月資料，趁 rerun 前在背景先開始載入
+            with stage("import.prefetch"):
+                from checkin_prefetch import prefetch_after_login
+            prefetch_after_login(get_checkin_storage, st.session_state["role"] == "admin")
             st.toast(text["login_success"], icon="✅")
             st.rerun()
+    finish_rerun()
     st.stop()
 else:
     # 登入後才顯示登出與語言切換（橫向排版）
@@ -117,6 +159,9 @@ else:
     st.title(text["title_admin"])
     st.divider()
     st.markdown("### " + text["main_menu_title"])
+    storage = get_checkin_storage()
+    with stage("import.checkin_features"):
+        from checkin_features import check_in, show_checkin_records
 
     # --- 管理者功能 ---
     is_admin = st.session_state.get("role") == "admin"
@@ -136,15 +181,21 @@ else:
                 st.rerun()
 
         if st.session_state["admin_option_key"] == "view_records":
-            from checkin_features import show_checkin_records
-            show_checkin_records(spreadsheet, text, lang)
+            show_checkin_records(storage, text, lang)
         elif st.session_state["admin_option_key"] == "manage_accounts":
-            manage_accounts(client, text)
+            from admin_user_management import manage_accounts
+            manage_accounts(get_gspread_client(), text)
+        elif st.session_state["admin_option_key"] == "performance":
+            from admin_performance import show_performance
+            show_performance(storage, text)
+        elif st.session_state["admin_option_key"] == "attendance":
+            from admin_attendance import show_attendance
+            show_attendance(storage, text)
 
     # --- 使用者功能 ---
     if not is_admin:
         if st.button(text["checkin"]):
-            from checkin_features import check_in
-            check_in(spreadsheet, text)
-        from checkin_features import show_checkin_records
-        show_checkin_records(spreadsheet, text, lang)
+            check_in(storage, text)
+        show_checkin_records(storage, text, lang)
+
+finish_rerun()
@@ -2,6 +2,8 @@ import streamlit as st
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 import gspread
+import sheets_client
+from secret_provider import get_secret_provider
 import pandas as pd
 import io
 
@@ -85,15 +87,16 @@ text = {
 st.set_page_config(page_title=text["title"], page_icon="🕘")
 st.title(text["title"])
 
-# --- Google Sheets 認證 ---
+# --- Google Sheets 認證（Secret 預設來自 st.secrets，可用 CHECKIN_SECRET_BACKEND 切換） ---
+secrets = get_secret_provider("streamlit")
 scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-info = dict(st.secrets["google_service_account"])
+info = dict(secrets.get("google_service_account"))
 credentials = Credentials.from_service_account_info(info, scopes=scope)
-client = gspread.authorize(credentials)
+client = sheets_client.authorize(credentials)
 spreadsheet = client.open("打卡紀錄")
 
 # --- 使用者資訊 ---
-users = st.secrets["users"]
+users = secrets.get("users")
 
 if "logged_in" not in st.session_state:
     st.session_state["logged_in"] = False
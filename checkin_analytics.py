@@ -0,0 +1,120 @@
+import os
+import numpy as np
+import pandas as pd
+
+# 預設班表（UTC+8 當地時間），頁面上可另外調整
+WORK_START = os.environ.get("CHECKIN_WORK_START", "09:00")
+WORK_END = os.environ.get("CHECKIN_WORK_END", "18:00")
+LATE_GRACE_MINUTES = int(os.environ.get("CHECKIN_LATE_GRACE_MINUTES", "5"))
+# 同一人兩次打卡間隔小於這個秒數視為重複刷卡，只算第一次
+DUPLICATE_SECONDS = 60
+DAY_SECONDS = 86400
+
+DAILY_COLUMNS = ["user", "date", "first_in", "last_out", "punches", "worked_hours", "late", "late_minutes", "early_leave", "missing_punch"]
+SUMMARY_COLUMNS = ["user", "days", "worked_hours", "avg_hours", "late_days", "late_minutes", "early_days", "missing_days"]
+
+
+def to_seconds(value):
+    if isinstance(value, str):
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 3600 + int(minutes) * 60
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+# --- 班表：上下班時間與遲到寬限（秒數，從當天 00:00 起算） ---
+class Schedule:
+    def __init__(self, start=WORK_START, end=WORK_END, grace_minutes=LATE_GRACE_MINUTES):
+        self.start = to_seconds(start)
+        self.end = to_seconds(end)
+        self.grace = int(grace_minutes) * 60
+
+
+# --- 出勤統計：依 (使用者, 日期) 分組，打卡依序兩兩配對為上班 / 下班 ---
+# 全部以 NumPy 陣列運算完成，不逐列迴圈；回傳 (每日明細, 每人彙總) 兩個 DataFrame
+def attendance(store, positions=None, schedule=None):
+    schedule = schedule or Schedule()
+    positions = store.order if positions is None else np.asarray(positions)
+    if len(positions) == 0:
+        return pd.DataFrame(columns=DAILY_COLUMNS), pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+    codes, ts = store.codes[positions], store.ts[positions]
+    perm = np.lexsort((ts, codes))
+    codes, ts = codes[perm], ts[perm]
+    days = ts // DAY_SECONDS
+
+    # 去掉重複刷卡：與同一人同一天的前一次打卡相隔太近
+    same_as_prev = np.zeros(len(ts), dtype=bool)
+    same_as_prev[1:] = (codes[1:] == codes[:-1]) & (days[1:] == days[:-1])
+    keep = ~(same_as_prev & (np.diff(ts, prepend=ts[0]) < DUPLICATE_SECONDS))
+    codes, ts, days, same_as_prev = codes[keep], ts[keep], days[keep], same_as_prev[keep]
+    same_as_prev[1:] = (codes[1:] == codes[:-1]) & (days[1:] == days[:-1])
+
+    # 每個 (使用者, 日期) 一組；group 為每筆打卡所屬的組別編號
+    starts = np.flatnonzero(~same_as_prev)
+    group = np.cumsum(~same_as_prev) - 1
+    punches = np.diff(np.append(starts, len(ts)))
+    rank = np.arange(len(ts)) - starts[group]
+
+    # 第 2、4、6… 次打卡是下班，和前一次配成一對；奇數次打卡的日子最後一次沒有配對
+    is_out = rank % 2 == 1
+    worked = np.bincount(group[is_out], weights=(ts - np.roll(ts, 1))[is_out], minlength=len(starts))
+
+    # 下班時間取最後一次配對到的下班打卡；沒有配對的上班打卡不算下班，也不判斷早退
+    missing = punches % 2 == 1
+    paired = punches - missing
+    first_in = ts[starts]
+    last_out = ts[starts + np.maximum(paired - 1, 0)]
+    first_tod = first_in - days[starts] * DAY_SECONDS
+    last_tod = last_out - days[starts] * DAY_SECONDS
+    late_seconds = first_tod - schedule.start
+    late = late_seconds > schedule.grace
+    early = ~missing & (last_tod < schedule.end)
+
+    daily = pd.DataFrame({
+        "user": pd.Categorical.from_codes(codes[starts], categories=store.categories),
+        "date": days[starts].astype("datetime64[D]"),
+        "first_in": first_in.astype("datetime64[s]"),
+        "last_out": np.where(paired >= 2, last_out, np.iinfo(np.int64).min).astype("datetime64[s]"),
+        "punches": punches,
+        "worked_hours": np.round(worked / 3600, 2),
+        "late": late,
+        "late_minutes": np.where(late, late_seconds // 60, 0),
+        "early_leave": early,
+        "missing_punch": missing,
+    })
+
+    summary = daily.groupby("user", observed=True).agg(
+        days=("date", "size"),
+        worked_hours=("worked_hours", "sum"),
+        late_days=("late", "sum"),
+        late_minutes=("late_minutes", "sum"),
+        early_days=("early_leave", "sum"),
+        missing_days=("missing_punch", "sum"),
+    ).reset_index()
+    summary.insert(3, "avg_hours", np.round(summary["worked_hours"] / summary["days"], 2))
+    summary["worked_hours"] = summary["worked_hours"].round(2)
+    return daily, summary[SUMMARY_COLUMNS]
+
+
+# --- 顯示與匯出用：日期時間轉成與工作表相同的文字格式，欄名換成目前語言 ---
+def format_daily(daily):
+    if daily.empty:
+        return daily
+    out = daily.copy()
+    out["user"] = out["user"].astype(str)
+    out["date"] = out["date"].dt.strftime("%Y/%m/%d")
+    for col in ("first_in", "last_out"):
+        out[col] = out[col].dt.strftime("%H:%M:%S").fillna("")
+    return out
+
+
+def labelled(frame, text):
+    return frame.rename(columns=text.get("attendance_columns", {}))
+
+
+def attendance_sheets(store, positions, text, schedule=None):
+    daily, summary = attendance(store, positions, schedule)
+    return [
+        (text.get("attendance_summary_sheet", "出勤統計"), labelled(summary.assign(user=summary["user"].astype(str)), text)),
+        (text.get("attendance_daily_sheet", "每日出勤"), labelled(format_daily(daily), text)),
+    ]
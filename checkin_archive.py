@@ -0,0 +1,159 @@
+import os
+import uuid
+import argparse
+import hashlib
+import threading
+import pandas as pd
+import gspread
+import sheets_client
+from checkin_storage import DATETIME_FORMAT, open_storage
+from checkin_store import TIMESTAMP_COL
+from checkin_user_index import get_user_index
+from checkin_cache import is_closed, current_month, month_cache
+from shared_cache import shared_cache
+
+ARCHIVE_DIR = os.environ.get("CHECKIN_ARCHIVE_DIR", "archive")
+
+_read_cache = {}
+_read_lock = threading.Lock()
+_reopens = {}  # (storage_key, month) -> 這個程序內重新開啟的次數
+_reopen_markers = {}  # (storage_key, month) -> 已處理過的共用標記
+
+
+# 每個儲存來源各自一個子目錄，避免本機 SQLite 與正式資料混用
+def archive_path(storage, month):
+    namespace = hashlib.sha1(storage.key.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(ARCHIVE_DIR, namespace, f"{month}.parquet")
+
+
+def is_archived(storage, month):
+    return os.path.exists(archive_path(storage, month))
+
+
+# --- 轉成有型別的欄位：文字欄位維持字串，另外加上真正的時間戳記 ---
+def to_typed_frame(df):
+    df = df.astype("string")
+    if "日期" in df.columns and "時間" in df.columns:
+        df[TIMESTAMP_COL] = pd.to_datetime(df["日期"] + " " + df["時間"], format=DATETIME_FORMAT, errors="coerce")
+    return df
+
+
+# 寫入暫存檔後再原子替換，避免讀到寫一半的檔案
+def archive_frame(storage, month, df):
+    path = archive_path(storage, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    to_typed_frame(df.drop(columns=[TIMESTAMP_COL], errors="ignore")).to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def archive_month(storage, month, overwrite=False):
+    if not is_closed(month):
+        raise ValueError(f"month {month} is not closed yet")
+    if is_archived(storage, month) and not overwrite:
+        return None
+    records = storage.get_month_values(month)
+    header, rows = (records[0], records[1:]) if records else ([], [])
+    width = len(header)
+    rows = [(row + [""] * width)[:width] for row in rows]
+    return archive_frame(storage, month, pd.DataFrame(rows, columns=header))
+
+
+# --- 讀取封存檔（依檔案修改時間快取，整個程序共用） ---
+def read_archive(storage, month):
+    path = archive_path(storage, month)
+    mtime = os.path.getmtime(path)
+    with _read_lock:
+        cached = _read_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    df = pd.read_parquet(path)
+    with _read_lock:
+        _read_cache[path] = (mtime, df)
+    return df
+
+
+# --- 已過去的月份又寫入了打卡（日誌在 Sheets 長時間中斷後補寫、kiosk 補送） ---
+# 封存檔、共用快取中的 "closed" 快照與使用者列號索引都已過時：刪除後下次讀取會重新從工作表下載並重新封存
+def _discard_local(storage, month):
+    path = archive_path(storage, month)
+    with _read_lock:
+        _reopens[(storage.key, month)] = _reopens.get((storage.key, month), 0) + 1
+        _read_cache.pop(path, None)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    month_cache.invalidate(storage.key, month)
+    index = get_user_index()
+    if index is not None:
+        index.reopen(storage.key, month)
+
+
+# 寫入佇列成功寫入已過去的月份後呼叫
+def reopen_month(storage, month):
+    _discard_local(storage, month)
+    shared_cache.delete(("month", storage.key, month, "closed"))
+    # 其他 instance 各自有本機的封存檔與快取，留下標記讓它們下次讀取時也丟掉
+    marker = uuid.uuid4().hex
+    with _read_lock:
+        _reopen_markers[(storage.key, month)] = marker
+    shared_cache.set(("reopened", storage.key, month), marker)
+
+
+# 讀取已過去的月份前呼叫：其他 instance 重新開啟過這個月份時丟掉本機的副本（未設定共用快取時不做任何事）
+def check_reopened(storage, month):
+    if not shared_cache.enabled:
+        return
+    marker = shared_cache.get(("reopened", storage.key, month))
+    with _read_lock:
+        if marker is None or _reopen_markers.get((storage.key, month)) == marker:
+            return
+        _reopen_markers[(storage.key, month)] = marker
+    _discard_local(storage, month)
+
+
+# 讀取期間有新的寫入時不封存，避免把寫入前的快照存成封存檔
+def reopen_count(storage, month):
+    with _read_lock:
+        return _reopens.get((storage.key, month), 0)
+
+
+def is_past(month):
+    return month < current_month()
+
+
+# --- 補封存所有既有的已結束月份 ---
+def backfill(storage, overwrite=False):
+    results = {}
+    for month in storage.list_months():
+        if not is_closed(month):
+            results[month] = "open"
+            continue
+        try:
+            results[month] = "archived" if archive_month(storage, month, overwrite) else "skipped"
+        except gspread.exceptions.WorksheetNotFound:
+            results[month] = "missing"
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="封存已結束月份的打卡資料為 Parquet 檔")
+    parser.add_argument("months", nargs="*", help="要封存的月份（YYYYMM），未指定時補封存全部")
+    parser.add_argument("--force", action="store_true", help="覆寫已存在的封存檔")
+    parser.add_argument("--credentials", default="service_account.json", help="Google 服務帳戶金鑰檔")
+    parser.add_argument("--spreadsheet", default="打卡紀錄", help="打卡紀錄試算表名稱")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(lambda: sheets_client.service_account(args.credentials).open(args.spreadsheet))
+    if args.months:
+        results = {m: "archived" if archive_month(storage, m, args.force) else "skipped" for m in args.months}
+    else:
+        results = backfill(storage, args.force)
+    for month, status in sorted(results.items()):
+        print(f"{month}\t{status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import time
+import itertools
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+from shared_cache import shared_cache
+
+# 當月工作表每隔一段時間整份重抓一次，避免有人手動修改舊資料時快取一直不一致
+FULL_REFRESH_SECONDS = 600
+
+# 共用快取中當月資料的新鮮期限與可先回舊值的期限（之後一律再補抓新增的列，不會漏掉打卡）
+SHARED_FRESH_SECONDS = 30
+SHARED_STALE_SECONDS = FULL_REFRESH_SECONDS
+
+# 月份結束後保留一段緩衝時間，讓日誌中延遲的打卡與 kiosk 補送的打卡先寫完才視為已結束（封存、不再補抓新增的列）
+# kiosk 可補送的時間不會超過這個值（kiosk_server.MAX_BACKDATE），沒有共用快取時其他程序也看得到補送的打卡
+CLOSE_GRACE = timedelta(hours=float(os.environ.get("CHECKIN_CLOSE_GRACE_HOURS", "72")))
+
+_generations = itertools.count(1)
+
+
+def current_month():
+    return (datetime.utcnow() + timedelta(hours=8)).strftime("%Y%m")
+
+
+# --- 判斷月份是否已結束（以 UTC+8 計算，並加上緩衝時間） ---
+def is_closed(month, now=None):
+    now = now or datetime.utcnow() + timedelta(hours=8)
+    year, mon = int(month[:4]), int(month[4:])
+    month_end = datetime(year + mon // 12, mon % 12 + 1, 1)
+    return now >= month_end + CLOSE_GRACE
+
+
+# --- 單一月份的快取內容 ---
+class MonthEntry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.header = None
+        self.frame = None
+        self.watermark = 0  # 已讀過的列數（含標題列）
+        self.loaded_at = 0.0
+        self.stale = False
+        self.closed = False
+        self.version = 0  # 內容有變動就遞增，讓下游的衍生快取判斷是否要重建
+        self.generation = 0  # 整份重新下載時遞增；同一 generation 內資料只會往後新增
+
+
+# --- 各月份打卡資料快取：以列數水位線只抓新增的部分，整個程序共用 ---
+class MonthRowCache:
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.stats = {"full_loads": 0, "incremental_loads": 0, "rows_fetched": 0, "hits": 0}
+
+    def _entry(self, storage_key, month):
+        with self._lock:
+            entry = self._entries.get((storage_key, month))
+            if entry is None:
+                entry = self._entries[(storage_key, month)] = MonthEntry()
+            return entry
+
+    # 取得整個月份的 DataFrame（共用物件，呼叫端請勿直接修改）
+    def get_frame(self, storage, month):
+        return self.get_snapshot(storage, month)[0]
+
+    # 同時取得 DataFrame 與 generation，兩者保證一致
+    def get_snapshot(self, storage, month):
+        entry = self._entry(storage.key, month)
+        with entry.lock:
+            if entry.frame is None or (time.time() - entry.loaded_at > FULL_REFRESH_SECONDS and not entry.closed):
+                self._load_full(storage, month, entry)
+            elif entry.closed and not entry.stale:
+                # 已結束的月份不會再變動，不重新下載
+                self.stats["hits"] += 1
+            else:
+                self._load_since(storage, month, entry)
+            entry.closed = is_closed(month)
+            entry.stale = False
+            return entry.frame, entry.generation
+
+    def _load_full(self, storage, month, entry):
+        # 已結束的月份內容不會再變，存在共用快取中不過期；key 含結束狀態，結束前的快照不會被當成完整資料
+        closed = is_closed(month)
+        records = shared_cache.get_or_load(
+            ("month", storage.key, month, "closed" if closed else "open"),
+            lambda: storage.get_month_values(month),
+            fresh_seconds=None if closed else SHARED_FRESH_SECONDS,
+            stale_seconds=SHARED_STALE_SECONDS,
+        )
+        header, rows = (records[0], records[1:]) if records else ([], [])
+        entry.header = header
+        entry.frame = self._to_frame(header, rows)
+        entry.watermark = len(records)
+        entry.loaded_at = time.time()
+        entry.version += 1
+        entry.generation = next(_generations)
+        self.stats["full_loads"] += 1
+        self.stats["rows_fetched"] += len(records)
+        if shared_cache.enabled and not closed:
+            # 共用快取中的快照可能較舊，補抓之後新增的列
+            self._load_since(storage, month, entry)
+
+    def _load_since(self, storage, month, entry):
+        rows = storage.get_month_values_since(month, entry.watermark)
+        self.stats["incremental_loads"] += 1
+        if not rows:
+            return
+        entry.frame = pd.concat([entry.frame, self._to_frame(entry.header, rows)], ignore_index=True)
+        entry.watermark += len(rows)
+        entry.version += 1
+        self.stats["rows_fetched"] += len(rows)
+
+    @staticmethod
+    def _to_frame(header, rows):
+        # 工作表回傳的列長度可能不一致，補齊或截斷成標題的欄數
+        width = len(header)
+        rows = [row[:width] if len(row) >= width else row + [""] * (width - len(row)) for row in rows]
+        return pd.DataFrame(rows, columns=header, dtype=str) if rows else pd.DataFrame(columns=header, dtype=str)
+
+    # 月份是否已在快取中（其他 session 或預先載入已經下載過）
+    def has(self, storage_key, month):
+        with self._lock:
+            entry = self._entries.get((storage_key, month))
+        return entry is not None and entry.frame is not None
+
+    # 有資料寫入某月份時呼叫；已結束的月份下次讀取會補抓新增的列
+    def mark_stale(self, storage_key, month):
+        with self._lock:
+            entry = self._entries.get((storage_key, month))
+        if entry is not None:
+            entry.stale = True
+
+    def invalidate(self, storage_key=None, month=None):
+        with self._lock:
+            for key in list(self._entries):
+                if (storage_key is None or key[0] == storage_key) and (month is None or key[1] == month):
+                    del self._entries[key]
+
+
+month_cache = MonthRowCache()
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+from checkin_queue import get_write_queue
+from checkin_journal import get_journal
+from perf_trace import span
+
+CHECKIN_TIMEOUT = 30
+
+
+# --- 打卡核心：Streamlit 頁面與 kiosk 服務共用，不依賴 st.session_state ---
+def now_local():
+    return datetime.utcnow() + timedelta(hours=8)
+
+
+def checkin_row(username, at):
+    return at.strftime("%Y%m"), [username, at.strftime("%Y/%m/%d"), at.strftime("%H:%M:%S")]
+
+
+# 送出多筆打卡（(month, row) 串列）
+# 有日誌時一次 fsync 後即完成，回傳空串列；沒有日誌時交給寫入佇列，回傳每一列的 Future
+def submit_checkins(storage, rows):
+    journal = get_journal(storage)
+    if journal is not None:
+        journal.append_many(rows)
+        return []
+    queue = get_write_queue(storage)
+    return [queue.submit(month, row) for month, row in rows]
+
+
+def record_checkin(storage, username, at=None):
+    at = at or now_local()
+    with span("checkin.submit", journaled=get_journal(storage) is not None):
+        for future in submit_checkins(storage, [checkin_row(username, at)]):
+            future.result(timeout=CHECKIN_TIMEOUT)
+    return at
@@ -0,0 +1,94 @@
+import io
+import csv
+import tempfile
+import numpy as np
+from openpyxl import Workbook
+
+EXPORT_CHUNK_ROWS = 5000
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CSV_MIME = "text/csv"
+# 標題列（csv 模組）與資料列（pandas）使用相同的換行
+CSV_LINE_TERMINATOR = "\r\n"
+
+
+# --- 依月份切開已依時間排序的列位置，每個月份各自一張工作表 ---
+def month_slices(store, positions):
+    if len(positions) == 0:
+        return
+    months = store.ts[positions].astype("datetime64[s]").astype("datetime64[M]")
+    bounds = np.concatenate([[0], np.flatnonzero(months[1:] != months[:-1]) + 1, [len(positions)]])
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        yield str(months[begin]).replace("-", ""), positions[begin:end]
+
+
+# 每次只把一小段轉成文字欄位，記憶體用量與總列數無關
+def iter_chunks(store, positions, column_map, chunk_rows=EXPORT_CHUNK_ROWS):
+    for i in range(0, len(positions), chunk_rows):
+        yield store.to_frame(positions[i:i + chunk_rows]).rename(columns=column_map)
+
+
+def export_header(store, column_map):
+    return [column_map.get(col, col) for col in (store.key_col, "日期", "時間")]
+
+
+# --- 額外的統計表（例如出勤統計），每個 (工作表名稱, DataFrame) 一張工作表 ---
+def write_frames(workbook, frames):
+    for title, frame in frames:
+        worksheet = workbook.create_sheet(title=title[:31])
+        worksheet.append(list(frame.columns))
+        for row in frame.astype(object).itertuples(index=False, name=None):
+            worksheet.append(row)
+
+
+# --- Excel：openpyxl write-only 模式，資料直接串流寫入暫存檔 ---
+def write_excel(store, positions, fileobj, column_map, chunk_rows=EXPORT_CHUNK_ROWS, extra_sheets=()):
+    workbook = Workbook(write_only=True)
+    header = export_header(store, column_map)
+    for month, part in month_slices(store, positions):
+        worksheet = workbook.create_sheet(title=month)
+        worksheet.append(header)
+        for chunk in iter_chunks(store, part, column_map, chunk_rows):
+            for row in chunk.itertuples(index=False, name=None):
+                worksheet.append(row)
+    if not workbook.worksheets:
+        workbook.create_sheet().append(header)
+    write_frames(workbook, extra_sheets)
+    workbook.save(fileobj)
+
+
+# --- CSV：比 Excel 快，加上 BOM 讓 Excel 正確顯示中文 ---
+def write_csv(store, positions, fileobj, column_map, chunk_rows=EXPORT_CHUNK_ROWS):
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    csv.writer(text, lineterminator=CSV_LINE_TERMINATOR).writerow(export_header(store, column_map))
+    for chunk in iter_chunks(store, positions, column_map, chunk_rows):
+        chunk.to_csv(text, header=False, index=False, lineterminator=CSV_LINE_TERMINATOR)
+    text.flush()
+    text.detach()
+
+
+# 產生匯出檔並回傳已倒回開頭的暫存檔（寫在磁碟上，不佔用記憶體）
+# extra_sheets 為呼叫時才計算的 [(工作表名稱, DataFrame)]，只加在 Excel 檔中
+def export_file(store, positions, column_map, fmt="xlsx", chunk_rows=EXPORT_CHUNK_ROWS, extra_sheets=None):
+    fileobj = tempfile.TemporaryFile()
+    if fmt == "csv":
+        write_csv(store, positions, fileobj, column_map, chunk_rows)
+    else:
+        write_excel(store, positions, fileobj, column_map, chunk_rows, extra_sheets() if extra_sheets else ())
+    fileobj.seek(0)
+    return fileobj
+
+
+# 只有統計表的匯出檔；CSV 只能放一張表，只寫第一個
+def export_frames(frames, fmt="xlsx"):
+    fileobj = tempfile.TemporaryFile()
+    if fmt == "csv":
+        text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+        frames[0][1].to_csv(text, index=False, lineterminator=CSV_LINE_TERMINATOR)
+        text.flush()
+        text.detach()
+    else:
+        workbook = Workbook(write_only=True)
+        write_frames(workbook, frames)
+        workbook.save(fileobj)
+    fileobj.seek(0)
+    return fileobj
@@ -1,113 +1,218 @@
 
 import streamlit as st
 import pandas as pd
-import io
 from datetime import datetime, timedelta
 import gspread
+from checkin_storage import CheckinStorage, GspreadStorage
+from checkin_core import record_checkin
+from checkin_store import MissingColumns
+from checkin_query import load_month_store, load_range, day_bounds
+from checkin_prefetch import get_prefetcher
+from checkin_export import export_file, XLSX_MIME, CSV_MIME
+from checkin_analytics import attendance_sheets
+from perf_trace import span
+
+# --- 統一轉成儲存介面（相容直接傳入 gspread Spreadsheet 的舊呼叫方式） ---
+def as_storage(storage):
+    if isinstance(storage, CheckinStorage):
+        return storage
+    return GspreadStorage(storage)
 
 # --- 取得當月工作表 ---
 def get_sheet_for(spreadsheet, dt):
-    sheet_name = dt.strftime("%Y%m")
-    try:
-        return spreadsheet.worksheet(sheet_name)
-    except gspread.exceptions.WorksheetNotFound:
-        worksheet = spreadsheet.add_worksheet(title=sheet_name, rows=1000, cols=10)
-        worksheet.append_row(["姓名", "日期", "時間"])
-        return worksheet
+    return GspreadStorage(spreadsheet).worksheet(dt.strftime("%Y%m"), create=True)
 
 # --- 打卡功能 ---
-def check_in(spreadsheet, text):
-    now = datetime.utcnow() + timedelta(hours=8)
-    date = now.strftime("%Y/%m/%d")
-    time = now.strftime("%H:%M:%S")
-    sheet = get_sheet_for(spreadsheet, now)
-    sheet.append_row([st.session_state["username"], date, time])
-    st.success(f"{text['checkin_success']}{date} {time}")
+def check_in(storage, text):
+    at = record_checkin(as_storage(storage), st.session_state["username"])
+    st.success(f"{text['checkin_success']}{at.strftime('%Y/%m/%d')} {at.strftime('%H:%M:%S')}")
     st.rerun()
 
+# --- 分頁：每次只把目前這一頁轉成 DataFrame 送到瀏覽器 ---
+PAGE_SIZES = (25, 50, 100, 200)
+
+def jump_to_date(store, positions, page_size, newest_first, key):
+    picked = st.session_state.get(f"{key}_jump")
+    if picked is None:
+        return
+    if newest_first:
+        # 由新到舊：跳到選定日期（含）以前最新的一筆
+        index = len(positions) - store.search(positions, picked + timedelta(days=1))
+    else:
+        index = store.search(positions, picked)
+    index = min(index, len(positions) - 1)
+    st.session_state[f"{key}_page"] = index // page_size + 1
+
+def paginate(store, positions, text, key):
+    total = len(positions)
+    col1, col2, col3, col4 = st.columns(4)
+    page_size = col1.selectbox(text.get("page_size", "每頁筆數"), PAGE_SIZES, index=1, key=f"{key}_page_size")
+    newest_first = col2.toggle(text.get("newest_first", "最新的在前"), value=True, key=f"{key}_newest_first")
+
+    # 換了月份或人員後，先前的頁數與日期可能超出範圍
+    pages = (total - 1) // page_size + 1
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    first_day, last_day = (pd.Timestamp(store.ts[positions[i]], unit="s").date() for i in (0, -1))
+    picked = st.session_state.get(f"{key}_jump")
+    if picked is not None and not first_day <= picked <= last_day:
+        st.session_state[f"{key}_jump"] = None
+
+    col3.date_input(
+        text.get("jump_to_date", "跳到日期"), value=None, min_value=first_day, max_value=last_day, key=f"{key}_jump",
+        on_change=jump_to_date, args=(store, positions, page_size, newest_first, key)
+    )
+    page = col4.number_input(text.get("page", "頁數"), min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    start = (page - 1) * page_size
+    ordered = positions[::-1] if newest_first else positions
+    return ordered[start:start + page_size], start
+
+# --- 表格顯示與管理者下載（單月與跨月份查詢共用） ---
+def render_records(store, positions, text, export_name=None, user_label=None, key="records"):
+    column_map = text["columns"]
+    visible, start = paginate(store, positions, text, key)
+    with span("records.to_frame", rows=len(visible)):
+        df_display = store.to_frame(visible).rename(columns=column_map)
+        df_display.index = pd.RangeIndex(start + 1, start + 1 + len(visible))
+    with span("records.table"):
+        st.dataframe(df_display, width="stretch")
+    st.caption(text.get("rows_range", "第 {start}–{end} 筆，共 {total} 筆").format(
+        start=start + 1, end=start + len(visible), total=f"{len(positions):,}"
+    ))
+
+    if export_name is not None:
+        # 按下下載後才在背景產生檔案，以串流方式分段寫入，不需把全部資料放進記憶體
+        export_formats = {"xlsx": "Excel", "csv": "CSV"}
+        export_format = st.radio(
+            text.get("export_format", "匯出格式"), list(export_formats),
+            format_func=export_formats.get, horizontal=True
+        )
+        # Excel 可附上出勤統計（每人彙總與每日明細各一張工作表）
+        extra_sheets = None
+        if export_format == "xlsx" and st.checkbox(text.get("export_attendance", "包含出勤統計"), key=f"{key}_attendance"):
+            extra_sheets = lambda: attendance_sheets(store, positions, text)
+        st.download_button(
+            label="📥 " + (text["download"] if export_format == "xlsx" else text.get("download_csv", "下載 CSV")),
+            data=lambda: export_file(store, positions, column_map, export_format, extra_sheets=extra_sheets),
+            file_name=f"{export_name}_{user_label}_{text['file_label']}.{export_format}",
+            mime=XLSX_MIME if export_format == "xlsx" else CSV_MIME
+        )
+
+def show_missing_columns(e, text):
+    if e.kind == "key":
+        st.warning(text["missing_column"])
+    else:
+        st.warning("⚠️ 表單缺少『日期』或『時間』欄位，無法顯示打卡時間排序")
+
+# --- 管理者選擇人員（回傳 None 表示所有人） ---
+def select_user(store, text):
+    user_list = store.users
+    user_list.insert(0, text["all_users_label"])
+    selected_user = st.selectbox(text["select_user"], user_list)
+    return None if selected_user == text["all_users_label"] else selected_user
+
+# --- 跨月份日期區間查詢（管理者） ---
+def show_range_records(storage, text, available_sheets):
+    today = (datetime.utcnow() + timedelta(hours=8)).date()
+    picked = st.date_input(text.get("date_range", "請選擇日期區間："), value=(today.replace(day=1), today))
+    if not isinstance(picked, (list, tuple)) or len(picked) != 2:
+        return
+    start, end = picked
+
+    try:
+        # 各月份同時抓取，合併成一個依時間排序的 store
+        with span("records.load_range", start=start, end=end):
+            store, timing = load_range(storage, start, end, available_sheets)
+        st.caption(
+            f"⏱️ {timing['months']} months · {timing['wall']:.2f}s "
+            f"(sequential {timing['sequential']:.2f}s, ×{timing['speedup']:.1f})"
+        )
+        if len(store) == 0:
+            st.info(text["no_data"])
+            return
+
+        selected_user = select_user(store, text)
+        with span("records.select"):
+            positions = store.select(selected_user, *day_bounds(start, end))
+        if len(positions) == 0:
+            st.info(text["no_data"])
+            return
+
+        user_label = selected_user or text["all_users_label"]
+        render_records(store, positions, text, f"{start:%Y%m%d}-{end:%Y%m%d}", user_label, key="records_range")
+
+    except MissingColumns as e:
+        show_missing_columns(e, text)
+    except Exception as e:
+        st.error(f"{text['read_error']}{e}")
+
 # --- 查看紀錄 ---
-def show_checkin_records(spreadsheet, text, lang):
+def show_checkin_records(storage, text, lang):
+    storage = as_storage(storage)
     st.subheader(text["history_title"])
 
-    @st.cache_data(ttl=60)
-    def get_all_worksheets_titles():
-        return [ws.title for ws in spreadsheet.worksheets() if ws.title.isdigit()]
-
-    available_sheets = sorted(get_all_worksheets_titles())
+    # 工作表清單由儲存層共用的 metadata 快取提供
+    with span("records.list_months"):
+        available_sheets = sorted(storage.list_months())
 
     if not available_sheets:
         st.warning("⚠️ 尚無任何打卡工作表")
         return
 
+    is_admin = st.session_state.get("role") == "admin"
+
+    if is_admin:
+        view_modes = {
+            "month": text.get("view_mode_month", "📅 單一月份"),
+            "range": text.get("view_mode_range", "🗓️ 日期區間")
+        }
+        view_mode = st.radio(text.get("view_mode", "檢視方式"), list(view_modes), format_func=view_modes.get, horizontal=True)
+        if view_mode == "range":
+            show_range_records(storage, text, available_sheets)
+            return
+
     current_month = datetime.utcnow() + timedelta(hours=8)
     current_sheet = current_month.strftime("%Y%m")
     default_index = available_sheets.index(current_sheet) if current_sheet in available_sheets else 0
 
     selected_month = st.selectbox(text["select_month"], available_sheets, index=default_index)
 
-    try:
-        sheet = spreadsheet.worksheet(selected_month)
-        records = sheet.get_all_values()
-
-        if len(records) <= 1:
-            st.info("⚠️ 這個月份尚無任何打卡資料")
-            return
+    # 背景預先載入前後月份，切換月份時通常已在快取中（走索引查詢的一般使用者不需要整個月份）
+    prefetcher = get_prefetcher(storage)
+    if prefetcher is not None and (is_admin or not storage.indexed_user_reads):
+        prefetcher.around(selected_month, available_sheets)
 
-        header, *rows = records
-        df = pd.DataFrame(rows, columns=header)
+    try:
+        username = None if is_admin else st.session_state["username"]
+        with span("records.load_month", month=selected_month):
+            store = load_month_store(storage, selected_month, username)
 
-        if "帳號" in df.columns:
-            key_col = "帳號"
-        elif "姓名" in df.columns:
-            key_col = "姓名"
-        else:
-            st.warning(text["missing_column"])
+        if len(store) == 0:
+            st.info("⚠️ 這個月份尚無任何打卡資料" if is_admin else text["no_record"])
             return
 
-        is_admin = st.session_state.get("role") == "admin"
-
+        # 篩選直接在已排序的欄式資料上切片，不需重新解析時間字串
         if is_admin:
-            user_list = sorted(df[key_col].unique())
-            user_list.insert(0, text["all_users_label"])
-            selected_user = st.selectbox(text["select_user"], user_list)
-            if selected_user != text["all_users_label"]:
-                df = df[df[key_col] == selected_user]
+            st.caption(f"📦 {len(store):,} rows · {store.memory_bytes / 1024:.1f} KiB")
+            selected_user = select_user(store, text)
+            with span("records.select"):
+                positions = store.select(user=selected_user)
         else:
-            df = df[df[key_col] == st.session_state["username"]]
+            with span("records.select"):
+                positions = store.select(user=username)
 
-        if df.empty:
+        if len(positions) == 0:
             st.info(text["no_record"] if not is_admin else text["no_data"])
             return
 
-        if "日期" not in df.columns or "時間" not in df.columns:
-            st.warning("⚠️ 表單缺少『日期』或『時間』欄位，無法顯示打卡時間排序")
-        else:
-            try:
-                df["打卡時間"] = pd.to_datetime(df["日期"] + " " + df["時間"], format="%Y/%m/%d %H:%M:%S", errors='coerce')
-                df = df.dropna(subset=["打卡時間"])
-                df = df.sort_values("打卡時間").head(100).reset_index(drop=True)
-                df.index += 1
-            except Exception as e:
-                st.error(f"❌ 時間欄位處理錯誤：{e}")
-
-        column_map = text["columns"]
-        df_display = df.drop(columns=["打卡時間"], errors="ignore").rename(columns=column_map)
-        st.table(df_display)
-
         if is_admin:
-            excel_buffer = io.BytesIO()
-            df_display.to_excel(excel_buffer, index=False, sheet_name=selected_month)
-            excel_buffer.seek(0)
-            user_label = selected_user if selected_user != text["all_users_label"] else text["all_users_label"]
-            filename = f"{selected_month}_{user_label}_{text['file_label']}.xlsx"
-
-            st.download_button(
-                label="📥 " + text["download"],
-                data=excel_buffer,
-                file_name=filename,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            render_records(store, positions, text, selected_month, selected_user or text["all_users_label"])
+        else:
+            render_records(store, positions, text)
 
+    except MissingColumns as e:
+        show_missing_columns(e, text)
     except gspread.exceptions.WorksheetNotFound:
         st.error(f"{text['sheet_not_found']}{selected_month}")
     except Exception as e:
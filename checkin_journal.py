@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import uuid
+import random
+import socket
+import hashlib
+import threading
+from collections import OrderedDict
+
+# gspread 與寫入佇列（pandas 等）在建立日誌時才匯入：app 啟動時只用 has_pending_journal 檢查目錄，不載入它們
+
+JOURNAL_DIR = os.environ.get("CHECKIN_JOURNAL_DIR", "journal")
+JOURNAL_ENABLED = os.environ.get("CHECKIN_JOURNAL", "1") != "0"
+COMPACT_BYTES = 1024 * 1024
+MAX_BACKOFF = 60
+
+try:
+    import fcntl
+except ImportError:
+    # 沒有 flock 的平台（Windows 本機開發）只會有一個程序使用日誌目錄
+    fcntl = None
+
+
+# --- 讀出日誌檔中尚未確認的打卡：entry_id -> (month, row) ---
+def read_pending(path):
+    pending = OrderedDict()
+    try:
+        f = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return pending
+    with f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 最後一行可能在寫入途中中斷，直接略過
+                continue
+            if entry.get("op") == "put":
+                pending[entry["id"]] = (entry["month"], entry["row"])
+            elif entry.get("op") == "ack":
+                for entry_id in entry["ids"]:
+                    pending.pop(entry_id, None)
+    return pending
+
+
+# --- 檔案鎖：擁有者程序結束（包括當機）時由系統自動釋放 ---
+# create=False 時鎖檔不存在也視為取得（擁有者已清掉或是舊版的日誌）
+def lock_file(path, blocking=False, create=True):
+    while True:
+        try:
+            fd = os.open(path, os.O_RDWR | (os.O_CREAT if create else 0), 0o644)
+        except FileNotFoundError:
+            return -1
+        if fcntl is None:
+            return fd
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # 等待期間鎖檔可能已被前一個持有者刪除，鎖到的是已刪除的檔案就重來
+        try:
+            if os.stat(path).st_ino == os.fstat(fd).st_ino:
+                return fd
+        except FileNotFoundError:
+            if not create:
+                os.close(fd)
+                return -1
+        os.close(fd)
+
+
+def unlock_file(fd, path=None):
+    if fd is None or fd < 0:
+        return
+    if path is not None:
+        # 先刪除再釋放，等待中的程序不會拿到已刪除的鎖檔
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    os.close(fd)
+
+
+# --- 打卡預寫日誌：先 fsync 到本機檔案，再由背景執行緒補寫到工作表 ---
+# 檔案為 JSON Lines，"put" 為一筆打卡，"ack" 表示已確認寫入工作表
+# 每個程序寫自己的檔案（網頁與 kiosk 服務可共用同一個日誌目錄），並以 <檔名>.lock 的 flock 標記仍在執行；
+# 啟動時接手同一組（group）中擁有者已結束的檔案，補寫其中尚未確認的打卡
+class CheckinJournal:
+    def __init__(self, storage, path, queue=None, group=None):
+        self.storage = storage
+        self.path = path
+        self.group = group
+        if queue is None:
+            from checkin_queue import get_write_queue
+            queue = get_write_queue(storage)
+        self.queue = queue
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._pending = OrderedDict()  # entry_id -> (month, row)
+        self._recovered = set()  # 重新啟動時讀回或寫入失敗、可能已寫入過的 entry
+        self._stats = {"journaled": 0, "replayed": 0, "deduped": 0, "retries": 0}
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._owner = lock_file(self.path + ".lock", blocking=True)
+        self._pending.update(read_pending(self.path))
+        adopt_lock, orphans = self._adopt_orphans()
+        self._recovered = set(self._pending)
+        try:
+            self._rewrite()
+        finally:
+            # 接手的資料已 fsync 到自己的檔案後才刪除原檔
+            for orphan, fd in orphans:
+                os.remove(orphan)
+                unlock_file(fd, orphan + ".lock")
+            unlock_file(adopt_lock)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, name="checkin-journal", daemon=True)
+        self._thread.start()
+        if self._pending:
+            self._wake.set()
+
+    # 回傳 (目錄層級的接手鎖, [(已讀入的檔案, 其鎖)])；同一時間只有一個程序在接手
+    def _adopt_orphans(self):
+        if self.group is None:
+            return None, []
+        directory = os.path.dirname(os.path.abspath(self.path))
+        adopt_lock = lock_file(os.path.join(directory, f"{self.group}.adopt.lock"), blocking=True)
+        orphans = []
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.startswith(self.group) or not name.endswith(".log") or path == os.path.abspath(self.path):
+                continue
+            fd = lock_file(path + ".lock", create=False)
+            if fd is None:
+                continue  # 擁有者還在執行
+            self._pending.update(read_pending(path))
+            orphans.append((path, fd))
+        return adopt_lock, orphans
+
+    # 只保留尚未確認的資料，寫入暫存檔後再原子替換
+    def _rewrite(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry_id, (month, row) in self._pending.items():
+                f.write(json.dumps({"op": "put", "id": entry_id, "month": month, "row": row}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _write(self, entry, sync=True):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    # 寫入日誌並 fsync 後即回傳，不等待 Google Sheets
+    def append(self, month, row):
+        return self.append_many([(month, row)])[0]
+
+    # 多筆打卡只 fsync 一次（kiosk 批次或同時送達的打卡）
+    def append_many(self, entries):
+        entry_ids = []
+        with self._lock:
+            for month, row in entries:
+                entry_id = uuid.uuid4().hex
+                row = list(row)
+                self._write({"op": "put", "id": entry_id, "month": month, "row": row, "at": time.time()}, sync=False)
+                self._pending[entry_id] = (month, row)
+                entry_ids.append(entry_id)
+            os.fsync(self._file.fileno())
+            self._stats["journaled"] += len(entry_ids)
+        self._wake.set()
+        return entry_ids
+
+    def pending_rows(self, month):
+        with self._lock:
+            return [list(row) for m, row in self._pending.values() if m == month]
+
+    def _ack(self, entry_ids):
+        if not entry_ids:
+            return
+        with self._lock:
+            # ack 遺失時重啟會再比對工作表去重，因此不必 fsync
+            self._write({"op": "ack", "ids": list(entry_ids)}, sync=False)
+            for entry_id in entry_ids:
+                self._pending.pop(entry_id, None)
+                self._recovered.discard(entry_id)
+            if not self._pending and self._file.tell() > COMPACT_BYTES:
+                self._file.close()
+                self._file = open(self.path, "w", encoding="utf-8")
+
+    # 重啟後讀回的資料可能在當機前已寫入、寫入失敗的資料可能其實已套用，先比對工作表內容避免重複
+    def _dedupe_recovered(self, batch):
+        recovered = [(entry_id, month, row) for entry_id, (month, row) in batch.items() if entry_id in self._recovered]
+        if not recovered:
+            return
+        import gspread
+        existing = {}
+        for month in {month for _, month, _ in recovered}:
+            try:
+                records = self.storage.get_month_values(month)
+            except gspread.exceptions.WorksheetNotFound:
+                records = []
+            existing[month] = {tuple(r[:3]) for r in records[1:]}
+        duplicates = [entry_id for entry_id, month, row in recovered if tuple(row[:3]) in existing[month]]
+        for entry_id in duplicates:
+            batch.pop(entry_id)
+        with self._lock:
+            self._recovered.difference_update(entry_id for entry_id, _, _ in recovered)
+            self._stats["deduped"] += len(duplicates)
+            self._stats["replayed"] += len(recovered) - len(duplicates)
+        self._ack(duplicates)
+
+    def _mark_uncertain(self, entry_ids):
+        with self._lock:
+            self._recovered.update(entry_id for entry_id in entry_ids if entry_id in self._pending)
+
+    def _run(self):
+        attempt = 0
+        delay = None
+        while True:
+            self._wake.wait(delay)
+            self._wake.clear()
+            with self._lock:
+                batch = OrderedDict(self._pending)
+            if not batch:
+                if self._closed:
+                    return
+                delay = None
+                continue
+
+            try:
+                self._dedupe_recovered(batch)
+                futures = [(entry_id, self.queue.submit(month, row)) for entry_id, (month, row) in batch.items()]
+            except Exception:
+                # 可能有一部分已送進寫入佇列，重試前一樣先比對工作表
+                self._mark_uncertain(batch)
+                failed = True
+            else:
+                done, uncertain = [], []
+                for entry_id, future in futures:
+                    try:
+                        future.result()
+                        done.append(entry_id)
+                    except Exception:
+                        uncertain.append(entry_id)
+                self._ack(done)
+                # 逾時、5xx 或連線中斷時寫入可能其實已套用，重試前先比對工作表，避免重複打卡
+                self._mark_uncertain(uncertain)
+                failed = bool(uncertain)
+
+            if failed:
+                # 指數退避加上隨機抖動，避免 429 時同時重試
+                attempt += 1
+                with self._lock:
+                    self._stats["retries"] += 1
+                delay = min(MAX_BACKOFF, 2 ** attempt) * (0.5 + random.random())
+                if self._closed:
+                    return
+            else:
+                attempt = 0
+                delay = None if not self._closed else 0
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        with self._lock:
+            self._file.close()
+            if not self._pending:
+                os.remove(self.path)
+            unlock_file(self._owner, self.path + ".lock")
+
+
+# 日誌目錄中是否有尚未確認的打卡：比對每個檔案的 put / ack（已確認的打卡在壓縮前仍留在檔案中，不能只看檔案大小）
+# 只用標準函式庫，app 啟動時檢查不會載入 gspread、pandas，也不開啟 Google Sheets
+def has_pending_journal(directory=JOURNAL_DIR):
+    if not JOURNAL_ENABLED:
+        return False
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return False
+    return any(name.endswith(".log") and read_pending(os.path.join(directory, name)) for name in names)
+
+
+# --- 全程序共用的日誌（每個儲存來源一個檔案） ---
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(storage):
+    if not JOURNAL_ENABLED:
+        return None
+    with _journals_lock:
+        journal = _journals.get(storage.key)
+        if journal is None:
+            name = hashlib.sha1(storage.key.encode("utf-8")).hexdigest()[:12]
+            # 主機名稱加上 pid：共用磁碟區的多個容器（pid 都可能是 1）也不會寫到同一個檔案
+            path = os.path.join(JOURNAL_DIR, f"{name}-{socket.gethostname()}-{os.getpid()}.log")
+            journal = _journals[storage.key] = CheckinJournal(storage, path, group=name)
+        return journal
@@ -0,0 +1,119 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from checkin_archive import is_archived
+from checkin_cache import current_month
+from checkin_query import load_month_store
+from perf_trace import span
+
+# 登入後在背景先載入工作表清單與本月資料，選到某個月份時再預先載入前後月份
+PREFETCH_ENABLED = os.environ.get("CHECKIN_PREFETCH", "1") != "0"
+PREFETCH_WORKERS = int(os.environ.get("CHECKIN_PREFETCH_WORKERS", "2"))
+# 排隊中的工作上限；超過時直接略過（預先載入只是加速，不影響正確性）
+MAX_PENDING = 8
+# 同一個月份在這段時間內不重複預先載入（當月資料平時由增量讀取保持最新）
+COOLDOWN_SECONDS = 60
+NEIGHBOURS = 1
+
+logger = logging.getLogger("checkin.prefetch")
+
+
+# --- 每個儲存來源一個預先載入器，所有 session 共用同一個有上限的執行緒池 ---
+class Prefetcher:
+    def __init__(self, storage, workers=PREFETCH_WORKERS):
+        self.storage = storage
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="checkin-prefetch")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._done_at = {}
+        self.stats = {"submitted": 0, "skipped": 0, "completed": 0, "errors": 0}
+
+    def _submit(self, name, func, *args):
+        with self._lock:
+            recent = time.monotonic() - self._done_at.get(name, float("-inf")) < COOLDOWN_SECONDS
+            if name in self._pending or recent or len(self._pending) >= MAX_PENDING:
+                self.stats["skipped"] += 1
+                return False
+            self._pending.add(name)
+            self.stats["submitted"] += 1
+        self._pool.submit(self._run, name, func, *args)
+        return True
+
+    def _run(self, name, func, *args):
+        try:
+            with span("prefetch.run", task=name):
+                func(*args)
+            with self._lock:
+                self.stats["completed"] += 1
+                self._done_at[name] = time.monotonic()
+        except Exception as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            logger.warning("prefetch %s failed: %s", name, e)
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    # 已封存的月份讀本機檔案，不需要預先載入
+    def _load_month(self, month):
+        if not is_archived(self.storage, month):
+            load_month_store(self.storage, month)
+
+    def _warm_session(self, full_month):
+        months = self.storage.list_months()
+        month = current_month()
+        if full_month and month in months:
+            self._load_month(month)
+
+    # 登入時：工作表清單與本月資料（一般使用者走索引查詢時只需要清單）
+    def warm_session(self, full_month=True):
+        return self._submit(f"session:{full_month}", self._warm_session, full_month)
+
+    # 選到某個月份時：前後相鄰的月份（管理者翻到上個月通常是下一個動作）
+    def around(self, month, available):
+        available = sorted(available)
+        if month not in available:
+            return
+        index = available.index(month)
+        for neighbour in available[max(index - NEIGHBOURS, 0):index + NEIGHBOURS + 1]:
+            if neighbour != month:
+                self._submit(f"month:{neighbour}", self._load_month, neighbour)
+
+    def metrics(self):
+        with self._lock:
+            return {"pending": len(self._pending), **self.stats}
+
+
+# --- 全程序共用（每個儲存來源一個） ---
+_prefetchers = {}
+_prefetchers_lock = threading.Lock()
+
+
+def get_prefetcher(storage):
+    if not PREFETCH_ENABLED:
+        return None
+    with _prefetchers_lock:
+        prefetcher = _prefetchers.get(storage.key)
+        if prefetcher is None:
+            prefetcher = _prefetchers[storage.key] = Prefetcher(storage)
+        return prefetcher
+
+
+# --- 登入按鈕按下時呼叫：開啟儲存來源也在背景進行，不拖慢登入 ---
+_login_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkin-prefetch-login")
+
+
+def prefetch_after_login(open_storage, is_admin):
+    if not PREFETCH_ENABLED:
+        return
+
+    def run():
+        try:
+            storage = open_storage()
+            get_prefetcher(storage).warm_session(full_month=is_admin or not storage.indexed_user_reads)
+        except Exception as e:
+            logger.warning("prefetch after login failed: %s", e)
+
+    _login_pool.submit(run)
@@ -0,0 +1,96 @@
+import os
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from checkin_journal import get_journal
+from checkin_cache import month_cache, is_closed
+from checkin_archive import archive_path, is_archived, read_archive, archive_frame, check_reopened, reopen_count, is_past
+from checkin_store import MonthStore, store_cache
+from perf_trace import span
+
+RANGE_WORKERS = int(os.environ.get("CHECKIN_RANGE_WORKERS", "8"))
+
+
+# --- 讀取月份資料並轉成欄式 store：已封存讀本機檔案，否則使用共用的月份快取 ---
+# 一般使用者只有在月份還不在快取中時才走索引查詢（只抓自己的列）；已在快取中時由呼叫端從共用的 store 切片，API 呼叫較少
+def load_month_store(storage, month, username=None):
+    if is_past(month):
+        check_reopened(storage, month)
+    if is_archived(storage, month):
+        # 已結束的月份不會再變動，直接讀封存檔，不呼叫 Sheets API
+        path = archive_path(storage, month)
+        return store_cache.get(path, read_archive(storage, month), os.path.getmtime(path))
+
+    if username is not None and storage.indexed_user_reads and not month_cache.has(storage.key, month):
+        header, *rows = storage.get_user_values(month, username)
+        store = MonthStore.from_frame(pd.DataFrame(rows, columns=header))
+    else:
+        reopens = reopen_count(storage, month)
+        frame, generation = month_cache.get_snapshot(storage, month)
+        if is_closed(month) and not frame.empty and reopen_count(storage, month) == reopens:
+            archive_frame(storage, month, frame)
+            month_cache.invalidate(storage.key, month)
+            return load_month_store(storage, month, username)
+        store = store_cache.get((storage.key, month), frame, generation)
+
+    # 補上已寫入日誌、但尚未寫進工作表的打卡
+    journal = get_journal(storage)
+    if journal is not None:
+        pending = journal.pending_rows(month)
+        if username is not None:
+            pending = [row for row in pending if row[0] == username]
+        if pending:
+            store = store.extend(pd.DataFrame([row[:3] for row in pending], columns=[store.key_col, "日期", "時間"]))
+    return store
+
+
+# --- 日期區間涵蓋的月份（YYYYMM），只保留實際存在的工作表 ---
+def months_between(start, end, available=None):
+    months = []
+    year, mon = start.year, start.month
+    while (year, mon) <= (end.year, end.month):
+        months.append(f"{year}{mon:02d}")
+        year, mon = (year + 1, 1) if mon == 12 else (year, mon + 1)
+    if available is not None:
+        available = set(available)
+        months = [m for m in months if m in available]
+    return months
+
+
+# --- 跨月份查詢：同時抓取各月份後合併成一個依時間排序的 store ---
+# 回傳 (store, timing)；timing 內含實際耗時與逐月依序抓取的耗時總和，用來估算加速倍數
+def load_range(storage, start, end, available=None, username=None, workers=RANGE_WORKERS):
+    months = months_between(start, end, available)
+
+    def fetch(month):
+        began = time.perf_counter()
+        with span("records.load_month", month=month):
+            store = load_month_store(storage, month, username)
+        return store, time.perf_counter() - began
+
+    began = time.perf_counter()
+    if workers > 1 and len(months) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(months)), thread_name_prefix="checkin-range") as pool:
+            # 每個工作執行緒帶著呼叫端的 context，API 呼叫次數才會算到這次 rerun
+            contexts = [contextvars.copy_context() for _ in months]
+            results = list(pool.map(lambda ctx, month: ctx.run(fetch, month), contexts, months))
+    else:
+        results = [fetch(month) for month in months]
+    wall = time.perf_counter() - began
+
+    store = MonthStore.concat([s for s, _ in results])
+    sequential = sum(elapsed for _, elapsed in results)
+    timing = {
+        "months": len(months),
+        "wall": wall,
+        "sequential": sequential,
+        "speedup": sequential / wall if wall > 0 and months else 1.0,
+        "per_month": dict(zip(months, (elapsed for _, elapsed in results))),
+    }
+    return store, timing
+
+
+def day_bounds(start, end):
+    # select() 的區間為 [start, end)，結束日要包含當天
+    return pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)
@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from checkin_cache import month_cache
+from checkin_archive import reopen_month, is_past
+
+DEFAULT_FLUSH_MS = int(os.environ.get("CHECKIN_FLUSH_MS", "200"))
+DEFAULT_FLUSH_ROWS = int(os.environ.get("CHECKIN_FLUSH_ROWS", "200"))
+
+
+# --- 打卡寫入佇列：把所有 session 的打卡合併成每個月份一次 append_rows ---
+class CheckinWriteQueue:
+    def __init__(self, storage, flush_ms=DEFAULT_FLUSH_MS, flush_rows=DEFAULT_FLUSH_ROWS):
+        self.storage = storage
+        self.flush_interval = flush_ms / 1000
+        self.flush_rows = flush_rows
+        self._pending = []  # [(month, row, future)]
+        self._first_enqueued = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            "submitted": 0,
+            "flushes": 0,
+            "rows_flushed": 0,
+            "api_calls": 0,
+            "last_flush_size": 0,
+            "max_flush_size": 0,
+            "max_queue_depth": 0,
+            "errors": 0,
+        }
+        self._thread = threading.Thread(target=self._run, name="checkin-write-queue", daemon=True)
+        self._thread.start()
+
+    # 送出一筆打卡，回傳 Future；結果為寫入的那一列，失敗時帶出例外
+    def submit(self, month, row):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write queue is closed")
+            self._pending.append((month, list(row), future))
+            if self._first_enqueued is None:
+                self._first_enqueued = time.monotonic()
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], len(self._pending))
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and not self._due():
+                    timeout = None
+                    if self._first_enqueued is not None:
+                        timeout = max(0, self._first_enqueued + self.flush_interval - time.monotonic())
+                    self._cond.wait(timeout)
+                if self._closed and not self._pending:
+                    return
+            self.flush()
+
+    def _due(self):
+        if not self._pending:
+            return False
+        if len(self._pending) >= self.flush_rows:
+            return True
+        return time.monotonic() - self._first_enqueued >= self.flush_interval
+
+    # 立即寫出目前佇列中的資料（背景執行緒與 close() 共用）
+    def flush(self):
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+                self._first_enqueued = None
+            if not batch:
+                return 0
+
+            by_month = OrderedDict()
+            for month, row, future in batch:
+                by_month.setdefault(month, []).append((row, future))
+
+            for month, items in by_month.items():
+                rows = [row for row, _ in items]
+                try:
+                    self.storage.append_rows(month, rows)
+                except Exception as e:
+                    with self._cond:
+                        self._stats["errors"] += 1
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                month_cache.mark_stale(self.storage.key, month)
+                if is_past(month):
+                    # 已過去的月份可能已封存或存成不再更新的快照
+                    reopen_month(self.storage, month)
+                for row, future in items:
+                    future.set_result(row)
+
+            with self._cond:
+                self._stats["flushes"] += 1
+                self._stats["api_calls"] += len(by_month)
+                self._stats["rows_flushed"] += len(batch)
+                self._stats["last_flush_size"] = len(batch)
+                self._stats["max_flush_size"] = max(self._stats["max_flush_size"], len(batch))
+            return len(batch)
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._pending)
+        stats["avg_flush_size"] = stats["rows_flushed"] / stats["flushes"] if stats["flushes"] else 0.0
+        return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+
+# --- 全程序共用的佇列（依儲存來源區分） ---
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(storage):
+    with _queues_lock:
+        queue = _queues.get(storage.key)
+        if queue is None:
+            queue = _queues[storage.key] = CheckinWriteQueue(storage)
+        return queue
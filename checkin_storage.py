@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+import calendar
+from datetime import datetime
+import gspread
+from gspread.utils import rowcol_to_a1
+from checkin_user_index import get_user_index, row_runs
+from sheet_metadata import get_metadata_cache
+
+HEADER = ["姓名", "日期", "時間"]
+DATETIME_FORMAT = "%Y/%m/%d %H:%M:%S"
+
+
+# --- 工具：日期時間字串轉 epoch 秒（沿用 UTC+8 當地時間，不做時區換算） ---
+def to_epoch(date, time):
+    try:
+        return calendar.timegm(datetime.strptime(f"{date} {time}", DATETIME_FORMAT).timetuple())
+    except (TypeError, ValueError):
+        return None
+
+
+def find_key_col(header):
+    if "帳號" in header:
+        return header.index("帳號")
+    if "姓名" in header:
+        return header.index("姓名")
+    return None
+
+
+# --- 儲存介面：以月份（YYYYMM）為單位的打卡表 ---
+class CheckinStorage:
+    # 用來當作快取 key，同一份資料來源在不同 rerun 會得到相同的 key
+    key = ""
+    # 是否能直接以索引查詢單一使用者（不需下載整個月份）
+    indexed_user_reads = False
+
+    def list_months(self):
+        raise NotImplementedError
+
+    def get_month_values(self, month):
+        # 回傳格式與 gspread 的 get_all_values 相同：第一列為標題
+        raise NotImplementedError
+
+    # 只讀取第 start 列之後的資料（start 含標題列，即已讀過的列數）
+    def get_month_values_since(self, month, start):
+        return self.get_month_values(month)[start:]
+
+    def append_rows(self, month, rows):
+        raise NotImplementedError
+
+    def append_row(self, month, row):
+        self.append_rows(month, [row])
+
+    def get_user_values(self, month, user):
+        records = self.get_month_values(month)
+        if not records:
+            return records
+        header, *rows = records
+        key_idx = find_key_col(header)
+        if key_idx is None:
+            return records
+        return [header] + [row for row in rows if len(row) > key_idx and row[key_idx] == user]
+
+
+# --- Google Sheets 實作（原本的行為） ---
+class GspreadStorage(CheckinStorage):
+    # batch_get 一次最多帶幾個範圍
+    MAX_RANGES_PER_REQUEST = 100
+
+    def __init__(self, spreadsheet, user_index=None):
+        self.spreadsheet = spreadsheet
+        self.key = f"gspread:{spreadsheet.id}"
+        self.user_index = user_index
+        self.metadata = get_metadata_cache(spreadsheet)
+
+    @property
+    def indexed_user_reads(self):
+        return self.user_index is not None
+
+    # 工作表物件來自共用的 metadata 快取，不必每次打卡都查一次
+    def worksheet(self, month, create=False):
+        if create:
+            return self.metadata.get_or_create(month, HEADER)
+        return self.metadata.worksheet(month)
+
+    def list_months(self):
+        return sorted(title for title in self.metadata.titles() if title.isdigit())
+
+    # 工作表被刪除或改名時 API 會回錯，清掉快取讓下次重新讀取清單
+    def _read(self, read):
+        try:
+            return read()
+        except gspread.exceptions.APIError:
+            self.metadata.invalidate()
+            raise
+
+    def get_month_values(self, month):
+        return self._read(lambda: self.worksheet(month).get_all_values())
+
+    def get_month_values_since(self, month, start):
+        if start == 0:
+            return self.get_month_values(month)
+        # 使用不指定結尾列的範圍，不依賴快取中可能過期的 row_count；
+        # 從最後一列已讀過的資料開始讀再丟掉，沒有新資料時範圍也不會超出格線（寫滿後工作表列數剛好等於資料列數）
+        last_col = rowcol_to_a1(1, self.worksheet(month).col_count)[:-1]
+        return self._read(lambda: list(self.worksheet(month).get(f"A{start}:{last_col}")))[1:]
+
+    # 有使用者列號索引時，只抓該使用者所在的列，不下載整個月份
+    def get_user_values(self, month, user):
+        if self.user_index is None:
+            return super().get_user_values(month, user)
+        worksheet = self.worksheet(month)
+        header, key_idx = self.user_index.refresh(self.key, month, worksheet, find_key_col)
+        if key_idx is None:
+            return super().get_user_values(month, user)
+        row_numbers = self.user_index.rows_for(self.key, month, user)
+        if not row_numbers:
+            return [header]
+
+        last_col = rowcol_to_a1(1, len(header))[:-1]
+        ranges = [f"A{a}:{last_col}{b}" for a, b in row_runs(row_numbers)]
+        rows = []
+        for i in range(0, len(ranges), self.MAX_RANGES_PER_REQUEST):
+            for value_range in worksheet.batch_get(ranges[i:i + self.MAX_RANGES_PER_REQUEST]):
+                rows.extend(list(value_range))
+
+        # 列號對不上（工作表被手動改過）就重建索引，這次改用整份下載
+        if len(rows) != len(row_numbers) or any(len(r) <= key_idx or r[key_idx] != user for r in rows):
+            self.user_index.reset(self.key, month)
+            return super().get_user_values(month, user)
+        return [header] + rows
+
+    def append_rows(self, month, rows):
+        sheet = self.worksheet(month, create=True)
+        if len(rows) == 1:
+            sheet.append_row(rows[0])
+        else:
+            sheet.append_rows(rows)
+
+
+# --- SQLite 實作：本機開發、離線測試與效能量測用 ---
+class SQLiteStorage(CheckinStorage):
+    indexed_user_reads = True
+
+    def __init__(self, path="checkin.db"):
+        self.path = path
+        self.key = f"sqlite:{os.path.abspath(path)}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS months (
+                month TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS checkins (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                month TEXT NOT NULL,
+                user TEXT NOT NULL,
+                date TEXT NOT NULL,
+                time TEXT NOT NULL,
+                ts INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_checkins_user_ts ON checkins (user, ts);
+            CREATE INDEX IF NOT EXISTS idx_checkins_month ON checkins (month, id);
+        """)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def list_months(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT month FROM months ORDER BY month")]
+
+    def _ensure_month(self, month):
+        exists = self._conn.execute("SELECT 1 FROM months WHERE month = ?", (month,)).fetchone()
+        if not exists:
+            raise gspread.exceptions.WorksheetNotFound(month)
+
+    def get_month_values(self, month):
+        with self._lock:
+            self._ensure_month(month)
+            rows = self._conn.execute(
+                "SELECT user, date, time FROM checkins WHERE month = ? ORDER BY id", (month,)
+            ).fetchall()
+        return [list(HEADER)] + [list(r) for r in rows]
+
+    def get_month_values_since(self, month, start):
+        if start == 0:
+            return self.get_month_values(month)
+        with self._lock:
+            self._ensure_month(month)
+            rows = self._conn.execute(
+                "SELECT user, date, time FROM checkins WHERE month = ? ORDER BY id LIMIT -1 OFFSET ?", (month, start - 1)
+            ).fetchall()
+        return [list(r) for r in rows]
+
+    def get_user_values(self, month, user):
+        # 走 (user, ts) 索引：只掃該使用者在此月份區間內的資料
+        start = calendar.timegm(datetime.strptime(month, "%Y%m").timetuple())
+        year, mon = int(month[:4]), int(month[4:])
+        end = calendar.timegm((year + mon // 12, mon % 12 + 1, 1, 0, 0, 0))
+        with self._lock:
+            self._ensure_month(month)
+            rows = self._conn.execute(
+                "SELECT user, date, time FROM checkins WHERE user = ? AND ts >= ? AND ts < ? AND month = ? ORDER BY id",
+                (user, start, end, month)
+            ).fetchall()
+        return [list(HEADER)] + [list(r) for r in rows]
+
+    def append_rows(self, month, rows):
+        params = [(month, r[0], r[1], r[2], to_epoch(r[1], r[2])) for r in rows]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("INSERT OR IGNORE INTO months (month) VALUES (?)", (month,))
+                self._conn.executemany(
+                    "INSERT INTO checkins (month, user, date, time, ts) VALUES (?, ?, ?, ?, ?)", params
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+# --- 依環境變數選擇儲存方式 ---
+# CHECKIN_STORAGE=sqlite 時改用本機 SQLite（路徑由 CHECKIN_SQLITE_PATH 指定），預設為 Google Sheets
+def open_storage(open_spreadsheet):
+    backend = os.environ.get("CHECKIN_STORAGE", "gspread").lower()
+    if backend == "sqlite":
+        return SQLiteStorage(os.environ.get("CHECKIN_SQLITE_PATH", "checkin.db"))
+    return GspreadStorage(open_spreadsheet(), user_index=get_user_index())
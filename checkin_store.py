@@ -0,0 +1,177 @@
+import threading
+import numpy as np
+import pandas as pd
+from checkin_storage import DATETIME_FORMAT, find_key_col
+
+TIMESTAMP_COL = "打卡時間"
+
+
+class MissingColumns(ValueError):
+    def __init__(self, kind):
+        super().__init__(kind)
+        self.kind = kind  # "key"：缺少帳號/姓名欄位；"datetime"：缺少日期/時間欄位
+
+
+# --- 欄式打卡資料：使用者為類別代碼、時間為 int64 epoch 秒，依 (使用者, 時間) 排序 ---
+# 時間沿用 UTC+8 當地時間，不做時區換算；同一使用者的資料連續存放，offsets[c]:offsets[c+1] 即為該使用者的範圍
+class MonthStore:
+    def __init__(self, key_col, categories, codes, ts, source_rows=0):
+        self.key_col = key_col
+        self.categories = categories
+        self.codes = codes
+        self.ts = ts
+        self.source_rows = source_rows  # 由來源 DataFrame 的前幾列建成，用於增量更新
+        self.offsets = np.searchsorted(codes, np.arange(len(categories) + 1))
+        # 全體依時間排序的索引，查詢所有人時使用
+        self.order = np.argsort(ts, kind="stable")
+        self.ts_sorted = ts[self.order]
+
+    @classmethod
+    def from_frame(cls, df):
+        key_idx = find_key_col(list(df.columns))
+        if key_idx is None:
+            raise MissingColumns("key")
+        key_col = df.columns[key_idx]
+        users, ts = cls._parse(df, key_col)
+        categorical = pd.Categorical(users)
+        return cls._build(key_col, np.asarray(categorical.categories, dtype=object), categorical.codes, ts, len(df))
+
+    @staticmethod
+    def _parse(df, key_col):
+        if TIMESTAMP_COL in df.columns:
+            stamps = pd.to_datetime(df[TIMESTAMP_COL], errors="coerce")
+        elif "日期" in df.columns and "時間" in df.columns:
+            stamps = pd.to_datetime(df["日期"] + " " + df["時間"], format=DATETIME_FORMAT, errors="coerce")
+        else:
+            raise MissingColumns("datetime")
+        # 與原本做法相同：時間無法解析的列直接略過
+        valid = stamps.notna().to_numpy()
+        users = df[key_col].to_numpy(dtype=object)[valid]
+        ts = stamps[valid].to_numpy(dtype="datetime64[s]").astype(np.int64)
+        return users, ts
+
+    @classmethod
+    def _build(cls, key_col, categories, codes, ts, source_rows):
+        codes = np.asarray(codes, dtype=np.int32)
+        perm = np.lexsort((ts, codes))
+        return cls(key_col, categories, codes[perm], ts[perm], source_rows)
+
+    # 加入新的列（例如當月新增的打卡），回傳新的 store，原本的不變
+    def extend(self, df, source_rows=None):
+        users, ts = self._parse(df, self.key_col)
+        categories = np.union1d(self.categories, users) if len(users) else self.categories
+        old_codes = np.searchsorted(categories, self.categories)[self.codes]
+        new_codes = np.searchsorted(categories, users)
+        return self._build(
+            self.key_col, categories,
+            np.concatenate([old_codes, new_codes]), np.concatenate([self.ts, ts]),
+            self.source_rows + len(df) if source_rows is None else source_rows
+        )
+
+    # 合併多個月份的 store 成為一個依時間排序的 store
+    @classmethod
+    def concat(cls, stores):
+        stores = [s for s in stores if len(s)]
+        if not stores:
+            return cls("姓名", np.empty(0, dtype=object), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64))
+        categories = stores[0].categories
+        for store in stores[1:]:
+            categories = np.union1d(categories, store.categories)
+        codes = [np.searchsorted(categories, s.categories)[s.codes] for s in stores]
+        return cls._build(
+            stores[0].key_col, categories, np.concatenate(codes),
+            np.concatenate([s.ts for s in stores]), sum(s.source_rows for s in stores)
+        )
+
+    def __len__(self):
+        return len(self.ts)
+
+    @property
+    def users(self):
+        counts = np.diff(self.offsets)
+        return [str(u) for u in self.categories[counts > 0]]
+
+    # 依使用者與時間區間 [start, end) 篩選，回傳依時間排序的列位置（不需解析字串）
+    def select(self, user=None, start=None, end=None):
+        lo_ts = None if start is None else _to_epoch(start)
+        hi_ts = None if end is None else _to_epoch(end)
+        if user is None:
+            ts, base = self.ts_sorted, None
+        else:
+            code = np.searchsorted(self.categories, user)
+            if code >= len(self.categories) or self.categories[code] != user:
+                return np.empty(0, dtype=np.int64)
+            begin, stop = self.offsets[code], self.offsets[code + 1]
+            ts, base = self.ts[begin:stop], begin
+        lo = 0 if lo_ts is None else np.searchsorted(ts, lo_ts, side="left")
+        hi = len(ts) if hi_ts is None else np.searchsorted(ts, hi_ts, side="left")
+        if base is None:
+            return self.order[lo:hi]
+        return np.arange(base + lo, base + hi)
+
+    # 依時間排序的列位置中，第一筆時間 >= when 的索引（分頁跳到指定日期用）
+    def search(self, positions, when):
+        return int(np.searchsorted(self.ts[positions], _to_epoch(when), side="left"))
+
+    # 只把需要顯示的列轉回文字欄位
+    def to_frame(self, positions=None, with_timestamp=False):
+        if positions is None:
+            positions = self.order
+        stamps = pd.to_datetime(self.ts[positions], unit="s")
+        df = pd.DataFrame({
+            self.key_col: self.categories[self.codes[positions]],
+            "日期": stamps.strftime("%Y/%m/%d"),
+            "時間": stamps.strftime("%H:%M:%S"),
+        })
+        if with_timestamp:
+            df[TIMESTAMP_COL] = stamps
+        return df
+
+    @property
+    def memory_bytes(self):
+        arrays = (self.codes, self.ts, self.offsets, self.order, self.ts_sorted)
+        return sum(a.nbytes for a in arrays) + sum(len(str(u).encode("utf-8")) + 49 for u in self.categories)
+
+
+def _to_epoch(value):
+    return int(pd.Timestamp(value).to_datetime64().astype("datetime64[s]").astype(np.int64))
+
+
+# --- 全程序共用的 store 快取：來源沒變就直接重用，當月只解析新增的列 ---
+class StoreCache:
+    def __init__(self):
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, frame, generation):
+        with self._lock:
+            cached = self._stores.get(key)
+        if cached is not None:
+            cached_generation, store = cached
+            if cached_generation == generation and store.source_rows == len(frame):
+                return store
+            if cached_generation == generation and store.source_rows < len(frame):
+                store = store.extend(frame.iloc[store.source_rows:])
+                with self._lock:
+                    self._stores[key] = (generation, store)
+                return store
+        store = MonthStore.from_frame(frame)
+        with self._lock:
+            self._stores[key] = (generation, store)
+        return store
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._stores.clear()
+            else:
+                self._stores.pop(key, None)
+
+    # 各月份的列數與記憶體用量
+    def memory_report(self):
+        with self._lock:
+            items = list(self._stores.items())
+        return [{"key": key, "rows": len(store), "bytes": store.memory_bytes} for key, (_, store) in items]
+
+
+store_cache = StoreCache()
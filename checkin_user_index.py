@@ -0,0 +1,126 @@
+import os
+import json
+import sqlite3
+import threading
+from gspread.utils import rowcol_to_a1
+from checkin_cache import is_closed
+
+INDEX_PATH = os.environ.get("CHECKIN_USER_INDEX_PATH", "user_index.db")
+INDEX_ENABLED = os.environ.get("CHECKIN_USER_INDEX", "1") != "0"
+
+
+# 把連續的列號合併成區間，例如 [3, 4, 5, 9] -> [(3, 5), (9, 9)]
+def row_runs(rows):
+    runs = []
+    for row in rows:
+        if runs and row == runs[-1][1] + 1:
+            runs[-1][1] = row
+        else:
+            runs.append([row, row])
+    return [tuple(r) for r in runs]
+
+
+# --- 每個月份工作表的使用者列號索引（本機 SQLite 附檔） ---
+# 只掃描帳號/姓名那一欄、且只掃描上次之後新增的列，查詢時再用 batch_get 抓該使用者的列
+class UserRowIndex:
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS index_state (
+                storage_key TEXT NOT NULL,
+                month TEXT NOT NULL,
+                header TEXT NOT NULL,
+                key_col INTEGER NOT NULL,
+                watermark INTEGER NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (storage_key, month)
+            );
+            CREATE TABLE IF NOT EXISTS user_rows (
+                storage_key TEXT NOT NULL,
+                month TEXT NOT NULL,
+                user TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (storage_key, month, row)
+            );
+            CREATE INDEX IF NOT EXISTS idx_user_rows_user ON user_rows (storage_key, month, user, row);
+        """)
+        self.stats = {"scans": 0, "cells_scanned": 0}
+
+    def _state(self, storage_key, month):
+        return self._conn.execute(
+            "SELECT header, key_col, watermark, complete FROM index_state WHERE storage_key = ? AND month = ?",
+            (storage_key, month)
+        ).fetchone()
+
+    # 更新索引到工作表目前的列數，回傳標題列與帳號欄位位置（從 0 起算）
+    def refresh(self, storage_key, month, worksheet, find_key_col):
+        with self._lock:
+            state = self._state(storage_key, month)
+        if state is None:
+            header = worksheet.row_values(1)
+            key_idx = find_key_col(header)
+            if key_idx is None:
+                return header, None
+            watermark, complete = 1, 0
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO index_state VALUES (?, ?, ?, ?, ?, 0)",
+                    (storage_key, month, json.dumps(header, ensure_ascii=False), key_idx, watermark)
+                )
+        else:
+            header, key_idx, watermark, complete = json.loads(state[0]), state[1], state[2], state[3]
+
+        # 已結束且掃描完的月份不會再有新資料
+        if complete:
+            return header, key_idx
+
+        # 不指定結尾列，不依賴可能過期的 row_count；從最後一列已掃描過的列開始再丟掉，範圍不會超出格線
+        letter = rowcol_to_a1(1, key_idx + 1)[:-1]
+        values = list(worksheet.get(f"{letter}{watermark}:{letter}"))[1:]
+        entries = [(storage_key, month, cells[0], watermark + 1 + i) for i, cells in enumerate(values) if cells and cells[0]]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany("INSERT OR REPLACE INTO user_rows VALUES (?, ?, ?, ?)", entries)
+            self._conn.execute(
+                "UPDATE index_state SET watermark = ?, complete = ? WHERE storage_key = ? AND month = ?",
+                (watermark + len(values), int(is_closed(month)), storage_key, month)
+            )
+            self._conn.execute("COMMIT")
+            self.stats["scans"] += 1
+            self.stats["cells_scanned"] += len(values)
+        return header, key_idx
+
+    def rows_for(self, storage_key, month, user):
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT row FROM user_rows WHERE storage_key = ? AND month = ? AND user = ? ORDER BY row",
+                (storage_key, month, user)
+            )]
+
+    # 已結束的月份又寫入了打卡：取消「已掃描完」，下次查詢時補掃新增的列
+    def reopen(self, storage_key, month):
+        with self._lock:
+            self._conn.execute("UPDATE index_state SET complete = 0 WHERE storage_key = ? AND month = ?", (storage_key, month))
+
+    # 工作表被手動修改（例如刪除列）時整個月份重建
+    def reset(self, storage_key, month):
+        with self._lock:
+            self._conn.execute("DELETE FROM index_state WHERE storage_key = ? AND month = ?", (storage_key, month))
+            self._conn.execute("DELETE FROM user_rows WHERE storage_key = ? AND month = ?", (storage_key, month))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_user_index():
+    global _index
+    if not INDEX_ENABLED:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = UserRowIndex()
+        return _index
@@ -0,0 +1,325 @@
+import time
+import random
+import uuid
+import threading
+from collections import Counter, deque
+import gspread
+from gspread.utils import a1_range_to_grid_range, numericise_all
+from perf_trace import count_api_call
+
+
+# --- 本機的 gspread 替身：資料放在記憶體，用來離線量測效能 ---
+# 實作 app 會用到的 Client / Spreadsheet / Worksheet 方法，每次呼叫都算一次 API，
+# 可設定每次呼叫的延遲，以及每分鐘讀寫次數上限（超過時與真的 API 一樣回 429）
+
+
+class FakeResponse:
+    def __init__(self, code, message):
+        self.status_code = code
+        self.text = message
+        self._error = {"code": code, "message": message, "status": "FAKE"}
+
+    def json(self):
+        return {"error": self._error}
+
+
+def api_error(code, message):
+    return gspread.exceptions.APIError(FakeResponse(code, message))
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+def _cell_text(cell):
+    value = cell.get("userEnteredValue", {})
+    for key in ("stringValue", "numberValue", "boolValue", "formulaValue"):
+        if key in value:
+            return _text(value[key])
+    return ""
+
+
+class FakeClient:
+    def __init__(self, latency=0.0, jitter=0.0, read_quota=None, write_quota=None, window=60.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota = {"read": read_quota, "write": write_quota}
+        self.window = window
+        self.calls = Counter()
+        self.kinds = Counter()
+        self._sent = {"read": deque(), "write": deque()}
+        self._spreadsheets = {}
+        self._ids = 0
+        self.lock = threading.RLock()
+
+    # 每一次 API 呼叫：計數、檢查配額、模擬網路延遲
+    def call(self, kind, name):
+        with self.lock:
+            now = time.monotonic()
+            sent = self._sent[kind]
+            while sent and now - sent[0] >= self.window:
+                sent.popleft()
+            self.calls[name] += 1
+            self.kinds[kind] += 1
+            limit = self.quota[kind]
+            if limit is not None and len(sent) >= limit:
+                self.kinds["rate_limited"] += 1
+                raise api_error(429, f"Quota exceeded for quota metric '{kind} requests'")
+            sent.append(now)
+        count_api_call(kind)
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    # 只清除計數，配額時間窗照常累計
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.kinds.clear()
+
+    def next_id(self):
+        with self.lock:
+            self._ids += 1
+            return self._ids
+
+    def create(self, title):
+        with self.lock:
+            spreadsheet = self._spreadsheets[title] = FakeSpreadsheet(self, title, f"fake-{uuid.uuid4().hex[:12]}")
+            return spreadsheet
+
+    def open(self, title):
+        self.call("read", "open")
+        with self.lock:
+            if title not in self._spreadsheets:
+                raise gspread.exceptions.SpreadsheetNotFound(title)
+            return self._spreadsheets[title]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, title, spreadsheet_id):
+        self.client = client
+        self.title = title
+        self.id = spreadsheet_id
+        self._sheets = []
+        self._version = 0
+
+    def touch(self):
+        self._version += 1
+
+    # --- 不算 API 呼叫的內部操作（準備測試資料用） ---
+    def add_sheet(self, title, rows=1000, cols=10, values=None, sheet_id=None):
+        with self.client.lock:
+            if any(ws.title == title for ws in self._sheets):
+                raise api_error(400, f'A sheet with the name "{title}" already exists.')
+            worksheet = FakeWorksheet(self, title, sheet_id or self.client.next_id(), rows, cols)
+            if values:
+                worksheet.data = [[_text(v) for v in row] for row in values]
+                worksheet.row_count = max(rows, len(worksheet.data))
+            self._sheets.append(worksheet)
+            self.touch()
+            return worksheet
+
+    def _by_id(self, sheet_id):
+        for worksheet in self._sheets:
+            if worksheet.id == sheet_id:
+                return worksheet
+        raise api_error(400, f"No grid with id: {sheet_id}")
+
+    # --- gspread API ---
+    @property
+    def sheet1(self):
+        self.client.call("read", "fetch_sheet_metadata")
+        with self.client.lock:
+            return self._sheets[0]
+
+    def fetch_sheet_metadata(self, params=None):
+        self.client.call("read", "fetch_sheet_metadata")
+        with self.client.lock:
+            return {"sheets": [{"properties": ws.properties()} for ws in self._sheets]}
+
+    def worksheets(self, exclude_hidden=False):
+        self.client.call("read", "fetch_sheet_metadata")
+        with self.client.lock:
+            return list(self._sheets)
+
+    def worksheet(self, title):
+        self.client.call("read", "fetch_sheet_metadata")
+        with self.client.lock:
+            for worksheet in self._sheets:
+                if worksheet.title == title:
+                    return worksheet
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def add_worksheet(self, title, rows, cols, index=None):
+        self.client.call("write", "add_worksheet")
+        return self.add_sheet(title, int(rows), int(cols))
+
+    def del_worksheet(self, worksheet):
+        self.client.call("write", "del_worksheet")
+        with self.client.lock:
+            self._sheets.remove(worksheet)
+            self.touch()
+
+    def get_lastUpdateTime(self):
+        self.client.call("read", "get_lastUpdateTime")
+        with self.client.lock:
+            return f"v{self._version}"
+
+    # spreadsheets.batchUpdate：先檢查全部請求，全部可以套用才一起寫入
+    def batch_update(self, body):
+        self.client.call("write", "batch_update")
+        requests = body.get("requests", [])
+        with self.client.lock:
+            titles = {ws.title for ws in self._sheets}
+            for request in requests:
+                if "addSheet" in request:
+                    title = request["addSheet"]["properties"]["title"]
+                    if title in titles:
+                        raise api_error(400, f'Invalid requests[0].addSheet: A sheet with the name "{title}" already exists.')
+                    titles.add(title)
+            for request in requests:
+                self._apply(request)
+            self.touch()
+        return {"spreadsheetId": self.id, "replies": [{} for _ in requests]}
+
+    def _apply(self, request):
+        if "addSheet" in request:
+            props = request["addSheet"]["properties"]
+            grid = props.get("gridProperties", {})
+            self.add_sheet(props["title"], grid.get("rowCount", 1000), grid.get("columnCount", 26), sheet_id=props.get("sheetId"))
+        elif "updateCells" in request:
+            update = request["updateCells"]
+            if "start" in update:
+                worksheet = self._by_id(update["start"]["sheetId"])
+                row, col = update["start"].get("rowIndex", 0), update["start"].get("columnIndex", 0)
+            else:
+                worksheet = self._by_id(update["range"]["sheetId"])
+                row, col = update["range"].get("startRowIndex", 0), update["range"].get("startColumnIndex", 0)
+            for i, row_data in enumerate(update.get("rows", [])):
+                for j, cell in enumerate(row_data.get("values", [])):
+                    worksheet.set_cell(row + i, col + j, _cell_text(cell))
+        elif "appendCells" in request:
+            append = request["appendCells"]
+            worksheet = self._by_id(append["sheetId"])
+            worksheet.append([[_cell_text(c) for c in r.get("values", [])] for r in append.get("rows", [])])
+        elif "deleteDimension" in request:
+            dim = request["deleteDimension"]["range"]
+            worksheet = self._by_id(dim["sheetId"])
+            if dim.get("dimension", "ROWS") != "ROWS":
+                raise api_error(400, "Only ROWS deletion is supported by the fake")
+            del worksheet.data[dim["startIndex"]:dim["endIndex"]]
+            worksheet.row_count -= dim["endIndex"] - dim["startIndex"]
+        else:
+            raise api_error(400, f"Unsupported request: {list(request)}")
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id, rows, cols):
+        self.spreadsheet = spreadsheet
+        self.client = spreadsheet.client
+        self.title = title
+        self.id = sheet_id
+        self.row_count = rows
+        self.col_count = cols
+        self.data = []
+
+    def properties(self):
+        return {
+            "sheetId": self.id, "title": self.title, "sheetType": "GRID",
+            "gridProperties": {"rowCount": self.row_count, "columnCount": self.col_count},
+        }
+
+    # --- 內部操作（呼叫端需持有 client.lock） ---
+    def set_cell(self, row, col, value):
+        while len(self.data) <= row:
+            self.data.append([])
+        cells = self.data[row]
+        while len(cells) <= col:
+            cells.append("")
+        cells[col] = value
+        self.row_count = max(self.row_count, len(self.data))
+
+    # 與 Sheets 相同：接在最後一列有資料的列之後
+    def append(self, rows):
+        while self.data and not any(self.data[-1]):
+            self.data.pop()
+        self.data.extend([_text(v) for v in row] for row in rows)
+        self.row_count = max(self.row_count, len(self.data))
+        self.spreadsheet.touch()
+
+    def _values(self, start_row=0, end_row=None, start_col=0, end_col=None):
+        rows = [row[start_col:end_col] for row in self.data[start_row:end_row]]
+        while rows and not any(rows[-1]):
+            rows.pop()
+        return [self._trim(row) for row in rows]
+
+    @staticmethod
+    def _trim(row):
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        return row
+
+    # 與 Sheets 相同：範圍超出工作表格線時回 400
+    def _range(self, name):
+        grid = a1_range_to_grid_range(name)
+        if grid.get("startRowIndex", 0) >= self.row_count or grid.get("endRowIndex", 0) > self.row_count \
+                or grid.get("startColumnIndex", 0) >= self.col_count or grid.get("endColumnIndex", 0) > self.col_count:
+            raise api_error(400, f"Range ('{self.title}'!{name}) exceeds grid limits. "
+                                 f"Max rows: {self.row_count}, max columns: {self.col_count}")
+        return self._values(
+            grid.get("startRowIndex", 0), grid.get("endRowIndex"),
+            grid.get("startColumnIndex", 0), grid.get("endColumnIndex"),
+        )
+
+    # --- gspread API ---
+    def get_all_values(self, **kwargs):
+        self.client.call("read", "get_all_values")
+        with self.client.lock:
+            rows = self._values()
+        width = max((len(row) for row in rows), default=0)
+        return [row + [""] * (width - len(row)) for row in rows]
+
+    def get_all_records(self, head=1, **kwargs):
+        values = self.get_all_values()
+        if len(values) < head:
+            return []
+        keys = values[head - 1]
+        return [dict(zip(keys, numericise_all(row))) for row in values[head:]]
+
+    def get(self, range_name=None, **kwargs):
+        self.client.call("read", "get")
+        with self.client.lock:
+            return self._range(range_name) if range_name else self._values()
+
+    def batch_get(self, ranges, **kwargs):
+        self.client.call("read", "batch_get")
+        with self.client.lock:
+            return [self._range(name) for name in ranges]
+
+    def row_values(self, row, **kwargs):
+        self.client.call("read", "row_values")
+        with self.client.lock:
+            return self._trim(self.data[row - 1]) if row <= len(self.data) else []
+
+    def append_row(self, values, **kwargs):
+        self.client.call("write", "append_row")
+        with self.client.lock:
+            self.append([values])
+
+    def append_rows(self, values, **kwargs):
+        self.client.call("write", "append_rows")
+        with self.client.lock:
+            self.append(values)
+
+    def update_cell(self, row, col, value):
+        self.client.call("write", "update_cell")
+        with self.client.lock:
+            self.set_cell(row - 1, col - 1, _text(value))
+            self.spreadsheet.touch()
+
+    def clear(self):
+        self.client.call("write", "clear")
+        with self.client.lock:
+            self.data = []
+            self.spreadsheet.touch()
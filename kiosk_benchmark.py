@@ -0,0 +1,133 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import numpy as np
+
+# benchmark 會把日誌、封存、索引設定到暫存目錄，必須在 app 模組匯入前載入
+from benchmark import build_fixture, wait_drained
+from checkin_storage import open_storage
+from checkin_journal import get_journal
+from user_directory import UserDirectory
+from kiosk_server import KioskService, start_server
+
+TOKEN = "bench-token"
+LEVELS = (1, 10, 50)
+
+
+# --- 一個 kiosk：保持同一條連線，依序送出 requests 個請求，記錄每個請求的延遲 ---
+async def kiosk_client(port, path, bodies, latencies, errors):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for body in bodies:
+            data = json.dumps(body).encode("utf-8")
+            began = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: kiosk\r\nAuthorization: Bearer {TOKEN}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            payload = json.loads(await reader.readexactly(length))
+            latencies.append((time.perf_counter() - began) * 1000)
+            if status != 200 or not payload.get("ok"):
+                errors.append(f"{status}: {payload}")
+    finally:
+        writer.close()
+
+
+async def run_scenario(service, client, storage, scenario, kiosks, requests, bulk_size, accounts):
+    server = await start_server(service, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    latencies, errors = [], []
+    path = "/checkin/bulk" if bulk_size else "/checkin"
+
+    def bodies(k):
+        for i in range(requests):
+            if bulk_size:
+                yield {"checkins": [{"username": f"u{(k * requests + i + j) % accounts:04d}"} for j in range(bulk_size)]}
+            else:
+                yield {"username": f"u{(k * requests + i) % accounts:04d}"}
+
+    client.reset_counters()
+    async with server:
+        began = time.perf_counter()
+        await asyncio.gather(*(kiosk_client(port, path, list(bodies(k)), latencies, errors) for k in range(kiosks)))
+        wall = time.perf_counter() - began
+    # 背景寫回工作表為止（不計入回應時間）
+    drain_began = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, wait_drained, storage)
+    checkins = kiosks * requests * (bulk_size or 1)
+    return {
+        "scenario": scenario,
+        "kiosks": kiosks,
+        "requests": len(latencies),
+        "checkins": checkins,
+        "requests_per_s": len(latencies) / wall if wall else 0.0,
+        "checkins_per_s": checkins / wall if wall else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)) if latencies else None,
+        "p95_ms": float(np.percentile(latencies, 95)) if latencies else None,
+        "p99_ms": float(np.percentile(latencies, 99)) if latencies else None,
+        "drain_ms": (time.perf_counter() - drain_began) * 1000,
+        "api_calls": client.kinds["read"] + client.kinds["write"],
+        "commits": service.stats["commits"],
+        "errors": len(errors),
+        "error_samples": errors[:3],
+    }
+
+
+def print_table(results):
+    print(f"{'scenario':14} {'kiosks':>6} {'req/s':>8} {'checkins/s':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'drain ms':>9} {'api':>5} {'err':>4}")
+    for r in results:
+        print(f"{r['scenario']:14} {r['kiosks']:>6} {r['requests_per_s']:>8.0f} {r['checkins_per_s']:>11.0f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['drain_ms']:>9.0f} {r['api_calls']:>5} {r['errors']:>4}")
+        for sample in r["error_samples"]:
+            print(f"  {sample}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以記憶體中的 gspread 替身量測 kiosk 打卡服務的吞吐量")
+    parser.add_argument("--kiosks", type=int, nargs="+", default=list(LEVELS), help="同時連線的 kiosk 數（可給多個）")
+    parser.add_argument("--requests", type=int, default=50, help="每個 kiosk 送出的請求數")
+    parser.add_argument("--bulk-size", type=int, default=50, help="批次請求每次的打卡筆數")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次 Sheets API 呼叫的模擬延遲（秒）")
+    parser.add_argument("--output", help="結果輸出為 JSON 檔")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    client, fixture = build_fixture(10000)
+    client.latency = args.latency
+    storage = open_storage(lambda: client.open("打卡紀錄"))
+    get_journal(storage)
+    directory = UserDirectory(client)
+    directory.users()
+    service = KioskService(storage, lambda: {"bench": TOKEN}, directory)
+
+    async def run():
+        results = []
+        for kiosks in args.kiosks:
+            results.append(await run_scenario(service, client, storage, "checkin", kiosks, args.requests, 0, fixture["accounts"]))
+            results.append(await run_scenario(service, client, storage, f"bulk_{args.bulk_size}", kiosks,
+                                              max(args.requests // 10, 1), args.bulk_size, fixture["accounts"]))
+        return results
+
+    results = asyncio.run(run())
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if any(r["errors"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,290 @@
+import os
+import sys
+import hmac
+import json
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from checkin_core import CHECKIN_TIMEOUT, now_local, checkin_row, submit_checkins
+from checkin_storage import DATETIME_FORMAT
+from checkin_cache import CLOSE_GRACE
+from perf_trace import span
+
+# 入口 kiosk / 刷卡機用的打卡服務：不經過 Streamlit，直接寫入與網頁相同的日誌與儲存層
+#   POST /checkin        {"username": "u0001"}
+#   POST /checkin/bulk   {"checkins": [{"username": "u0001", "at": "2024/05/01 08:59:12"}, ...]}
+#   GET  /healthz
+# 認證：Authorization: Bearer <token>，token 來自 secret "kiosk_tokens"（{"kiosk 名稱": "token"}）
+# 沒有日誌、等待寫入工作表逾時時回 504 {"pending": true}：打卡稍後仍可能寫入，kiosk 不應重送
+# 執行：python kiosk_server.py --port 8081
+KIOSK_HOST = os.environ.get("KIOSK_HOST", "0.0.0.0")
+KIOSK_PORT = int(os.environ.get("KIOSK_PORT", "8081"))
+KIOSK_WORKERS = int(os.environ.get("KIOSK_WORKERS", "8"))
+MAX_BULK = int(os.environ.get("KIOSK_MAX_BULK", "500"))
+MAX_BODY_BYTES = 1024 * 1024
+IDLE_SECONDS = 30
+# 批次補送（kiosk 離線時暫存的打卡）最多可補多久以前的紀錄；時間超前當地時間也不接受
+# 不超過 CLOSE_GRACE：補送只會落在尚未結束（未封存、讀取時仍補抓新增列）的月份，不需要共用快取通知其他程序
+MAX_BACKDATE = min(timedelta(hours=float(os.environ.get("KIOSK_MAX_BACKDATE_HOURS", "72"))), CLOSE_GRACE)
+MAX_CLOCK_SKEW = timedelta(seconds=60)
+
+REASONS = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity", 500: "Internal Server Error",
+           504: "Gateway Timeout"}
+
+logger = logging.getLogger("checkin.kiosk")
+
+
+class RequestError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra  # 額外放進回應 JSON 的欄位
+
+
+# --- 打卡服務：驗證 token 與帳號，把同時送達的打卡合併成一次日誌寫入 ---
+class KioskService:
+    def __init__(self, storage, tokens, directory=None, workers=KIOSK_WORKERS):
+        self.storage = storage
+        self.tokens = tokens  # 回傳 {"kiosk 名稱": "token"} 的函式（secret 輪替後自動生效）
+        self.directory = directory
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kiosk")
+        self._pending = []
+        self._committing = False
+        self.stats = {"requests": 0, "checkins": 0, "rejected": 0, "unauthorized": 0, "commits": 0}
+
+    def authenticate(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            for kiosk, expected in self.tokens().items():
+                if hmac.compare_digest(token.encode("utf-8"), str(expected).encode("utf-8")):
+                    return kiosk
+        self.stats["unauthorized"] += 1
+        raise RequestError(401, "invalid or missing token")
+
+    # 帳號目錄在背景執行緒讀取（每 30 秒才確認一次試算表版本）
+    async def users(self):
+        if self.directory is None:
+            return None
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.directory.users)
+
+    def parse_entry(self, entry, users, now):
+        if not isinstance(entry, dict) or not isinstance(entry.get("username"), str) or not entry["username"].strip():
+            raise RequestError(422, "username is required")
+        username = entry["username"].strip()
+        if users is not None:
+            info = users.get(username)
+            if info is None:
+                raise RequestError(404, f"unknown user '{username}'")
+            if not info["enabled"]:
+                raise RequestError(422, f"user '{username}' is disabled")
+        at = now
+        if entry.get("at") is not None:
+            try:
+                at = datetime.strptime(str(entry["at"]), DATETIME_FORMAT)
+            except ValueError:
+                raise RequestError(422, f"'at' must look like {now.strftime(DATETIME_FORMAT)}")
+            if at > now + MAX_CLOCK_SKEW or at < now - MAX_BACKDATE:
+                raise RequestError(422, "'at' is outside the accepted range")
+        return username, at
+
+    # --- 群組提交：前一批還在寫日誌時送達的打卡，下一批一起 fsync ---
+    async def commit(self, rows):
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._pending.append((rows, waiter))
+        if not self._committing:
+            self._committing = True
+            loop.create_task(self._drain())
+        futures = await waiter
+        if futures:
+            # 沒有日誌時要等寫入佇列確認寫到工作表；逾時時打卡仍在佇列中、稍後可能寫入，告訴 kiosk 不要重送
+            try:
+                await asyncio.wait_for(asyncio.gather(*(asyncio.wrap_future(f) for f in futures)), CHECKIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise RequestError(504, "check-in is still being written to the sheet; do not resend", pending=True)
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                rows = [row for rows, _ in batch for row in rows]
+                try:
+                    with span("kiosk.commit", rows=len(rows)):
+                        futures = await loop.run_in_executor(self.executor, submit_checkins, self.storage, rows)
+                except Exception as e:
+                    for _, waiter in batch:
+                        waiter.set_exception(e)
+                    continue
+                self.stats["commits"] += 1
+                offset = 0
+                for rows, waiter in batch:
+                    waiter.set_result(futures[offset:offset + len(rows)] if futures else [])
+                    offset += len(rows)
+        finally:
+            self._committing = False
+
+    async def checkin(self, body):
+        users = await self.users()
+        username, at = self.parse_entry(body, users, now_local())
+        await self.commit([checkin_row(username, at)])
+        self.stats["checkins"] += 1
+        return {"ok": True, "username": username, "date": at.strftime("%Y/%m/%d"), "time": at.strftime("%H:%M:%S")}
+
+    # 批次：每一筆各自檢查，有問題的列在 rejected，其餘照常寫入
+    async def checkin_bulk(self, body):
+        entries = body.get("checkins") if isinstance(body, dict) else None
+        if not isinstance(entries, list) or not entries:
+            raise RequestError(400, "'checkins' must be a non-empty list")
+        if len(entries) > MAX_BULK:
+            raise RequestError(413, f"at most {MAX_BULK} check-ins per request")
+        users = await self.users()
+        now = now_local()
+        rows, rejected = [], []
+        for index, entry in enumerate(entries):
+            try:
+                rows.append(checkin_row(*self.parse_entry(entry, users, now)))
+            except RequestError as e:
+                rejected.append({"index": index, "error": str(e)})
+        if rows:
+            await self.commit(rows)
+        self.stats["checkins"] += len(rows)
+        self.stats["rejected"] += len(rejected)
+        return {"ok": not rejected, "accepted": len(rows), "rejected": rejected}
+
+    async def handle(self, method, path, headers, body):
+        self.stats["requests"] += 1
+        if path == "/healthz":
+            return 200, {"ok": True}
+        routes = {"/checkin": self.checkin, "/checkin/bulk": self.checkin_bulk}
+        if path not in routes:
+            raise RequestError(404, "not found")
+        if method != "POST":
+            raise RequestError(405, "use POST")
+        kiosk = self.authenticate(headers)
+        try:
+            payload = json.loads(body or b"null")
+        except ValueError:
+            raise RequestError(400, "body must be JSON")
+        with span(f"kiosk{path.replace('/', '.')}", kiosk=kiosk):
+            return 200, await routes[path](payload)
+
+
+# --- 最小的 HTTP/1.1：Content-Length 內文、keep-alive，kiosk 不需要其他功能 ---
+async def read_request(reader):
+    request_line = await asyncio.wait_for(reader.readline(), IDLE_SECONDS)
+    if not request_line:
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise RequestError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await asyncio.wait_for(reader.readline(), IDLE_SECONDS)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        raise RequestError(411, "send Content-Length instead of chunked encoding")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise RequestError(400, "invalid Content-Length")
+    if length < 0:
+        raise RequestError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise RequestError(413, "body too large")
+    body = await asyncio.wait_for(reader.readexactly(length), IDLE_SECONDS) if length else b""
+    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+    return method.upper(), target.split("?", 1)[0], headers, body, keep_alive
+
+
+def write_response(writer, status, payload, keep_alive):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        f"Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+    )
+
+
+async def serve_connection(service, reader, writer):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                status, payload = await service.handle(method, path, headers, body)
+            except RequestError as e:
+                status, payload = e.status, {"ok": False, "error": str(e), **e.extra}
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                logger.exception("kiosk request failed")
+                status, payload = 500, {"ok": False, "error": type(e).__name__}
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def start_server(service, host=KIOSK_HOST, port=KIOSK_PORT):
+    return await asyncio.start_server(lambda r, w: serve_connection(service, r, w), host, port)
+
+
+# --- 正式環境：與網頁相同的 Secret、Sheets 認證與儲存層 ---
+def build_service():
+    from google.oauth2.service_account import Credentials
+    import sheets_client
+    from checkin_storage import open_storage
+    from checkin_journal import get_journal
+    from secret_provider import get_secret_provider
+    from user_directory import get_user_directory
+
+    secrets = get_secret_provider("secretmanager")
+    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+    def to_credentials(info):
+        return Credentials.from_service_account_info(info, scopes=scope)
+
+    client = sheets_client.authorize(to_credentials(secrets.get("google_service_account")))
+    secrets.on_change("google_service_account", lambda info: sheets_client.rotate_credentials(client, to_credentials(info)))
+    storage = open_storage(lambda: client.open("打卡紀錄"))
+    # 補寫上次未完成的打卡，並先讀一次 token，第一個請求不必等 Secret Manager
+    get_journal(storage)
+    secrets.get("kiosk_tokens")
+    return KioskService(storage, lambda: secrets.get("kiosk_tokens"), get_user_directory(client))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="kiosk / 刷卡機用的打卡 HTTP 服務")
+    parser.add_argument("--host", default=KIOSK_HOST)
+    parser.add_argument("--port", type=int, default=KIOSK_PORT)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    service = build_service()
+
+    async def run():
+        server = await start_server(service, args.host, args.port)
+        logger.info("kiosk check-in service listening on %s:%s", args.host, args.port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import threading
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+# Secret 改從環境變數讀取（內容不會被用到，憑證建立已替換），必須在 app 模組匯入前設定
+os.environ.setdefault("CHECKIN_SECRET_BACKEND", "local")
+os.environ.setdefault("CHECKIN_SECRET_GOOGLE_SERVICE_ACCOUNT", "{}")
+
+import numpy as np
+from google.oauth2.service_account import Credentials
+from streamlit.testing.v1 import AppTest
+from streamlit.runtime.runtime import Runtime
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+# benchmark 會把日誌、封存、索引設定到暫存目錄，必須在 app 模組匯入前載入
+from benchmark import month_rows, now_local
+from fake_gspread import FakeClient
+import sheets_client
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(APP_DIR, "check_in_app_test.py")
+LEVELS = (1, 5, 10, 20)
+STEPS = ("open", "login", "checkin", "history")
+
+
+# --- 本機替身：Sheets 改用 FakeClient ---
+def build_backend(accounts, rows, latency, seed=0):
+    rng = np.random.default_rng(seed)
+    client = FakeClient()
+    today = now_local()
+    this_month = today.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    client.create("打卡紀錄").add_sheet(this_month.strftime("%Y%m"), rows + 1, 3, month_rows(this_month, today.day, rows, accounts, rng))
+    client.create("users_login").add_sheet("users_login", accounts + 1, 4, [["帳號", "密碼", "角色", "是否啟用"]] + [
+        [f"u{i:04d}", f"pw{i}", "user", "Y"] for i in range(accounts)
+    ])
+    client.latency = latency
+    return client
+
+
+# AppTest 每次 run 都會設定、再清空全域的 Runtime._instance，多個 session 同時執行時
+# 會互相清掉對方的 runtime；改成沿用最後一個建立的 mock runtime
+_runtime = {}
+
+
+def _shared_runtime(cls):
+    if cls._instance is not None:
+        _runtime["last"] = cls._instance
+    runtime = _runtime.get("last")
+    if runtime is None:
+        raise RuntimeError("Runtime hasn't been created!")
+    return runtime
+
+
+# 多個執行緒同時編譯腳本時 ast.parse 偶爾會出錯（CPython 3.11），編譯這一步一次只做一個
+_compile_lock = threading.Lock()
+_get_bytecode = ScriptCache.get_bytecode
+
+
+def _locked_get_bytecode(self, script_path):
+    with _compile_lock:
+        return _get_bytecode(self, script_path)
+
+
+def patch_externals(client):
+    return [
+        mock.patch.object(Runtime, "instance", classmethod(_shared_runtime)),
+        mock.patch.object(Runtime, "exists", classmethod(lambda cls: cls._instance is not None or "last" in _runtime)),
+        mock.patch.object(ScriptCache, "get_bytecode", _locked_get_bytecode),
+        mock.patch.object(Credentials, "from_service_account_info", return_value=None),
+        mock.patch.object(sheets_client, "authorize", return_value=client),
+    ]
+
+
+# --- 到達模式：每個 session 距離開始的秒數 ---
+def arrivals(pattern, sessions, duration, rng):
+    if pattern == "spike":
+        # 上班打卡尖峰：大部分人集中在前 20% 的時間內到達
+        offsets = rng.beta(1.2, 5.0, sessions) * duration
+    elif pattern == "poisson":
+        offsets = np.cumsum(rng.exponential(duration / max(sessions, 1), sessions))
+    elif pattern == "ramp":
+        offsets = np.linspace(0, duration, sessions, endpoint=False)
+    else:
+        offsets = np.zeros(sessions)
+    return np.sort(offsets)
+
+
+# --- 一位員工：開啟頁面、登入、打卡、查看紀錄，記錄每一步耗時 ---
+def run_session(index, text, timeout):
+    account, password = f"u{index:04d}", f"pw{index}"
+    timings, errors = {}, []
+
+    def step(name, action):
+        began = time.perf_counter()
+        try:
+            at = action()
+        except Exception as e:
+            errors.append(f"{name}: {type(e).__name__}: {e}")
+            return None
+        timings[name] = (time.perf_counter() - began) * 1000
+        failures = [e.value for e in at.exception] + [e.value for e in at.error]
+        if failures:
+            errors.append(f"{name}: {failures[0]}")
+        return at
+
+    at = step("open", lambda: AppTest.from_file(APP_PATH, default_timeout=timeout).run())
+    if at is None:
+        return timings, errors
+
+    def login():
+        at.text_input[0].input(account)
+        at.text_input[1].input(password)
+        return next(b for b in at.button if b.label == text["login"]).click().run()
+
+    def checkin():
+        return next(b for b in at.button if b.label == text["checkin"]).click().run()
+
+    def history():
+        # 重新整理一次頁面（打卡後使用者會再看一次自己的紀錄）
+        return at.run()
+
+    for name, action in (("login", login), ("checkin", checkin), ("history", history)):
+        if step(name, action) is None or errors:
+            break
+    return timings, errors
+
+
+def run_level(sessions, accounts, pattern, duration, timeout, text, seed):
+    rng = np.random.default_rng(seed)
+    offsets = arrivals(pattern, sessions, duration, rng)
+    # 每個 session 取一個不重複的帳號
+    accounts = random.Random(seed).sample(range(accounts), sessions)
+    results = [None] * sessions
+    started = time.perf_counter()
+
+    def worker(i):
+        delay = started + offsets[i] - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        began = time.perf_counter()
+        timings, errors = run_session(accounts[i], text, timeout)
+        results[i] = (timings, errors, time.perf_counter() - began)
+
+    with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="loadtest") as pool:
+        list(pool.map(worker, range(sessions)))
+    wall = time.perf_counter() - started
+
+    report = {"sessions": sessions, "pattern": pattern, "wall_s": wall}
+    completed = [r for r in results if not r[1]]
+    report["completed"] = len(completed)
+    report["errors"] = sum(len(r[1]) for r in results)
+    report["error_samples"] = [e for r in results for e in r[1]][:5]
+    report["throughput_sessions_per_s"] = len(completed) / wall if wall else 0.0
+    for name in STEPS:
+        samples = [r[0][name] for r in results if name in r[0]]
+        if samples:
+            report[f"{name}_p50_ms"] = float(np.percentile(samples, 50))
+            report[f"{name}_p95_ms"] = float(np.percentile(samples, 95))
+            report[f"{name}_p99_ms"] = float(np.percentile(samples, 99))
+    session_times = [r[2] * 1000 for r in completed]
+    if session_times:
+        report["session_p50_ms"] = float(np.percentile(session_times, 50))
+        report["session_p95_ms"] = float(np.percentile(session_times, 95))
+    return report
+
+
+def print_reports(reports):
+    print(f"{'sessions':>8} {'done':>5} {'err':>4} {'sess/s':>7} {'login p95':>10} {'checkin p95':>12} {'history p95':>12} {'session p95':>12}")
+    for r in reports:
+        cells = [f"{r.get(k, float('nan')):.0f}" for k in ("login_p95_ms", "checkin_p95_ms", "history_p95_ms", "session_p95_ms")]
+        print(f"{r['sessions']:>8} {r['completed']:>5} {r['errors']:>4} {r['throughput_sessions_per_s']:>7.2f} {cells[0]:>10} {cells[1]:>12} {cells[2]:>12} {cells[3]:>12}")
+    base = reports[0].get("session_p95_ms")
+    if base:
+        # 與最少 session 數相比的延遲倍數，用來判斷單一 instance 的承載上限
+        print("degradation (session p95 vs first level): " + ", ".join(
+            f"{r['sessions']}→×{r['session_p95_ms'] / base:.1f}" for r in reports if r.get("session_p95_ms")
+        ))
+    for r in reports:
+        for sample in r["error_samples"]:
+            print(f"  [{r['sessions']}] {sample}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="以 AppTest 模擬多位員工同時登入、打卡、查看紀錄")
+    parser.add_argument("--sessions", type=int, nargs="+", default=list(LEVELS), help="同時在線的 session 數（可給多個，逐級加壓）")
+    parser.add_argument("--pattern", choices=("spike", "poisson", "ramp", "burst"), default="spike", help="到達模式")
+    parser.add_argument("--duration", type=float, default=10.0, help="到達時間分佈的長度（秒）")
+    parser.add_argument("--latency", type=float, default=0.05, help="每次 Sheets API 呼叫的模擬延遲（秒）")
+    parser.add_argument("--rows", type=int, default=5000, help="本月工作表預先放入的打卡筆數")
+    parser.add_argument("--timeout", type=float, default=60.0, help="每次 AppTest.run 的逾時秒數")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="結果輸出為 JSON 檔")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.WARNING)
+    with open(os.path.join(APP_DIR, "lang_config.json"), encoding="utf-8") as f:
+        text = json.load(f)["中文"]
+
+    accounts = max(max(args.sessions), 50)
+    client = build_backend(accounts, args.rows, args.latency, args.seed)
+    patches = patch_externals(client)
+    for patcher in patches:
+        patcher.start()
+    try:
+        # 先跑一個 session 暖機（匯入模組、建立共用資源），不計入結果
+        run_session(0, text, args.timeout)
+        reports = [run_level(n, accounts, args.pattern, args.duration, args.timeout, text, args.seed + n) for n in args.sessions]
+    finally:
+        for patcher in patches:
+            patcher.stop()
+
+    print_reports(reports)
+    print(f"fake Sheets API calls: {dict(client.kinds)}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+    return 1 if any(r["errors"] for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
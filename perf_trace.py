@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# 每個階段保留最近幾筆耗時，用來計算 p50 / p95
+PERF_SAMPLES = int(os.environ.get("CHECKIN_PERF_SAMPLES", "1000"))
+# 設為 0 可關閉結構化日誌輸出（耗時分佈仍會記錄）
+PERF_LOG = os.environ.get("CHECKIN_PERF_LOG", "1") != "0"
+
+logger = logging.getLogger("checkin.perf")
+if PERF_LOG and not logger.handlers:
+    # 一行一個 JSON 輸出到 stderr，Cloud Run 會直接收進 Cloud Logging
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+# --- 一次 rerun 的統計：API 呼叫次數與最後一個 span 結束的時間 ---
+class RerunStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last_activity = self.started
+        self.api_calls = {"read": 0, "write": 0, "drive": 0}
+        self.finished = False
+
+    @property
+    def total_api_calls(self):
+        return sum(self.api_calls.values())
+
+
+_current_rerun = contextvars.ContextVar("checkin_rerun", default=None)
+
+
+# --- 程序內的耗時分佈：每個階段一個固定長度的樣本佇列 ---
+class PerfStore:
+    def __init__(self, max_samples=PERF_SAMPLES):
+        self.max_samples = max_samples
+        self._samples = {}
+        self._counts = {}
+        self._api_per_rerun = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def record(self, stage, ms):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.max_samples)
+            samples.append(ms)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    def record_rerun(self, ms, api_calls):
+        self.record("rerun", ms)
+        with self._lock:
+            self._api_per_rerun.append(api_calls)
+
+    # 各階段的 p50 / p95 / max（毫秒），依 p95 由大到小排序
+    # numpy 只在管理者查看效能頁面時才載入，不拖慢啟動
+    def summary(self):
+        import numpy as np
+        with self._lock:
+            items = [(stage, np.array(samples), self._counts[stage]) for stage, samples in self._samples.items()]
+        rows = [{
+            "stage": stage,
+            "count": count,
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)),
+            "max_ms": float(samples.max()),
+        } for stage, samples, count in items]
+        return sorted(rows, key=lambda row: row["p95_ms"], reverse=True)
+
+    def api_calls_summary(self):
+        import numpy as np
+        with self._lock:
+            calls = np.array(self._api_per_rerun)
+        if len(calls) == 0:
+            return {"reruns": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0}
+        return {
+            "reruns": len(calls),
+            "mean": float(calls.mean()),
+            "p50": float(np.percentile(calls, 50)),
+            "p95": float(np.percentile(calls, 95)),
+            "max": int(calls.max()),
+        }
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._api_per_rerun.clear()
+
+
+perf_store = PerfStore()
+
+
+# --- 計時區段：寫入結構化日誌（一行一個 JSON）並記到 perf_store ---
+@contextmanager
+def span(stage, **fields):
+    began = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        ended = time.perf_counter()
+        ms = (ended - began) * 1000
+        perf_store.record(stage, ms)
+        rerun = _current_rerun.get()
+        if rerun is not None:
+            rerun.last_activity = ended
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"span": stage, "ms": round(ms, 2), "status": status, **fields}, ensure_ascii=False, default=str))
+
+
+# 由 Sheets HTTP client 呼叫，把 API 次數記到目前這次 rerun
+def count_api_call(kind):
+    rerun = _current_rerun.get()
+    if rerun is not None:
+        rerun.api_calls[kind] = rerun.api_calls.get(kind, 0) + 1
+
+
+# --- rerun 的開始與結束（session_state 由呼叫端傳入） ---
+# st.rerun() / st.stop() 會直接中斷腳本，沒有走到 end_rerun 的那次 rerun 在下次開始時補記，
+# 耗時算到最後一個 span 結束為止
+def begin_rerun(session_state):
+    previous = session_state.get("_perf_rerun")
+    if previous is not None and not previous.finished:
+        _finish(previous, previous.last_activity)
+    rerun = RerunStats()
+    session_state["_perf_rerun"] = rerun
+    _current_rerun.set(rerun)
+    return rerun
+
+
+def end_rerun(session_state):
+    rerun = session_state.get("_perf_rerun")
+    if rerun is not None and not rerun.finished:
+        _finish(rerun, time.perf_counter())
+
+
+def _finish(rerun, ended):
+    rerun.finished = True
+    ms = (ended - rerun.started) * 1000
+    perf_store.record_rerun(ms, rerun.total_api_calls)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"span": "rerun", "ms": round(ms, 2), "api_calls": rerun.api_calls}))
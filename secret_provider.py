@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import logging
+import threading
+
+# 來源：secretmanager（Cloud Run 正式環境）、streamlit（st.secrets / secrets.toml）、local（環境變數或本機 JSON 檔）
+# CHECKIN_SECRET_BACKEND 有設定時覆蓋各 app 的預設來源
+SECRET_BACKEND = os.environ.get("CHECKIN_SECRET_BACKEND", "")
+SECRET_PROJECT = os.environ.get("CHECKIN_SECRET_PROJECT", "616566246123")
+SECRETS_DIR = os.environ.get("CHECKIN_SECRETS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".secrets"))
+# 本機來源的環境變數前綴：CHECKIN_SECRET_GOOGLE_SERVICE_ACCOUNT 可放 JSON 內容或 JSON 檔的路徑
+ENV_PREFIX = "CHECKIN_SECRET_"
+# 快取時效；到期前 REFRESH_AHEAD 秒開始在背景重新讀取，期間仍回傳舊值
+SECRET_TTL = float(os.environ.get("CHECKIN_SECRET_TTL", "3600"))
+REFRESH_AHEAD = float(os.environ.get("CHECKIN_SECRET_REFRESH_AHEAD", "300"))
+# 有註冊 on_change 的 secret 背景更新失敗後多久再試
+RETRY_SECONDS = 60
+
+logger = logging.getLogger("checkin.secrets")
+
+
+class SecretNotFound(KeyError):
+    pass
+
+
+# --- Google Secret Manager：第一次讀取時才匯入並建立 client ---
+class SecretManagerBackend:
+    name = "secretmanager"
+
+    def __init__(self, project=SECRET_PROJECT):
+        self.project = project
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from google.cloud import secretmanager
+                self._client = secretmanager.SecretManagerServiceClient()
+            return self._client
+
+    def fetch(self, secret_id, version="latest"):
+        name = f"projects/{self.project}/secrets/{secret_id}/versions/{version}"
+        response = self._get_client().access_secret_version(request={"name": name})
+        return json.loads(response.payload.data.decode("UTF-8"))
+
+
+# --- st.secrets（.streamlit/secrets.toml 或 Streamlit Cloud 的設定） ---
+class StreamlitSecretsBackend:
+    name = "streamlit"
+
+    def fetch(self, secret_id, version="latest"):
+        import streamlit as st
+        try:
+            section = st.secrets[secret_id]
+        except (KeyError, FileNotFoundError) as e:
+            raise SecretNotFound(secret_id) from e
+        return section.to_dict() if hasattr(section, "to_dict") else section
+
+
+# --- 本機：先看環境變數（JSON 內容或檔案路徑），再看 SECRETS_DIR/<secret_id>.json ---
+class LocalSecretsBackend:
+    name = "local"
+
+    def __init__(self, directory=SECRETS_DIR, env_prefix=ENV_PREFIX):
+        self.directory = directory
+        self.env_prefix = env_prefix
+
+    def fetch(self, secret_id, version="latest"):
+        value = os.environ.get(self.env_prefix + secret_id.upper())
+        if value is not None:
+            if value.lstrip().startswith(("{", "[")):
+                return json.loads(value)
+            path = value
+        else:
+            path = os.path.join(self.directory, f"{secret_id}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError as e:
+            raise SecretNotFound(secret_id) from e
+
+
+BACKENDS = {
+    "secretmanager": SecretManagerBackend,
+    "streamlit": StreamlitSecretsBackend,
+    "local": LocalSecretsBackend,
+}
+
+
+# --- 記憶體快取：第一次讀取會等待，之後到期前在背景更新，金鑰輪替不會卡住任何請求 ---
+# 背景更新失敗時保留舊值，下一次讀取再試；值有變動時通知 on_change 註冊的函式（例如換掉 gspread 的憑證）
+# 有註冊 on_change 的 secret 通常只在啟動時讀取一次，因此自行排程更新，不依賴之後的 get()
+class SecretProvider:
+    def __init__(self, backend, ttl=SECRET_TTL, refresh_ahead=REFRESH_AHEAD):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_ahead = min(refresh_ahead, ttl)
+        self._entries = {}  # (secret_id, version) -> (值, 讀取時間)
+        self._refreshing = set()
+        self._listeners = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self.stats = {"fetches": 0, "hits": 0, "refreshes": 0, "refresh_errors": 0, "rotations": 0, "last_error": None}
+
+    def _fetch_lock(self, key):
+        with self._lock:
+            return self._fetch_locks.setdefault(key, threading.Lock())
+
+    def get(self, secret_id, version="latest"):
+        key = (secret_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            # 同一個 secret 同時只讀取一次，其他執行緒等待結果
+            with self._fetch_lock(key):
+                with self._lock:
+                    entry = self._entries.get(key)
+                if entry is None:
+                    value = self.backend.fetch(secret_id, version)
+                    with self._lock:
+                        self._entries[key] = (value, time.monotonic())
+                        self.stats["fetches"] += 1
+                    self._schedule(key)
+                    return value
+        value, fetched_at = entry
+        with self._lock:
+            self.stats["hits"] += 1
+        if time.monotonic() - fetched_at >= self.ttl - self.refresh_ahead:
+            self._start_refresh(key)
+        return value
+
+    def _start_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key,), name=f"secret-refresh-{key[0]}", daemon=True).start()
+
+    def _refresh(self, key):
+        secret_id, version = key
+        try:
+            value = self.backend.fetch(secret_id, version)
+        except Exception as e:
+            with self._lock:
+                self.stats["refresh_errors"] += 1
+                self.stats["last_error"] = f"{secret_id}: {type(e).__name__}: {e}"
+                self._refreshing.discard(key)
+            logger.warning("secret refresh failed for %s: %s", secret_id, e)
+            self._schedule(key, RETRY_SECONDS)
+            return
+        with self._lock:
+            previous = self._entries.get(key)
+            self._entries[key] = (value, time.monotonic())
+            self._refreshing.discard(key)
+            self.stats["refreshes"] += 1
+            changed = previous is not None and previous[0] != value
+            if changed:
+                self.stats["rotations"] += 1
+            listeners = list(self._listeners.get(secret_id, ())) if changed else []
+        self._schedule(key)
+        for callback in listeners:
+            try:
+                callback(value)
+            except Exception as e:
+                with self._lock:
+                    self.stats["last_error"] = f"{secret_id} listener: {type(e).__name__}: {e}"
+                logger.exception("secret rotation listener failed for %s", secret_id)
+
+    # 只排程有人監聽的 secret；delay 未指定時在到期前 refresh_ahead 秒更新
+    def _schedule(self, key, delay=None):
+        with self._lock:
+            if key[0] not in self._listeners:
+                return
+            if delay is None:
+                entry = self._entries.get(key)
+                age = time.monotonic() - entry[1] if entry else 0
+                delay = self.ttl - self.refresh_ahead - age
+            previous = self._timers.get(key)
+            timer = self._timers[key] = threading.Timer(max(delay, 1), self._start_refresh, args=(key,))
+            timer.daemon = True
+        if previous is not None:
+            previous.cancel()
+        timer.start()
+
+    def on_change(self, secret_id, callback):
+        with self._lock:
+            self._listeners.setdefault(secret_id, []).append(callback)
+            keys = [key for key in self._entries if key[0] == secret_id and key not in self._timers]
+        for key in keys:
+            self._schedule(key)
+
+    def invalidate(self, secret_id=None):
+        with self._lock:
+            for key in [k for k in self._entries if secret_id is None or k[0] == secret_id]:
+                del self._entries[key]
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._lock:
+            ages = {f"{k[0]}@{k[1]}": round(now - fetched_at, 1) for k, (_, fetched_at) in self._entries.items()}
+            return {"backend": self.backend.name, "ttl": self.ttl, "refresh_ahead": self.refresh_ahead, "age_seconds": ages,
+                    "scheduled": sorted(k[0] for k in self._timers), **self.stats}
+
+
+# --- 每種來源在同一個程序內共用一個 provider ---
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def get_secret_provider(default_backend="secretmanager"):
+    name = SECRET_BACKEND or default_backend
+    with _providers_lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = _providers[name] = SecretProvider(BACKENDS[name]())
+        return provider
@@ -0,0 +1,261 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import sqlite3
+import logging
+import threading
+
+# 跨 instance 共用的快取層（預設關閉）：
+#   CHECKIN_SHARED_CACHE=redis://host:6379/0   Redis（Memorystore 等，需安裝 redis 套件）
+#   CHECKIN_SHARED_CACHE=sqlite:///tmp/checkin-cache.db   本機 SQLite（同一台機器的多個程序或開發測試用）
+SHARED_CACHE_URL = os.environ.get("CHECKIN_SHARED_CACHE", "")
+# 快取格式改變時遞增，舊格式的 key 自然失效
+SCHEMA_VERSION = 1
+# 沒有其他期限的項目在共用快取中最多保留多久
+MAX_TTL_SECONDS = 7 * 86400
+# 重新整理的鎖：持有者當掉時多久後自動釋放、其他 instance 最多等多久
+LOCK_SECONDS = 30
+LOCK_WAIT_SECONDS = 10
+POLL_SECONDS = 0.05
+
+logger = logging.getLogger("checkin.shared_cache")
+
+
+# --- Redis：SET NX PX 當作跨 instance 的鎖，釋放時確認仍是自己持有 ---
+class RedisCacheBackend:
+    name = "redis"
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def acquire(self, key, ttl):
+        token = uuid.uuid4().hex
+        return token if self.client.set(key, token, nx=True, px=int(ttl * 1000)) else None
+
+    def release(self, key, token):
+        self.client.eval(self.RELEASE_SCRIPT, 1, key, token)
+
+
+# --- SQLite：同一個檔案可由多個程序共用（WAL），語意與 Redis 後端相同 ---
+class SQLiteCacheBackend:
+    name = "sqlite"
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, token TEXT, expires REAL)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute("SELECT value FROM entries WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl):
+        self._connect().execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, value, time.time() + ttl))
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def acquire(self, key, ttl):
+        token, now = uuid.uuid4().hex, time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM locks WHERE key = ? AND expires <= ?", (key, now))
+            acquired = conn.execute("INSERT OR IGNORE INTO locks VALUES (?, ?, ?)", (key, token, now + ttl)).rowcount == 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return token if acquired else None
+
+    def release(self, key, token):
+        self._connect().execute("DELETE FROM locks WHERE key = ? AND token = ?", (key, token))
+
+
+def open_backend(url):
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCacheBackend(url)
+    return SQLiteCacheBackend(url[len("sqlite://"):] if url.startswith("sqlite://") else url)
+
+
+# --- 共用快取：版本化的 key、過期後先回舊值再背景更新（stale-while-revalidate）、
+# 同一個 key 同時只有一個 instance 向 Google Sheets 重新讀取，其他 instance 等它寫回後直接使用 ---
+# 共用快取故障時不影響功能：讀寫錯誤只計數，直接向來源讀取
+class SharedCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.namespace = f"checkin:v{SCHEMA_VERSION}"
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._revalidating = set()
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "waited": 0, "revalidations": 0, "errors": 0}
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def key(self, parts):
+        return ":".join([self.namespace, *map(str, parts)])
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _read(self, key):
+        try:
+            raw = self.backend.get(key)
+            return json.loads(zlib.decompress(raw)) if raw else None
+        except Exception as e:
+            self._count("errors")
+            logger.warning("shared cache read failed for %s: %s", key, e)
+            return None
+
+    def _write(self, key, data, ttl):
+        try:
+            raw = zlib.compress(json.dumps({"at": time.time(), "data": data}, ensure_ascii=False).encode("utf-8"))
+            self.backend.set(key, raw, ttl)
+        except Exception as e:
+            self._count("errors")
+            logger.warning("shared cache write failed for %s: %s", key, e)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    # fresh_seconds 內直接使用；再過 stale_seconds 內先回舊值並在背景更新；fresh_seconds=None 表示內容不會變（版本化的 key）
+    def get_or_load(self, parts, loader, fresh_seconds=None, stale_seconds=0):
+        if self.backend is None:
+            return loader()
+        key = self.key(parts)
+        ttl = MAX_TTL_SECONDS if fresh_seconds is None else min(fresh_seconds + stale_seconds, MAX_TTL_SECONDS)
+        envelope = self._read(key)
+        if envelope is not None:
+            age = time.time() - envelope["at"]
+            if fresh_seconds is None or age < fresh_seconds:
+                self._count("hits")
+                return envelope["data"]
+            if age < fresh_seconds + stale_seconds:
+                self._count("stale_hits")
+                self._revalidate(key, loader, ttl)
+                return envelope["data"]
+        self._count("misses")
+        return self._load(key, loader, ttl, fresh_seconds, seen_at=envelope["at"] if envelope else None)
+
+    def _load(self, key, loader, ttl, fresh_seconds, seen_at):
+        # 同一程序內的執行緒先排隊，只有一個去搶跨 instance 的鎖
+        with self._key_lock(key):
+            envelope = self._read(key)
+            if envelope is not None and envelope["at"] != seen_at and (fresh_seconds is None or time.time() - envelope["at"] < fresh_seconds):
+                self._count("hits")
+                return envelope["data"]
+            token, reachable = self._acquire(key)
+            if token is None and reachable:
+                # 其他 instance 正在讀取：等它寫回；等太久就自己讀
+                deadline = time.monotonic() + LOCK_WAIT_SECONDS
+                while time.monotonic() < deadline:
+                    time.sleep(POLL_SECONDS)
+                    envelope = self._read(key)
+                    if envelope is not None and envelope["at"] != seen_at:
+                        self._count("waited")
+                        return envelope["data"]
+            try:
+                data = loader()
+                self._count("loads")
+                self._write(key, data, ttl)
+                return data
+            finally:
+                if token is not None:
+                    self._release(key, token)
+
+    # 回傳 (token, 共用快取是否可用)；無法連線時不等待，直接向來源讀取
+    def _acquire(self, key):
+        try:
+            return self.backend.acquire(f"{key}:lock", LOCK_SECONDS), True
+        except Exception as e:
+            self._count("errors")
+            logger.warning("shared cache lock failed for %s: %s", key, e)
+            return None, False
+
+    def _release(self, key, token):
+        try:
+            self.backend.release(f"{key}:lock", token)
+        except Exception as e:
+            self._count("errors")
+            logger.warning("shared cache unlock failed for %s: %s", key, e)
+
+    def _revalidate(self, key, loader, ttl):
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def run():
+            try:
+                token, _ = self._acquire(key)
+                if token is None:
+                    return  # 其他 instance 已經在更新，或共用快取無法連線
+                try:
+                    self._write(key, loader(), ttl)
+                    self._count("revalidations")
+                finally:
+                    self._release(key, token)
+            except Exception as e:
+                self._count("errors")
+                logger.warning("shared cache revalidation failed for %s: %s", key, e)
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        threading.Thread(target=run, name="shared-cache-revalidate", daemon=True).start()
+
+    # 小型的共用值（例如標記），不經過重新整理的鎖
+    def get(self, parts):
+        if self.backend is None:
+            return None
+        envelope = self._read(self.key(parts))
+        return envelope["data"] if envelope else None
+
+    def set(self, parts, data, ttl=MAX_TTL_SECONDS):
+        if self.backend is not None:
+            self._write(self.key(parts), data, ttl)
+
+    def delete(self, parts):
+        if self.backend is None:
+            return
+        try:
+            self.backend.delete(self.key(parts))
+        except Exception as e:
+            self._count("errors")
+            logger.warning("shared cache delete failed: %s", e)
+
+    def metrics(self):
+        with self._lock:
+            return {"backend": self.backend.name if self.backend else None, **self.stats}
+
+
+shared_cache = SharedCache(open_backend(SHARED_CACHE_URL))
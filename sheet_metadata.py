@@ -0,0 +1,121 @@
+import time
+import random
+import threading
+import gspread
+from shared_cache import shared_cache
+
+# 工作表清單多久重新整理一次（其他 instance 新增的月份會在這段時間後出現）
+LIST_TTL_SECONDS = 60
+
+
+# --- 試算表的工作表清單與 Worksheet 物件快取：一次 fetch_sheet_metadata 取得全部 ---
+class SheetMetadataCache:
+    def __init__(self, spreadsheet, list_ttl=LIST_TTL_SECONDS):
+        self.spreadsheet = spreadsheet
+        self.list_ttl = list_ttl
+        self._handles = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self._create_locks = {}
+        self.stats = {"metadata_fetches": 0, "hits": 0, "creates": 0, "create_races": 0}
+
+    # worksheets() 本身就是一次 fetch_sheet_metadata
+    def _refresh(self):
+        self._handles = {worksheet.title: worksheet for worksheet in self.spreadsheet.worksheets()}
+        self._fetched_at = time.monotonic()
+        self.stats["metadata_fetches"] += 1
+
+    def _handles_fresh(self, max_age=None):
+        with self._lock:
+            if self._handles is None or (max_age is not None and time.monotonic() - self._fetched_at > max_age):
+                self._refresh()
+            return self._handles
+
+    # 開啟共用快取時，工作表清單由一個 instance 讀取後共用；Worksheet 物件仍在各程序內第一次用到時建立
+    def titles(self):
+        if not shared_cache.enabled:
+            return list(self._handles_fresh(self.list_ttl))
+        return shared_cache.get_or_load(
+            ("sheets", self.spreadsheet.id), lambda: list(self._handles_fresh(0)),
+            fresh_seconds=self.list_ttl, stale_seconds=self.list_ttl * 4,
+        )
+
+    def worksheet(self, title):
+        handles = self._handles_fresh()
+        if title in handles:
+            self.stats["hits"] += 1
+            return handles[title]
+        # 可能是其他 instance 剛建立的工作表，重新整理一次再找
+        with self._lock:
+            self._refresh()
+            handles = self._handles
+        if title not in handles:
+            raise gspread.exceptions.WorksheetNotFound(title)
+        return handles[title]
+
+    # --- 取得或建立工作表：同一程序內以鎖避免重複建立，跨 instance 的競爭以「已存在」錯誤處理 ---
+    def get_or_create(self, title, header, rows=1000, cols=10):
+        try:
+            return self.worksheet(title)
+        except gspread.exceptions.WorksheetNotFound:
+            pass
+
+        with self._lock:
+            create_lock = self._create_locks.setdefault(title, threading.Lock())
+        with create_lock:
+            with self._lock:
+                if self._handles and title in self._handles:
+                    return self._handles[title]
+            try:
+                self._create(title, header, rows, cols)
+                self.stats["creates"] += 1
+                shared_cache.delete(("sheets", self.spreadsheet.id))
+            except gspread.exceptions.APIError as e:
+                if "already exists" not in str(e):
+                    raise
+                self.stats["create_races"] += 1
+            return self.worksheet(title)
+
+    # 新增工作表與寫入標題列放在同一個 batch_update，其他 instance 不會看到沒有標題的工作表
+    def _create(self, title, header, rows, cols):
+        sheet_id = random.randint(1, 2 ** 31 - 1)
+        body = {
+            "requests": [
+                {"addSheet": {"properties": {
+                    "title": title,
+                    "sheetId": sheet_id,
+                    "sheetType": "GRID",
+                    "gridProperties": {"rowCount": rows, "columnCount": cols},
+                }}},
+                {"updateCells": {
+                    "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                    "rows": [{"values": [{"userEnteredValue": {"stringValue": h}} for h in header]}],
+                    "fields": "userEnteredValue",
+                }},
+            ]
+        }
+        self.spreadsheet.batch_update(body)
+
+    def invalidate(self):
+        with self._lock:
+            self._handles = None
+
+
+# --- 全程序共用（依試算表 ID） ---
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_metadata_cache(spreadsheet):
+    with _caches_lock:
+        cache = _caches.get(spreadsheet.id)
+        if cache is None:
+            cache = _caches[spreadsheet.id] = SheetMetadataCache(spreadsheet)
+        return cache
+
+
+def invalidate_metadata(spreadsheet_id=None):
+    with _caches_lock:
+        caches = list(_caches.values()) if spreadsheet_id is None else [_caches[spreadsheet_id]] if spreadsheet_id in _caches else []
+    for cache in caches:
+        cache.invalidate()
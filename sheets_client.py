@@ -0,0 +1,287 @@
+import os
+import time
+import random
+import queue
+import threading
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+import gspread
+from gspread.exceptions import APIError
+from gspread.http_client import HTTPClient
+from gspread.utils import convert_credentials
+from google.auth.transport.requests import Request
+from perf_trace import span, count_api_call
+
+# Sheets API 預設配額：每位使用者每分鐘 60 次讀取、60 次寫入（可依專案實際配額調整）
+READ_QUOTA = int(os.environ.get("SHEETS_READ_QUOTA", "60"))
+WRITE_QUOTA = int(os.environ.get("SHEETS_WRITE_QUOTA", "60"))
+QUOTA_WINDOW_SECONDS = float(os.environ.get("SHEETS_QUOTA_WINDOW", "60"))
+MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "5"))
+MAX_BACKOFF = 32
+# 同時最多幾個 HTTP session（各自保持 keep-alive 連線）；超過時請求在本地排隊等待
+SESSION_POOL_SIZE = int(os.environ.get("SHEETS_SESSION_POOL", "8"))
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+# 每個請求的逾時（連線, 讀取），以及等不到空閒 session 時最多等多久；卡住的連線不會拖住整個程序
+REQUEST_TIMEOUT = (float(os.environ.get("SHEETS_CONNECT_TIMEOUT", "10")), float(os.environ.get("SHEETS_READ_TIMEOUT", "60")))
+POOL_WAIT_SECONDS = float(os.environ.get("SHEETS_POOL_WAIT", "30"))
+
+
+# --- 依網址與方法判斷配額類別：Drive API 另有獨立配額，只計數不限流 ---
+def request_kind(method, endpoint):
+    if "googleapis.com/drive" in endpoint:
+        return "drive"
+    return "read" if method.upper() == "GET" else "write"
+
+
+# --- 滾動時間窗內的請求計數：額度用完前先在本地等待，不讓 API 回 429 ---
+class QuotaBudget:
+    def __init__(self, limits=None, window=QUOTA_WINDOW_SECONDS):
+        self.limits = limits if limits is not None else {"read": READ_QUOTA, "write": WRITE_QUOTA}
+        self.window = window
+        self._sent = {kind: deque() for kind in ("read", "write", "drive")}
+        self._lock = threading.Lock()
+        self._counters = {
+            "requests": 0, "read": 0, "write": 0, "drive": 0,
+            "throttled": 0, "throttle_seconds": 0.0,
+            "retries": 0, "rate_limited": 0, "coalesced": 0, "errors": 0,
+        }
+
+    def _expire(self, now):
+        for sent in self._sent.values():
+            while sent and now - sent[0] >= self.window:
+                sent.popleft()
+
+    # 取得一次請求額度；已達上限時等到最早的請求離開時間窗為止
+    def acquire(self, kind):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                sent = self._sent[kind]
+                limit = self.limits.get(kind)
+                if limit is None or len(sent) < limit:
+                    sent.append(now)
+                    self._counters["requests"] += 1
+                    self._counters[kind] += 1
+                    if waited:
+                        self._counters["throttled"] += 1
+                        self._counters["throttle_seconds"] += waited
+                    return waited
+                delay = self.window - (now - sent[0]) + 0.01
+            time.sleep(delay)
+            waited += delay
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    # 目前時間窗內的用量與剩餘額度
+    def metrics(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            metrics = dict(self._counters)
+            for kind, sent in self._sent.items():
+                limit = self.limits.get(kind)
+                metrics[f"{kind}_in_window"] = len(sent)
+                metrics[f"{kind}_headroom"] = None if limit is None else max(limit - len(sent), 0)
+            metrics["window_seconds"] = self.window
+            return metrics
+
+
+quota_budget = QuotaBudget()
+
+
+# 等不到空閒的 session：請求還沒送出，寫入也可以安全重試
+class PoolTimeout(requests.exceptions.ConnectTimeout):
+    pass
+
+
+# --- 多個 Streamlit session 共用的 HTTP session 池 ---
+# 每個請求借用一個 requests.Session（LIFO，優先用剛用過、連線還開著的），用完歸還；
+# 存取權杖只在這裡集中更新一次，各 session 不再各自 refresh，也不會因共用同一個 session 而排隊
+class SessionPool:
+    def __init__(self, credentials, size=SESSION_POOL_SIZE, wait_seconds=POOL_WAIT_SECONDS):
+        self.credentials = credentials
+        self.size = size
+        self.wait_seconds = wait_seconds
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._token_lock = threading.Lock()
+        self._token_session = requests.Session()
+        self._sessions = []
+        self.stats = {"requests": 0, "waits": 0, "wait_seconds": 0.0, "wait_timeouts": 0, "token_refreshes": 0, "unauthorized_retries": 0}
+        _pools.add(self)
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=2)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @contextmanager
+    def session(self):
+        try:
+            session = self._idle.get_nowait()
+        except queue.Empty:
+            session = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    session = self._new_session()
+                    self._sessions.append(session)
+            if session is None:
+                began = time.monotonic()
+                try:
+                    session = self._idle.get(timeout=self.wait_seconds)
+                except queue.Empty:
+                    with self._lock:
+                        self.stats["wait_timeouts"] += 1
+                    raise PoolTimeout(f"no idle Sheets session after {self.wait_seconds:g}s")
+                finally:
+                    with self._lock:
+                        self.stats["waits"] += 1
+                        self.stats["wait_seconds"] += time.monotonic() - began
+        try:
+            yield session
+        finally:
+            self._idle.put(session)
+
+    # 權杖快到期（google-auth 預留數分鐘）時才更新；多個執行緒同時發現過期也只更新一次
+    def _authorize(self, headers, stale_token=None):
+        credentials = self.credentials
+        with self._token_lock:
+            if not credentials.valid or (stale_token is not None and credentials.token == stale_token):
+                credentials.refresh(Request(self._token_session))
+                self.stats["token_refreshes"] += 1
+            credentials.apply(headers)
+            return credentials.token
+
+    def request(self, method, url, headers=None, **kwargs):
+        request_headers = dict(headers or {})
+        token = self._authorize(request_headers)
+        with self._lock:
+            self.stats["requests"] += 1
+        with self.session() as session:
+            response = session.request(method, url, headers=request_headers, **kwargs)
+            # 權杖在送出途中失效（例如金鑰剛輪替）：強制更新一次再重送
+            if response.status_code == 401:
+                with self._lock:
+                    self.stats["unauthorized_retries"] += 1
+                request_headers = dict(headers or {})
+                self._authorize(request_headers, stale_token=token)
+                response = session.request(method, url, headers=request_headers, **kwargs)
+        return response
+
+    def metrics(self):
+        with self._lock:
+            # urllib3 的 num_connections 是建立過的連線數（每次都是一次 TLS 交握）
+            connections = 0
+            for session in self._sessions:
+                pools = session.get_adapter("https://").poolmanager.pools
+                connections += sum(pools[key].num_connections for key in pools.keys() if key in pools)
+            return {
+                "size": self.size,
+                "sessions": self._created,
+                "idle": self._idle.qsize(),
+                "connections_opened": connections,
+                **self.stats,
+            }
+
+
+_pools = weakref.WeakSet()
+
+
+def session_pool_metrics():
+    return [pool.metrics() for pool in list(_pools)]
+
+
+# --- gspread 的 HTTPClient：所有 Sheets / Drive 呼叫都經過這裡 ---
+# 1. 送出前先向 QuotaBudget 取得額度  2. 429 / 5xx 以加上隨機抖動的指數退避重試
+# 3. 多個 session 同時送出完全相同的讀取時，只送一次並共用結果
+class QuotaHTTPClient(HTTPClient):
+    budget = quota_budget
+    max_retries = MAX_RETRIES
+
+    def __init__(self, auth, session=None):
+        if session is None:
+            auth = convert_credentials(auth)
+            session = SessionPool(auth)
+        super().__init__(auth, session)
+        self.auth = auth
+        self.timeout = REQUEST_TIMEOUT
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def request(self, method, endpoint, params=None, data=None, json=None, files=None, headers=None):
+        kind = request_kind(method, endpoint)
+        if kind == "write" or data is not None or json is not None or files is not None:
+            return self._send(kind, method, endpoint, params, data, json, files, headers)
+
+        key = (method.upper(), endpoint, repr(sorted(params.items())) if isinstance(params, dict) else repr(params))
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self.budget.count("coalesced")
+            return future.result()
+
+        try:
+            response = self._send(kind, method, endpoint, params, data, json, files, headers)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _send(self, kind, method, endpoint, params, data, json, files, headers):
+        attempt = 0
+        while True:
+            self.budget.acquire(kind)
+            count_api_call(kind)
+            try:
+                with span(f"sheets.{kind}", method=method.upper(), endpoint=endpoint):
+                    return super().request(method, endpoint, params=params, data=data, json=json, files=files, headers=headers)
+            except APIError as e:
+                self.budget.count("errors")
+                if e.code == 429:
+                    self.budget.count("rate_limited")
+                # 寫入遇到 5xx 時可能已經套用，只在確定未執行的 429 才重試，避免重複寫入
+                retryable = e.code == 429 or (kind != "write" and e.code in RETRY_STATUS)
+                if not retryable or attempt >= self.max_retries:
+                    raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.budget.count("errors")
+                if (kind == "write" and not isinstance(e, PoolTimeout)) or attempt >= self.max_retries:
+                    raise
+            delay = min(MAX_BACKOFF, 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.budget.count("retries")
+            time.sleep(delay)
+
+
+def authorize(credentials):
+    return gspread.authorize(credentials, http_client=QuotaHTTPClient)
+
+
+def service_account(filename):
+    return gspread.service_account(filename=filename, http_client=QuotaHTTPClient)
+
+
+# --- 金鑰輪替：直接換掉既有 client 的憑證，已開啟的試算表與工作表物件都繼續可用 ---
+def rotate_credentials(client, credentials):
+    http_client = client.http_client
+    http_client.auth = credentials
+    # SessionPool 下一個請求就會用新憑證取得權杖
+    http_client.session.credentials = credentials
@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+import threading
+from contextlib import contextmanager
+from perf_trace import span
+
+# CHECKIN_STARTUP_PROFILE=1 時，每次 rerun 結束後輸出新出現的匯入與初始化階段耗時（stderr 與頁面）
+PROFILE_ENABLED = os.environ.get("CHECKIN_STARTUP_PROFILE", "0") == "1"
+PROCESS_STARTED = time.perf_counter()
+
+_stages = {}  # 階段名稱 -> (距程序啟動的毫秒數, 耗時毫秒)
+_lock = threading.Lock()
+_reported = set()
+
+
+# --- 啟動階段：同時是一般的計時 span，另外記下每個階段第一次（冷啟動）的耗時 ---
+@contextmanager
+def stage(name, **fields):
+    began = time.perf_counter()
+    try:
+        with span(name, **fields):
+            yield
+    finally:
+        ended = time.perf_counter()
+        with _lock:
+            if name not in _stages:
+                _stages[name] = ((began - PROCESS_STARTED) * 1000, (ended - began) * 1000)
+
+
+def report():
+    with _lock:
+        items = sorted(_stages.items(), key=lambda item: item[1][0])
+    return [{"stage": name, "start_ms": round(start, 1), "ms": round(ms, 1)} for name, (start, ms) in items]
+
+
+# 每個階段只輸出一次：登入頁面先輸出一批，登入後第一次用到的階段再輸出一批
+def print_report(file=None):
+    rows = report()
+    with _lock:
+        new_rows = [row for row in rows if row["stage"] not in _reported]
+        _reported.update(row["stage"] for row in new_rows)
+    if not new_rows:
+        return
+    file = file or sys.stderr
+    total = max(row["start_ms"] + row["ms"] for row in rows)
+    print(f"startup profile ({total:.0f} ms since first app import)", file=file)
+    for row in new_rows:
+        print(f"  {row['start_ms']:>8.1f} ms  {row['ms']:>8.1f} ms  {row['stage']}", file=file)
+    file.flush()
@@ -0,0 +1,100 @@
+import pandas as pd
+from checkin_store import MonthStore
+from checkin_analytics import attendance, format_daily, Schedule
+
+
+def run(rows, schedule=None):
+    store = MonthStore.from_frame(pd.DataFrame(rows, columns=["姓名", "日期", "時間"]))
+    daily, summary = attendance(store, schedule=schedule or Schedule("09:00", "18:00", 5))
+    return format_daily(daily).set_index(["user", "date"]), summary.set_index("user")
+
+
+def test_pairs_in_and_out_with_a_lunch_break():
+    daily, _ = run([
+        ["alice", "2026/10/01", "08:55:00"],
+        ["alice", "2026/10/01", "12:00:00"],
+        ["alice", "2026/10/01", "13:00:00"],
+        ["alice", "2026/10/01", "18:05:00"],
+    ])
+    day = daily.loc[("alice", "2026/10/01")]
+    assert day["punches"] == 4
+    assert day["first_in"] == "08:55:00"
+    assert day["last_out"] == "18:05:00"
+    assert day["worked_hours"] == round((3 * 3600 + 5 * 60 + 5 * 3600 + 5 * 60) / 3600, 2)
+    assert not day["late"] and not day["early_leave"] and not day["missing_punch"]
+
+
+def test_duplicate_taps_within_a_minute_count_once():
+    daily, _ = run([
+        ["alice", "2026/10/01", "09:00:00"],
+        ["alice", "2026/10/01", "09:00:20"],
+        ["alice", "2026/10/01", "09:00:50"],  # 與前一次刷卡相隔不到 60 秒，同一串連續刷卡
+        ["alice", "2026/10/01", "18:00:00"],
+        ["alice", "2026/10/01", "18:00:59"],
+    ])
+    day = daily.loc[("alice", "2026/10/01")]
+    assert day["punches"] == 2
+    assert day["last_out"] == "18:00:00"
+    assert day["worked_hours"] == 9.0
+    assert not day["missing_punch"]
+
+
+def test_taps_a_minute_apart_are_separate_punches():
+    daily, _ = run([
+        ["alice", "2026/10/01", "09:00:00"],
+        ["alice", "2026/10/01", "09:01:00"],
+    ])
+    day = daily.loc[("alice", "2026/10/01")]
+    assert day["punches"] == 2
+    assert day["worked_hours"] == round(60 / 3600, 2)
+
+
+def test_missing_check_out():
+    daily, summary = run([
+        ["alice", "2026/10/01", "09:00:00"],
+        ["alice", "2026/10/01", "12:00:00"],
+        ["alice", "2026/10/01", "13:00:00"],  # 下午上班後沒有打下班卡
+        ["bob", "2026/10/01", "09:30:00"],  # 整天只有一次打卡
+    ])
+    alice = daily.loc[("alice", "2026/10/01")]
+    assert alice["missing_punch"]
+    assert alice["worked_hours"] == 3.0
+    # 沒有配對的上班打卡不是下班時間，也不能算早退
+    assert alice["last_out"] == "12:00:00"
+    assert not alice["early_leave"]
+
+    bob = daily.loc[("bob", "2026/10/01")]
+    assert bob["missing_punch"] and bob["last_out"] == ""
+    assert bob["worked_hours"] == 0.0
+    assert bob["late"] and bob["late_minutes"] == 30
+    assert not bob["early_leave"]
+    assert summary.loc["bob", "missing_days"] == 1
+
+
+def test_late_and_early_leave_with_grace():
+    daily, summary = run([
+        ["alice", "2026/10/01", "09:05:00"],  # 寬限內
+        ["alice", "2026/10/01", "18:00:00"],
+        ["alice", "2026/10/02", "09:06:00"],
+        ["alice", "2026/10/02", "17:59:00"],
+    ])
+    assert not daily.loc[("alice", "2026/10/01")]["late"]
+    late = daily.loc[("alice", "2026/10/02")]
+    assert late["late"] and late["late_minutes"] == 6 and late["early_leave"]
+    assert summary.loc["alice", "days"] == 2
+    assert summary.loc["alice", "late_days"] == 1
+    assert summary.loc["alice", "early_days"] == 1
+
+
+def test_punches_are_grouped_per_day_and_user():
+    daily, summary = run([
+        ["bob", "2026/10/02", "09:00:00"],
+        ["alice", "2026/10/01", "23:59:30"],
+        ["alice", "2026/10/02", "00:00:10"],  # 跨日，不算重複刷卡
+        ["bob", "2026/10/02", "18:00:00"],
+    ])
+    assert daily.loc[("alice", "2026/10/01")]["punches"] == 1
+    assert daily.loc[("alice", "2026/10/02")]["punches"] == 1
+    assert daily.loc[("bob", "2026/10/02")]["worked_hours"] == 9.0
+    assert summary.loc["alice", "missing_days"] == 2
+    assert summary.loc["bob", "avg_hours"] == 9.0
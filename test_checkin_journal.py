@@ -0,0 +1,82 @@
+import time
+import threading
+import checkin_journal
+from checkin_journal import CheckinJournal
+from checkin_queue import CheckinWriteQueue
+from checkin_storage import CheckinStorage, HEADER
+
+
+# --- 記憶體中的儲存來源；fail_after_write 次數內寫入成功但回報錯誤（模擬逾時、5xx 後其實已套用） ---
+class AppliedThenFailingStorage(CheckinStorage):
+    key = "memory:journal-test"
+
+    def __init__(self, fail_after_write=1):
+        self.rows = {}
+        self.fail_after_write = fail_after_write
+        self.appends = 0
+        self._lock = threading.Lock()
+
+    def list_months(self):
+        return sorted(self.rows)
+
+    def get_month_values(self, month):
+        with self._lock:
+            return [list(HEADER)] + [list(r) for r in self.rows.get(month, [])]
+
+    def append_rows(self, month, rows):
+        with self._lock:
+            self.rows.setdefault(month, []).extend(list(r) for r in rows)
+            self.appends += 1
+            if self.fail_after_write > 0:
+                self.fail_after_write -= 1
+                raise TimeoutError("read timed out")
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_write_applied_then_error_is_not_duplicated(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkin_journal, "MAX_BACKOFF", 0)
+    storage = AppliedThenFailingStorage()
+    queue = CheckinWriteQueue(storage, flush_ms=10)
+    journal = CheckinJournal(storage, str(tmp_path / "journal.log"), queue=queue)
+    try:
+        journal.append("202610", ["alice", "2026/10/18", "09:00:00"])
+        assert wait_until(lambda: journal.metrics()["pending"] == 0)
+        assert storage.rows["202610"] == [["alice", "2026/10/18", "09:00:00"]]
+        assert storage.appends == 1
+        assert journal.metrics()["deduped"] == 1
+    finally:
+        journal.close()
+        queue.close()
+
+
+def test_write_failed_before_applying_is_retried(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkin_journal, "MAX_BACKOFF", 0)
+    storage = AppliedThenFailingStorage(fail_after_write=0)
+    original = storage.append_rows
+    calls = []
+
+    def fail_once(month, rows):
+        calls.append(month)
+        if len(calls) == 1:
+            raise ConnectionError("connection reset")
+        original(month, rows)
+
+    storage.append_rows = fail_once
+    queue = CheckinWriteQueue(storage, flush_ms=10)
+    journal = CheckinJournal(storage, str(tmp_path / "journal.log"), queue=queue)
+    try:
+        journal.append("202610", ["bob", "2026/10/18", "09:01:00"])
+        assert wait_until(lambda: journal.metrics()["pending"] == 0)
+        assert storage.rows["202610"] == [["bob", "2026/10/18", "09:01:00"]]
+        assert journal.metrics()["replayed"] == 1
+    finally:
+        journal.close()
+        queue.close()
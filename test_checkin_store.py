@@ -0,0 +1,130 @@
+import random
+import pytest
+import pandas as pd
+from checkin_store import MonthStore, StoreCache, MissingColumns
+
+
+def frame(rows):
+    return pd.DataFrame(rows, columns=["姓名", "日期", "時間"])
+
+
+def random_rows(count, users, seed):
+    rng = random.Random(seed)
+    return [
+        [rng.choice(users), f"2026/10/{rng.randint(1, 31):02d}", f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}"]
+        for _ in range(count)
+    ]
+
+
+# 不使用索引的寫法，作為比較的標準答案
+def expected(rows, user=None, start=None, end=None):
+    result = []
+    for name, date, clock in rows:
+        stamp = pd.Timestamp(f"{date} {clock}")
+        if user is not None and name != user:
+            continue
+        if start is not None and stamp < pd.Timestamp(start):
+            continue
+        if end is not None and stamp >= pd.Timestamp(end):
+            continue
+        result.append((name, stamp))
+    return sorted(result, key=lambda r: r[1])
+
+
+def selected(store, **query):
+    df = store.to_frame(store.select(**query), with_timestamp=True)
+    return list(zip(df["姓名"], df["打卡時間"]))
+
+
+QUERIES = [
+    {},
+    {"user": "bob"},
+    {"user": "carol", "start": "2026-10-10"},
+    {"user": "alice", "start": "2026-10-05", "end": "2026-10-20"},
+    {"start": "2026-10-15 12:00:00", "end": "2026-10-16"},
+    {"user": "nobody"},
+    {"user": "bob", "start": "2026-11-01"},
+]
+
+
+def assert_same(store, rows):
+    for query in QUERIES:
+        got, want = selected(store, **query), expected(rows, **query)
+        # 同一秒有多筆時順序不固定，只比較時間順序與內容
+        assert [t for _, t in got] == [t for _, t in want], query
+        assert sorted(got) == sorted(want), query
+
+
+def test_select_matches_a_plain_filter():
+    rows = random_rows(500, ["alice", "bob", "carol", "dave"], seed=1)
+    store = MonthStore.from_frame(frame(rows))
+    assert len(store) == 500
+    assert store.users == ["alice", "bob", "carol", "dave"]
+    assert_same(store, rows)
+
+
+def test_extend_with_new_users_sorting_between_existing_ones():
+    first = random_rows(200, ["alice", "dave"], seed=2)
+    # 新使用者排在既有使用者之間與之前，既有的使用者代碼必須重新對應
+    second = random_rows(200, ["aaron", "alice", "bob", "carol", "dave", "zoe"], seed=3)
+    store = MonthStore.from_frame(frame(first))
+    extended = store.extend(frame(second))
+
+    assert extended.users == ["aaron", "alice", "bob", "carol", "dave", "zoe"]
+    assert extended.source_rows == 400
+    assert_same(extended, first + second)
+    # 原本的 store 不變
+    assert store.users == ["alice", "dave"]
+    assert_same(store, first)
+
+
+def test_extend_repeatedly_equals_building_from_scratch():
+    rows = random_rows(300, ["alice", "bob", "carol", "dave", "erin"], seed=4)
+    store = MonthStore.from_frame(frame(rows[:1]))
+    for i in range(1, len(rows), 37):
+        store = store.extend(frame(rows[i:i + 37]))
+    whole = MonthStore.from_frame(frame(rows))
+    assert store.users == whole.users
+    assert list(store.codes) == list(whole.codes)
+    assert list(store.ts) == list(whole.ts)
+    assert_same(store, rows)
+
+
+def test_unparsable_times_are_skipped_but_counted_as_source_rows():
+    rows = [["alice", "2026/10/01", "09:00:00"], ["bob", "2026/10/01", "not a time"], ["bob", "", ""]]
+    store = MonthStore.from_frame(frame(rows))
+    assert len(store) == 1
+    assert store.source_rows == 3
+    assert len(store.select(user="bob")) == 0
+
+
+def test_concat_months():
+    october = random_rows(100, ["alice", "bob"], seed=5)
+    november = [[name, date.replace("/10/", "/11/").replace("/11/31", "/11/30"), clock] for name, date, clock in random_rows(100, ["bob", "carol"], seed=6)]
+    store = MonthStore.concat([MonthStore.from_frame(frame(october)), MonthStore.from_frame(frame(november))])
+    assert store.users == ["alice", "bob", "carol"]
+    assert sorted(selected(store, user="bob")) == sorted(expected(october + november, user="bob"))
+    assert [t for _, t in selected(store)] == [t for _, t in expected(october + november)]
+
+
+def test_store_cache_extends_only_the_new_rows():
+    rows = random_rows(120, ["alice", "bob", "carol"], seed=7)
+    cache = StoreCache()
+    store = cache.get("202610", frame(rows[:100]), generation=1)
+    extended = cache.get("202610", frame(rows), generation=1)
+    assert extended is not store
+    assert extended.source_rows == 120
+    assert_same(extended, rows)
+    assert cache.get("202610", frame(rows), generation=1) is extended
+    # 世代改變（例如整月重新讀取）時從頭建立
+    rebuilt = cache.get("202610", frame(rows[:50]), generation=2)
+    assert rebuilt.source_rows == 50
+
+
+def test_missing_columns():
+    with pytest.raises(MissingColumns) as e:
+        MonthStore.from_frame(pd.DataFrame({"姓名": ["alice"], "日期": ["2026/10/01"]}))
+    assert e.value.kind == "datetime"
+    with pytest.raises(MissingColumns) as e:
+        MonthStore.from_frame(pd.DataFrame({"日期": ["2026/10/01"], "時間": ["09:00:00"]}))
+    assert e.value.kind == "key"
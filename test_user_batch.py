@@ -0,0 +1,69 @@
+from fake_gspread import FakeClient
+from user_batch import UserSheetBatch, USER_HEADER
+from user_directory import UserDirectory
+
+
+def user_sheet(accounts):
+    client = FakeClient()
+    spreadsheet = client.create("users_login")
+    worksheet = spreadsheet.add_sheet("users_login", len(accounts) + 1, 4, [USER_HEADER] + [
+        [account, f"pw-{account}", "user", "Y"] for account in accounts
+    ])
+    return client, worksheet
+
+
+def test_several_deletes_use_row_numbers_from_before_the_batch():
+    _, worksheet = user_sheet(["a", "b", "c", "d", "e", "f"])
+    batch = UserSheetBatch(worksheet).delete("b").delete("e").delete("c")
+    batch.set_enabled("d", False).set_enabled("f", False)
+    requests = batch.build_requests(worksheet.get_all_values())
+
+    updates = [r["updateCells"]["range"]["startRowIndex"] for r in requests if "updateCells" in r]
+    deletes = [r["deleteDimension"]["range"]["startIndex"] for r in requests if "deleteDimension" in r]
+    assert updates == [4, 6]
+    # 由下往上刪除，前面的刪除不會讓後面的列號位移
+    assert deletes == [5, 3, 2]
+    kinds = [next(iter(r)) for r in requests]
+    assert kinds == ["updateCells", "updateCells", "deleteDimension", "deleteDimension", "deleteDimension"]
+
+
+def test_batch_applies_updates_deletes_and_adds_to_the_right_rows():
+    _, worksheet = user_sheet(["a", "b", "c", "d", "e", "f"])
+    batch = UserSheetBatch(worksheet)
+    batch.delete("a").delete("c").delete("f")
+    batch.set_enabled("b", False).set_enabled("e", False)
+    batch.set_enabled("c", False)  # 同一批也要刪除的帳號不更新
+    batch.set_enabled("missing", False)  # 不存在的帳號略過
+    batch.delete("missing")
+    batch.add("g", "pw-g", "admin", False)
+    assert batch.commit() == 6
+
+    assert worksheet.get_all_values() == [
+        USER_HEADER,
+        ["b", "pw-b", "user", "N"],
+        ["d", "pw-d", "user", "Y"],
+        ["e", "pw-e", "user", "N"],
+        ["g", "pw-g", "admin", "N"],
+    ]
+
+
+def test_adjacent_deletes_including_the_last_row():
+    _, worksheet = user_sheet(["a", "b", "c", "d"])
+    UserSheetBatch(worksheet).delete("c").delete("d").delete("b").commit()
+    assert worksheet.get_all_values() == [USER_HEADER, ["a", "pw-a", "user", "Y"]]
+
+
+def test_commit_patches_the_directory_without_reloading_it():
+    client, worksheet = user_sheet(["a", "b", "c"])
+    directory = UserDirectory(client, "users_login", check_interval=0)
+    directory.users()
+    batch = UserSheetBatch(directory.worksheet, directory)
+    batch.delete("a").set_enabled("b", False).add("d", "pw-d")
+    batch.commit()
+
+    users = directory.users()
+    assert sorted(users) == ["b", "c", "d"]
+    assert users["b"]["enabled"] is False
+    # 自己的寫入改變了試算表版本，但不應整份重新下載
+    assert directory.stats["loads"] == 1
+    assert directory.stats["own_writes"] == 1
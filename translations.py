@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BUNDLED_PATH = os.path.join(APP_DIR, "lang_config.json")
+# 正式版的標題等覆寫值，CHECKIN_LANG_VARIANT=formal 時疊加在 lang_config.json 之上
+VARIANT_PATHS = {"formal": os.path.join(APP_DIR, "lang_config_formal.json")}
+# 建置時預先合併並檢查過的翻譯檔，存在時直接讀取
+COMPILED_PATH = os.environ.get("CHECKIN_LANG_COMPILED", os.path.join(APP_DIR, "lang_compiled.json"))
+LANG_VARIANT = os.environ.get("CHECKIN_LANG_VARIANT", "")
+
+# 背景更新（預設關閉）：定期從遠端抓最新翻譯，成功才替換，並存到磁碟供下次啟動使用
+REMOTE_URL = os.environ.get("CHECKIN_LANG_URL", "https://raw.githubusercontent.com/leolin0330/new_english_app/main/lang_config.json")
+REMOTE_REFRESH = os.environ.get("CHECKIN_LANG_REFRESH", "0") == "1"
+REFRESH_SECONDS = float(os.environ.get("CHECKIN_LANG_REFRESH_SECONDS", "3600"))
+REMOTE_TIMEOUT = float(os.environ.get("CHECKIN_LANG_TIMEOUT", "3"))
+CACHE_PATH = os.environ.get("CHECKIN_LANG_CACHE", os.path.join(APP_DIR, ".lang_cache.json"))
+
+
+def read_json(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --- 疊加變體：只覆寫兩邊都有的文字鍵 ---
+# lang_config_formal.json 是較舊的版本，選單結構（list / dict）與多出來的鍵一律以 lang_config.json 為準
+def merge_variant(base, overrides):
+    merged = {}
+    for language, table in base.items():
+        texts = {
+            key: value for key, value in overrides.get(language, {}).items()
+            if isinstance(value, str) and isinstance(table.get(key), str)
+        }
+        merged[language] = {**table, **texts}
+    return merged
+
+
+def kind_of(value):
+    return type(value).__name__
+
+
+# --- 檢查各語言的鍵是否一致、型別是否相同、選單鍵是否都有對應文字 ---
+def validate(tables):
+    problems = []
+    if not tables:
+        return ["no languages"]
+    all_keys = set().union(*(table.keys() for table in tables.values()))
+    for language, table in tables.items():
+        for key in sorted(all_keys - table.keys()):
+            problems.append(f"{language}: missing key '{key}'")
+    for key in sorted(all_keys):
+        kinds = {language: kind_of(table[key]) for language, table in tables.items() if key in table}
+        if len(set(kinds.values())) > 1:
+            problems.append(f"'{key}': type differs across languages {kinds}")
+    for language, table in tables.items():
+        menu_keys, menu_options = table.get("admin_menu_keys"), table.get("admin_menu_options")
+        if isinstance(menu_keys, list) and isinstance(menu_options, dict):
+            for key in menu_keys:
+                if key not in menu_options:
+                    problems.append(f"{language}: admin_menu_options has no label for '{key}'")
+    return problems
+
+
+def compile_tables(variant=LANG_VARIANT):
+    tables = read_json(BUNDLED_PATH)
+    if variant:
+        tables = merge_variant(tables, read_json(VARIANT_PATHS[variant]))
+    return tables
+
+
+# --- 翻譯表：每個語言一個 dict，背景更新時整個換掉，正在 rerun 的 session 不受影響 ---
+class Translations:
+    def __init__(self, variant=LANG_VARIANT):
+        self.variant = variant
+        self.source = None
+        self._tables = None
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.stats = {"refreshes": 0, "refresh_errors": 0, "last_error": None}
+
+    def _apply_variant(self, tables):
+        return merge_variant(tables, read_json(VARIANT_PATHS[self.variant])) if self.variant else tables
+
+    # 讀取順序：背景更新存下的磁碟快取 → 建置時預先合併的檔案 → 映像檔內的 lang_config.json
+    def _load_local(self):
+        if REMOTE_REFRESH:
+            try:
+                tables = read_json(CACHE_PATH)
+                if not validate(tables):
+                    return "disk-cache", self._apply_variant(tables)
+            except (OSError, ValueError):
+                pass
+        try:
+            compiled = read_json(COMPILED_PATH)
+            # 建置時已檢查過，這裡只確認變體相同
+            if compiled.get("variant", "") == self.variant:
+                return "compiled", compiled["languages"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+        return "bundled", compile_tables(self.variant)
+
+    def tables(self):
+        with self._lock:
+            if self._tables is None:
+                self.source, self._tables = self._load_local()
+            if REMOTE_REFRESH and self._refresher is None:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="translations-refresh", daemon=True)
+                self._refresher.start()
+            return self._tables
+
+    def language(self, language):
+        return self.tables()[language]
+
+    def refresh(self):
+        import requests
+        try:
+            response = requests.get(REMOTE_URL, timeout=REMOTE_TIMEOUT)
+            response.raise_for_status()
+            tables = response.json()
+            problems = validate(tables)
+            if problems:
+                raise ValueError(f"remote translations rejected: {problems[0]}")
+        except Exception as e:
+            self.stats["refresh_errors"] += 1
+            self.stats["last_error"] = str(e)
+            return False
+
+        # 寫到暫存檔再改名，避免下次啟動讀到寫一半的檔案
+        tmp_path = f"{CACHE_PATH}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(tables, f, ensure_ascii=False)
+            os.replace(tmp_path, CACHE_PATH)
+        except OSError as e:
+            self.stats["last_error"] = str(e)
+
+        tables = self._apply_variant(tables)
+        with self._lock:
+            self._tables = tables
+            self.source = "remote"
+        self.stats["refreshes"] += 1
+        return True
+
+    def _refresh_loop(self):
+        while True:
+            self.refresh()
+            time.sleep(REFRESH_SECONDS)
+
+
+translations = Translations()
+
+
+def get_translations():
+    return translations.tables()
+
+
+# --- 建置時執行：python translations.py --check --compile lang_compiled.json ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="檢查並預先合併翻譯檔")
+    parser.add_argument("--check", action="store_true", help="檢查各語言的鍵是否一致，有問題時以非 0 結束")
+    parser.add_argument("--compile", metavar="PATH", help="輸出合併後的翻譯檔")
+    parser.add_argument("--variant", default=LANG_VARIANT, choices=["", *VARIANT_PATHS], help="疊加的變體")
+    args = parser.parse_args(argv)
+
+    tables = compile_tables(args.variant)
+    problems = validate(tables)
+    for problem in problems:
+        print(f"translation error: {problem}", file=sys.stderr)
+    if args.check and problems:
+        return 1
+    if args.compile:
+        with open(args.compile, "w", encoding="utf-8") as f:
+            json.dump({"variant": args.variant, "languages": tables}, f, ensure_ascii=False)
+        print(f"compiled {len(tables)} languages, {len(next(iter(tables.values())))} keys -> {args.compile}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
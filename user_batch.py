@@ -0,0 +1,119 @@
+import csv
+import io
+
+USER_HEADER = ["帳號", "密碼", "角色", "是否啟用"]
+VALID_ROLES = ("user", "admin")
+
+
+def _cell(value):
+    return {"userEnteredValue": {"stringValue": str(value)}}
+
+
+# --- users_login 批次異動：任意數量的修改只需一次讀取加一次 batch_update ---
+# 所有異動放在同一個 spreadsheets.batchUpdate，由 Sheets 一次套用，不會有只改一半的情況
+class UserSheetBatch:
+    def __init__(self, worksheet, directory=None):
+        self.worksheet = worksheet
+        self.directory = directory
+        self._enabled = {}  # 帳號 -> True/False
+        self._deletes = set()
+        self._adds = []  # [帳號, 密碼, 角色, Y/N]
+
+    def set_enabled(self, account, enabled):
+        self._enabled[account] = enabled
+        return self
+
+    def delete(self, account):
+        self._deletes.add(account)
+        return self
+
+    def add(self, account, password, role="user", enabled=True):
+        self._adds.append([account, password, role, "Y" if enabled else "N"])
+        return self
+
+    def __len__(self):
+        return len(self._enabled) + len(self._deletes) + len(self._adds)
+
+    def build_requests(self, values):
+        header = values[0] if values else USER_HEADER
+        account_col = header.index("帳號")
+        enabled_col = header.index("是否啟用")
+        row_of = {row[account_col]: i for i, row in enumerate(values[1:], start=1) if len(row) > account_col}
+        sheet_id = self.worksheet.id
+
+        requests = []
+        # 列號以修改前的內容計算，因此先更新儲存格、再由下往上刪除、最後才新增
+        for account, enabled in self._enabled.items():
+            row = row_of.get(account)
+            if row is None or account in self._deletes:
+                continue
+            requests.append({"updateCells": {
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": row, "endRowIndex": row + 1,
+                    "startColumnIndex": enabled_col, "endColumnIndex": enabled_col + 1,
+                },
+                "rows": [{"values": [_cell("Y" if enabled else "N")]}],
+                "fields": "userEnteredValue",
+            }})
+        for row in sorted((row_of[a] for a in self._deletes if a in row_of), reverse=True):
+            requests.append({"deleteDimension": {
+                "range": {"sheetId": sheet_id, "dimension": "ROWS", "startIndex": row, "endIndex": row + 1}
+            }})
+        if self._adds:
+            requests.append({"appendCells": {
+                "sheetId": sheet_id,
+                "rows": [{"values": [_cell(v) for v in row]} for row in self._adds],
+                "fields": "userEnteredValue",
+            }})
+        return requests
+
+    def commit(self):
+        if not len(self):
+            return 0
+        if self.directory is None:
+            return self._commit()
+        # 帳號目錄記下這次寫入後的版本，之後不會因為自己的寫入整份重新下載
+        with self.directory.own_write():
+            return self._commit()
+
+    def _commit(self):
+        requests = self.build_requests(self.worksheet.get_all_values())
+        if requests:
+            self.worksheet.spreadsheet.batch_update({"requests": requests})
+        self._apply_to_directory()
+        return len(requests)
+
+    # 寫入成功後直接修改帳號目錄快取
+    def _apply_to_directory(self):
+        if self.directory is None:
+            return
+        for account, enabled in self._enabled.items():
+            self.directory.set_enabled(account, enabled)
+        for account in self._deletes:
+            self.directory.remove(account)
+        for account, password, role, enabled in self._adds:
+            self.directory.put(account, password, role, enabled == "Y")
+
+
+# --- 解析 CSV 匯入檔：回傳 (要新增的列, 略過的列與原因) ---
+# 欄位：帳號、密碼、角色（預設 user）、是否啟用（預設 Y）
+def parse_import_csv(data, existing_accounts):
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    rows, skipped, seen = [], [], set(existing_accounts)
+    for line_no, record in enumerate(csv.DictReader(io.StringIO(data)), start=2):
+        account = (record.get("帳號") or "").strip()
+        password = (record.get("密碼") or "").strip()
+        role = (record.get("角色") or "user").strip() or "user"
+        enabled = (record.get("是否啟用") or "Y").strip().upper() != "N"
+        if not account or not password:
+            skipped.append((line_no, account, "input_required"))
+        elif role not in VALID_ROLES:
+            skipped.append((line_no, account, "invalid_role"))
+        elif account in seen:
+            skipped.append((line_no, account, "account_exists"))
+        else:
+            seen.add(account)
+            rows.append((account, password, role, enabled))
+    return rows, skipped
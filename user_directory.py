@@ -0,0 +1,135 @@
+import time
+import threading
+from contextlib import contextmanager
+from shared_cache import shared_cache
+
+USER_SHEET_NAME = "users_login"
+# 多久向 Drive 確認一次試算表版本（modifiedTime），版本沒變就不重新下載
+VERSION_CHECK_SECONDS = 30
+
+
+def to_user_info(row):
+    return {
+        "password": row["密碼"],
+        "role": row.get("角色", "user"),
+        "enabled": str(row.get("是否啟用", "Y")).strip().upper() == "Y"
+    }
+
+
+# --- 使用者帳號目錄：以帳號為 key 的雜湊索引，只在試算表版本改變時重新下載 ---
+class UserDirectory:
+    def __init__(self, client, sheet_name=USER_SHEET_NAME, check_interval=VERSION_CHECK_SECONDS):
+        self.client = client
+        self.sheet_name = sheet_name
+        self.check_interval = check_interval
+        self._spreadsheet = None
+        self._worksheet = None
+        self._rows = None  # 帳號 -> 原始列（dict，與 get_all_records 相同），保留工作表順序
+        self._users = None  # 帳號 -> 登入用資訊
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self.stats = {"loads": 0, "version_checks": 0, "patches": 0, "own_writes": 0}
+
+    @property
+    def worksheet(self):
+        with self._lock:
+            if self._worksheet is None:
+                self._spreadsheet = self.client.open(self.sheet_name)
+                self._worksheet = self._spreadsheet.sheet1
+            return self._worksheet
+
+    # key 含試算表版本：同一版本只有一個 instance 下載，其他 instance 直接讀共用快取
+    # （內容含密碼，與試算表相同；共用快取請放在內部網路並開啟驗證）
+    def _load(self, version):
+        records = shared_cache.get_or_load(("users", self.sheet_name, version), self.worksheet.get_all_records)
+        self._rows = {row["帳號"]: row for row in records}
+        self._users = {account: to_user_info(row) for account, row in self._rows.items()}
+        self.stats["loads"] += 1
+
+    # 定期確認版本；force=True 時不論間隔都確認一次（例如寫入前檢查帳號是否存在）
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if self._rows is not None and not force and now - self._checked_at < self.check_interval:
+                return
+            self.worksheet
+            version = self._spreadsheet.get_lastUpdateTime()
+            self._checked_at = now
+            self.stats["version_checks"] += 1
+            if self._rows is None or version != self._version:
+                self._load(version)
+                self._version = version
+
+    def users(self):
+        self.refresh()
+        with self._lock:
+            return self._users
+
+    def get(self, account):
+        return self.users().get(account)
+
+    def records(self):
+        self.refresh()
+        with self._lock:
+            return list(self._rows.values())
+
+    # --- 自己寫入後直接修改快取中的單一帳號，不必整份重新下載 ---
+    # 每次修改都換成新的 dict，已經拿到舊 dict 的 session 不會讀到改到一半的內容
+    def put(self, account, password, role, enabled):
+        row = {"帳號": account, "密碼": password, "角色": role, "是否啟用": "Y" if enabled else "N"}
+        with self._lock:
+            if self._rows is None:
+                return
+            self._rows = {**self._rows, account: row}
+            self._users = {**self._users, account: to_user_info(row)}
+            self.stats["patches"] += 1
+
+    def set_enabled(self, account, enabled):
+        with self._lock:
+            if self._rows is None or account not in self._rows:
+                return
+            row = {**self._rows[account], "是否啟用": "Y" if enabled else "N"}
+            self._rows = {**self._rows, account: row}
+            self._users = {**self._users, account: to_user_info(row)}
+            self.stats["patches"] += 1
+
+    def remove(self, account):
+        with self._lock:
+            if self._rows is None:
+                return
+            self._rows = {k: v for k, v in self._rows.items() if k != account}
+            self._users = {k: v for k, v in self._users.items() if k != account}
+            self.stats["patches"] += 1
+
+    # --- 自己寫入試算表：寫入前確認快取是最新版本，寫入並修改快取後把寫入造成的新版本記為目前版本 ---
+    # 否則下一次定期確認會看到 modifiedTime 改變，又整份重新下載，直接修改快取就沒有意義
+    # （寫入途中其他 instance 的修改會被一起視為已讀取，時間窗只有一次寫入的長度）
+    @contextmanager
+    def own_write(self):
+        with self._lock:
+            self.refresh(force=True)
+            yield self
+            self._version = self._spreadsheet.get_lastUpdateTime()
+            self._checked_at = time.monotonic()
+            self.stats["version_checks"] += 1
+            self.stats["own_writes"] += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._rows = None
+            self._users = None
+            self._version = None
+
+
+# --- 全程序共用 ---
+_directories = {}
+_directories_lock = threading.Lock()
+
+
+def get_user_directory(client, sheet_name=USER_SHEET_NAME):
+    with _directories_lock:
+        directory = _directories.get(sheet_name)
+        if directory is None:
+            directory = _directories[sheet_name] = UserDirectory(client, sheet_name)
+        return directory